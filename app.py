@@ -1,24 +1,39 @@
 import os
-import json
+import mimetypes
 from datetime import datetime, timezone
 from pathlib import Path
 from functools import wraps
-from flask import Flask, render_template, jsonify, send_from_directory, request, Response
+from flask import Flask, render_template, jsonify, send_from_directory, send_file, request, Response
 from flask_socketio import SocketIO
 from flask_compress import Compress
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-import requests
-import hashlib
-import difflib
 import asyncio
 import threading
 import time
-from models import db, Musical, MusicalLink, MusicalChange
-from telegram import Bot
+import atexit
+from models import db, Musical, MusicalLink, MusicalChange, UrlSnapshot
+from fetcher import fetch_all, conditional_headers
+from host_guard import GUARD as HOST_GUARD, HostBlocked
+import http_client
+import normalizer
+import snapshot_store
+import suggestion_store
+import musical_queries
+import calendar_index
+import json_store
+import photo_index
+import image_variants
+import assets
+import blob_store
+import diff_engine
+import watchlist
+import notifier
+from mailer import QueuedMailer
+from scheduler import LinkScheduler
+from change_batch import ChangeBatch
+from sharding import ShardCoordinator, HostQuota
 from telegram.ext import Application
-import smtplib
-import ssl
 import random
 import string
 import re
@@ -33,9 +48,13 @@ SUGGESTIONS_FILE = STATIC_DIR / "python" / "suggestions.json"
 EVENTS_FILE = STATIC_DIR / "data" / "events.json"
 SNAPSHOTS_FILE = STATIC_DIR / "data" / "snapshots.json"
 EXCLUSIONS_FILE = STATIC_DIR / "data" / "exclusions.json"
+# One-shot imports of the legacy JSON files (and urls.json) into an empty database at startup.
+# Scripts that run the app against a scratch database set STARTUP_IMPORTS=0.
+STARTUP_IMPORTS = os.getenv('STARTUP_IMPORTS', '1') == '1'
 
-# In-memory cache for resolved photo paths (key: requested lower-path -> actual relative path)
-PHOTO_PATH_CACHE = {}
+
+# Counters from the most recent monitor cycle (304s vs full downloads)
+LAST_CHECK_STATS = {}
 
 UTC = timezone.utc
 
@@ -136,7 +155,32 @@ except Exception:
     pass
 
 db.init_app(app)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Keep content_blobs reference counts in sync when rows pointing at them are deleted
+blob_store.release_on_delete(MusicalChange, 'old_hash', 'new_hash')
+blob_store.release_on_delete(UrlSnapshot, 'body_hash', 'text_hash')
+
+# {{ photo_srcset(url) }} in templates: srcset of resized variants for /static/fotos URLs
+app.jinja_env.globals['photo_srcset'] = image_variants.srcset
+# {{ photo_url(url, 1440) }} in templates: versioned URL of one resized variant
+app.jinja_env.globals['photo_url'] = image_variants.photo_url
+# {{ asset_url('js/main.js') }} in templates: fingerprinted build if static/dist has one
+app.jinja_env.globals['asset_url'] = assets.asset_url
+
+# Case-insensitive index of static/fotos, built now and refreshed when its folders change
+PHOTOS = photo_index.PhotoIndex(STATIC_DIR / "fotos")
+PHOTOS.refresh()
+# {{ photo_versions()|tojson }} in templates: lets main.js version the variant URLs it builds
+app.jinja_env.globals['photo_versions'] = lambda: image_variants.photo_versions(PHOTOS.paths())
+
+# Daily calendar occurrences, rebuilt only when events.json/exclusions.json change
+CALENDAR = calendar_index.CalendarIndex(EVENTS_FILE, EXCLUSIONS_FILE)
+
+# Resident watchlist, rebuilt only after relevant Musical/MusicalLink commits or urls.json edits
+WATCHLIST = watchlist.WatchlistIndex(URLS_FILE)
+watchlist.watch_models(WATCHLIST)
+
+# With several workers, set SOCKETIO_MESSAGE_QUEUE (e.g. redis://...) so every worker's clients get the deltas
+socketio = SocketIO(app, cors_allowed_origins="*", message_queue=os.getenv('SOCKETIO_MESSAGE_QUEUE') or None)
 Compress(app)
 
 # Rate limiting: sensible defaults and key by remote address
@@ -236,32 +280,24 @@ def require_auth(f):
     return decorated
 
 def load_events():
-    """Load events from JSON file"""
-    try:
-        with EVENTS_FILE.open('r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception:
-        return []
+    """Load events from JSON file (cached, read-only)"""
+    events = json_store.load(EVENTS_FILE, ())
+    return events if isinstance(events, tuple) else ()
 
 async def send_telegram_notification_async(message_text):
-    """Send notification via Telegram (async version for v20+)"""
+    """Send notification via Telegram (async wrapper).
+
+    Uses the Bot API over the shared pooled HTTP client instead of building a
+    new ``telegram.Bot`` (and its own connection pool) for every alert.
+    """
     if not TELEGRAM_CONFIGURED:
         app.logger.info('Telegram not configured; skipping telegram notification')
         return {"ok": False, "reason": "telegram-not-configured"}
     try:
-        bot = Bot(token=TELEGRAM_BOT_TOKEN)
-        app.logger.debug('Sending Telegram message via python-telegram-bot')
-        await bot.send_message(chat_id=TELEGRAM_CHAT_ID, text=message_text)
-        app.logger.info('Telegram message sent (async)')
-        return {"ok": True}
+        return await asyncio.to_thread(_send_telegram_http, message_text)
     except Exception as e:
-        app.logger.warning(f"Async Telegram send failed: {e}; falling back to HTTP API")
-        # Fallback to simple HTTP API call (synchronous) to avoid asyncio issues in some runtimes
-        try:
-            return _send_telegram_http(message_text)
-        except Exception as ex:
-            app.logger.error(f"Telegram fallback also failed: {ex}")
-            return {"ok": False, "error": f"async_err:{e}; fallback_err:{ex}"}
+        app.logger.error(f"Telegram send failed: {e}")
+        return {"ok": False, "error": str(e)}
 
 
 def _send_telegram_http(message_text):
@@ -271,7 +307,7 @@ def _send_telegram_http(message_text):
     api = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
     payload = {"chat_id": TELEGRAM_CHAT_ID, "text": message_text}
     try:
-        r = requests.post(api, json=payload, timeout=8)
+        r = http_client.post(api, json=payload, timeout=8)
         try:
             data = r.json()
         except Exception:
@@ -295,13 +331,30 @@ def send_discord_webhook(message_text, webhook_type="alert"):
     
     try:
         payload = {"content": message_text}
-        r = requests.post(webhook_url, json=payload, timeout=6)
+        r = http_client.post(webhook_url, json=payload, timeout=6)
         return {"ok": r.ok}
     except Exception as e:
         app.logger.error(f"Discord error: {e}")
         return {"ok": False, "error": str(e)}
 
 
+def _alert_senders():
+    """Channels change alerts are delivered on, with their blocking senders."""
+    senders = {}
+    if TELEGRAM_CONFIGURED:
+        senders['telegram'] = notifier.telegram_sender(TELEGRAM_BOT_TOKEN, TELEGRAM_CHAT_ID)
+    if DISCORD_WEBHOOK_ALERTS:
+        senders['discord'] = notifier.discord_sender(DISCORD_WEBHOOK_ALERTS)
+    return senders
+
+
+# Change alerts go through the notification_outbox table; this thread delivers them
+NOTIFIER = notifier.OutboxDispatcher(app, _alert_senders())
+
+# Confirmation emails are sent by a background thread over one reused SMTP session
+MAILER = QueuedMailer(SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SENDER_EMAIL)
+
+
 def _generate_discount_code(prefix='TM', length=6):
     chars = string.ascii_uppercase + string.digits
     suffix = ''.join(random.choice(chars) for _ in range(length))
@@ -314,52 +367,70 @@ def _is_email(val):
 
 
 def send_confirmation_email(recipient_email, discount_code):
-    """Send a simple confirmation email with discount code using SMTP.
+    """Queue a confirmation email with the discount code; the background mailer sends it.
 
     Requires environment variables: SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, SENDER_EMAIL
     """
-    if not (SMTP_SERVER and SMTP_USERNAME and SMTP_PASSWORD and SENDER_EMAIL):
+    if not MAILER.configured:
         app.logger.warning('SMTP not configured; skipping confirmation email')
         return {'ok': False, 'reason': 'smtp-not-configured'}
 
     subject = 'Gracias por tu sugerencia — aquí tienes tu código de descuento'
     body = f"Hola!\n\nGracias por enviar una sugerencia. Aquí tienes tu código de descuento:\n\n{discount_code}\n\n¡Gracias!"
-    message = f"From: {SENDER_EMAIL}\r\nTo: {recipient_email}\r\nSubject: {subject}\r\n\r\n{body}"
+    if MAILER.enqueue(recipient_email, subject, body):
+        return {'ok': True, 'queued': True}
+    return {'ok': False, 'reason': 'mail-queue-full'}
+
+# Columns added after their table was first created (db.create_all never alters tables)
+SCHEMA_ADDITIONS = {
+    'url_snapshots': {
+        'next_due': 'TIMESTAMP',
+        'check_interval': 'INTEGER',
+    },
+    'musical_links': {
+        'max_body_bytes': 'INTEGER',
+        'consecutive_failures': 'INTEGER DEFAULT 0',
+    },
+    'musical_changes': {
+        'old_hash': 'VARCHAR(64)',
+        'new_hash': 'VARCHAR(64)',
+    },
+    'notification_outbox': {
+        'group_key': 'VARCHAR(200)',
+    },
+}
 
-    try:
-        context = ssl.create_default_context()
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT, timeout=10) as server:
-            server.starttls(context=context)
-            server.login(SMTP_USERNAME, SMTP_PASSWORD)
-            server.sendmail(SENDER_EMAIL, [recipient_email], message.encode('utf-8'))
-        return {'ok': True}
-    except Exception as e:
-        app.logger.error(f"Error sending confirmation email: {e}")
-        return {'ok': False, 'error': str(e)}
+# Indexes declared on models after their table was first created
+SCHEMA_INDEXES = {
+    'ix_musical_links_url': ('musical_links', 'url'),
+    'ix_musical_changes_musical_created': ('musical_changes', 'musical_id, created_at'),
+}
 
-def load_exclusions():
-    """Load exclusions from JSON file"""
-    try:
-        if not EXCLUSIONS_FILE.exists():
-            print(f"⚠️  Exclusions file not found: {EXCLUSIONS_FILE}")
-            return {}
-        
-        with EXCLUSIONS_FILE.open('r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                print("⚠️  Exclusions file is empty")
-                return {}
-            
-            exclusions = json.loads(content)
-            print(f"✅ Loaded exclusions for {len(exclusions)} musicals")
-            return exclusions
-            
-    except json.JSONDecodeError as e:
-        print(f"❌ Error parsing exclusions.json: {e}")
-        return {}
-    except Exception as e:
-        print(f"❌ Error loading exclusions: {e}")
-        return {}
+
+def _ensure_columns(inspector):
+    from sqlalchemy import text
+    for table, columns in SCHEMA_ADDITIONS.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {col['name'] for col in inspector.get_columns(table)}
+        for name, ddl in columns.items():
+            if name in existing:
+                continue
+            with db.engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+            app.logger.info(f"Added column {table}.{name}")
+
+
+def _ensure_indexes(inspector):
+    from sqlalchemy import text
+    for name, (table, column) in SCHEMA_INDEXES.items():
+        if not inspector.has_table(table):
+            continue
+        if name in {ix['name'] for ix in inspector.get_indexes(table)}:
+            continue
+        with db.engine.begin() as conn:
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({column})"))
+        app.logger.info(f"Added index {name} on {table} ({column})")
 
 # Create database tables
 with app.app_context():
@@ -381,14 +452,33 @@ with app.app_context():
         else:
             app.logger.info("Creating database tables for the first time...")
             db.create_all()
+        _ensure_columns(inspect(db.engine))
+        _ensure_indexes(inspect(db.engine))
         
+        # One-shot import of the legacy snapshots.json into the snapshot table
+        if STARTUP_IMPORTS and SNAPSHOTS_FILE.exists() and snapshot_store.is_empty():
+            try:
+                imported = snapshot_store.import_json(SNAPSHOTS_FILE)
+                app.logger.info(f"Imported {imported} snapshots from {SNAPSHOTS_FILE.name}")
+            except Exception as e:
+                app.logger.warning(f"Could not import {SNAPSHOTS_FILE}: {e}")
+                db.session.rollback()
+
+        # One-shot import of the legacy suggestions.json into the suggestions table
+        if STARTUP_IMPORTS and SUGGESTIONS_FILE.exists() and suggestion_store.is_empty():
+            try:
+                imported = suggestion_store.import_json(SUGGESTIONS_FILE)
+                app.logger.info(f"Imported {imported} suggestions from {SUGGESTIONS_FILE.name}")
+            except Exception as e:
+                app.logger.warning(f"Could not import {SUGGESTIONS_FILE}: {e}")
+                db.session.rollback()
+
         # Auto-migrate from urls.json if database is empty
         musical_count = Musical.query.count()
-        if musical_count == 0 and URLS_FILE.exists():
+        if STARTUP_IMPORTS and musical_count == 0 and URLS_FILE.exists():
             app.logger.info("Database is empty, attempting to load from urls.json...")
             try:
-                with URLS_FILE.open('r', encoding='utf-8') as f:
-                    data = json.load(f)
+                data = json_store.load_copy(URLS_FILE, [])
                 
                 app.logger.info(f"Found {len(data)} musicals in urls.json")
                 
@@ -451,8 +541,7 @@ with app.app_context():
                                 changed = True
                         if changed:
                             try:
-                                with URLS_FILE.open('w', encoding='utf-8') as wf:
-                                    json.dump(data, wf, indent=2, ensure_ascii=False)
+                                json_store.write(URLS_FILE, data)
                                 app.logger.info('Updated urls.json after processing suggestion-only entries')
                             except Exception as e:
                                 app.logger.warning(f'Could not write urls.json: {e}')
@@ -472,18 +561,9 @@ with app.app_context():
 def index():
     """Página principal con el dashboard"""
     with app.app_context():
-        musicals = Musical.query.all()
-        
-        # Prepare data for each musical
+        musicals = musical_queries.musicals_with_links()
         for musical in musicals:
-            musical.links = MusicalLink.query.filter_by(musical_id=musical.id).all()
-            # Check if is_available attribute exists
-            if musical.links and hasattr(musical.links[0], 'is_available'):
-                musical.active_links = sum(1 for link in musical.links if link.is_available)
-                musical.sold_out_links = len(musical.links) - musical.active_links
-            else:
-                musical.active_links = len(musical.links)
-                musical.sold_out_links = 0
+            musical.active_links, musical.sold_out_links = musical_queries.link_counts(musical)
         
         return render_template(
             'index.html',
@@ -527,9 +607,7 @@ def index():
 def shows():
     """Página de cartelera de musicales"""
     with app.app_context():
-        musicals = Musical.query.all()
-        for musical in musicals:
-            musical.links = MusicalLink.query.filter_by(musical_id=musical.id).all()
+        musicals = musical_queries.musicals_with_links()
         return render_template('shows.html', musicals=musicals)
 
 @app.route("/calendar")
@@ -543,9 +621,7 @@ def calendar():
 def admin():
     """Panel de administración"""
     with app.app_context():
-        musicals = Musical.query.all()
-        for musical in musicals:
-            musical.links = MusicalLink.query.filter_by(musical_id=musical.id).all()
+        musicals = musical_queries.musicals_with_links()
         return render_template('admin.html', musicals=musicals)
 
 @app.route('/static/<path:filename>')
@@ -553,85 +629,77 @@ def serve_static(filename):
     """Serve static files"""
     return send_from_directory('static', filename)
 
+@app.route('/static/dist/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted build, precompressed when the client accepts it; its name changes with its content."""
+    filename = f"{assets.DIST_NAME}/{filename}"
+    if not assets.is_built(filename):
+        return Response('Not found', status=404)
+    path, encoding = assets.pick_encoding(filename, request.accept_encodings)
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_from_directory(STATIC_DIR, path, mimetype=mimetype, max_age=assets.ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+def _send_photo(fotos_root, relpath):
+    """Send a photo, or its resized variant when ``?w=`` is given.
+
+    ``?w=`` responses are cached for ``IMAGE_MAX_AGE`` only when ``?v=`` names
+    the current version of the source; otherwise they revalidate quickly.
+    Plain requests for the original keep the default static-file caching.
+    """
+    width = request.args.get('w', type=int)
+    if width and width > 0:
+        source_path = os.path.join(fotos_root, relpath)
+        try:
+            versioned = request.args.get('v') == image_variants.source_version(source_path)
+        except OSError:
+            versioned = False
+        max_age = image_variants.IMAGE_MAX_AGE if versioned else image_variants.IMAGE_REVALIDATE_AGE
+        variant = image_variants.VARIANTS.variant(source_path, width, request.headers.get('Accept'))
+        if variant is not None:
+            path, mimetype = variant
+            # the variant's name holds the source digest, so its ETag changes with the photo
+            response = send_file(path, mimetype=mimetype, max_age=max_age, conditional=True, etag=True)
+        else:
+            # already small enough (or no Pillow): the original stands in for the variant
+            response = send_from_directory(fotos_root, relpath, max_age=max_age)
+        response.vary.add('Accept')
+        return response
+    return send_from_directory(fotos_root, relpath)
+
+
 @app.route('/static/fotos/posters/<filename>')
 def serve_poster(filename):
     """Serve poster images"""
-    posters_dir = os.path.join(app.root_path, 'static', 'fotos', 'posters')
-    return send_from_directory(posters_dir, filename)
+    fotos_root = os.path.join(app.root_path, 'static', 'fotos')
+    resolved = PHOTOS.resolve(f"posters/{filename}")
+    if resolved is None:
+        return Response('Not found', status=404)
+    return _send_photo(fotos_root, resolved)
 
 
-# Robust fotos handler: tries exact path first, then common case variants,
-# then performs a case-insensitive filesystem scan (cached) and finally
-# serves a placeholder if nothing is found. This helps on case-sensitive
-# deployments where local filenames may differ in casing.
+# Robust fotos handler: resolves the requested path case-insensitively through
+# the in-memory photo index (this helps on case-sensitive deployments where
+# local filenames may differ in casing) and serves a placeholder if nothing is
+# found.
 @app.route('/static/fotos/<path:relpath>')
 def serve_foto(relpath):
     fotos_root = os.path.join(app.root_path, 'static', 'fotos')
-    # Normalize relpath to forward slashes
-    relpath_norm = relpath.replace('\\', '/')
-
-    # Exact match first
-    exact_path = os.path.join(fotos_root, relpath_norm)
-    if os.path.exists(exact_path):
-        app.logger.debug(f"Serving exact photo: {relpath_norm}")
-        return send_from_directory(fotos_root, relpath_norm)
-
-    key = relpath_norm.lower()
-    # Cached resolution
-    cached = PHOTO_PATH_CACHE.get(key)
-    if cached:
-        candidate = os.path.join(fotos_root, cached)
-        if os.path.exists(candidate):
-            app.logger.debug(f"Serving cached photo for {relpath_norm} -> {cached}")
-            return send_from_directory(fotos_root, cached)
-        else:
-            PHOTO_PATH_CACHE.pop(key, None)
-
-    # Try common folder/filename casing permutations
-    parts = relpath_norm.split('/', 1)
-    candidates = []
-    if len(parts) == 2:
-        folder, fname = parts
-        candidates.extend([
-            f"{folder}/{fname}",
-            f"{folder.lower()}/{fname}",
-            f"{folder.title()}/{fname}",
-            f"{folder.upper()}/{fname}",
-            f"{folder}/{fname.lower()}",
-            f"{folder}/{fname.upper()}"
-        ])
-    else:
-        candidates.extend([relpath_norm, relpath_norm.lower(), relpath_norm.upper()])
-
-    for cand in candidates:
-        cand_path = os.path.join(fotos_root, cand)
-        if os.path.exists(cand_path):
-            PHOTO_PATH_CACHE[key] = cand.replace('\\', '/')
-            app.logger.debug(f"Resolved photo {relpath_norm} -> {cand}")
-            return send_from_directory(fotos_root, cand)
-
-    # Last resort: do a case-insensitive scan (expensive the first time)
-    try:
-        requested_lower = relpath_norm.lower()
-        for root, dirs, files in os.walk(fotos_root):
-            rel_root = os.path.relpath(root, fotos_root)
-            for f in files:
-                candidate_rel = os.path.join(rel_root, f) if rel_root != '.' else f
-                candidate_rel_norm = candidate_rel.replace('\\', '/')
-                if candidate_rel_norm.lower() == requested_lower:
-                    PHOTO_PATH_CACHE[key] = candidate_rel_norm
-                    app.logger.debug(f"Scanned and found photo {relpath_norm} -> {candidate_rel_norm}")
-                    return send_from_directory(fotos_root, candidate_rel_norm)
-    except Exception as e:
-        app.logger.warning(f"Photo resolution scan failed: {e}")
+    resolved = PHOTOS.resolve(relpath)
+    if resolved is not None:
+        return _send_photo(fotos_root, resolved)
 
     # If still not found, try to serve a placeholder if available
     placeholder = os.path.join(app.root_path, 'static', 'posters', 'placeholder.png')
     if os.path.exists(placeholder):
-        app.logger.debug(f"Photo not found, serving placeholder for {relpath_norm}")
+        app.logger.debug(f"Photo not found, serving placeholder for {relpath}")
         return send_from_directory(os.path.join(app.root_path, 'static', 'posters'), 'placeholder.png')
 
-    app.logger.debug(f"Photo not found: {relpath_norm}")
+    app.logger.debug(f"Photo not found: {relpath}")
     return Response('Not found', status=404)
 
 
@@ -648,50 +716,8 @@ def favicon():
 def api_get_musicals():
     """Get all musicals with their links"""
     with app.app_context():
-        musicals = Musical.query.all()
-        result = []
-        for musical in musicals:
-            links = MusicalLink.query.filter_by(musical_id=musical.id).all()
-            
-            # Build links data
-            links_data = []
-            for link in links:
-                link_dict = {'url': link.url}
-                if hasattr(link, 'is_available'):
-                    link_dict['is_available'] = link.is_available
-                else:
-                    link_dict['is_available'] = True
-                if hasattr(link, 'last_checked') and link.last_checked:
-                    link_dict['last_checked'] = link.last_checked.isoformat()
-                if hasattr(link, 'created_at') and link.created_at:
-                    link_dict['created_at'] = link.created_at.isoformat()
-                links_data.append(link_dict)
-            
-            musical_dict = {
-                'id': musical.id,
-                'name': musical.name,
-                'links': links_data
-            }
-            
-            # Add optional fields if they exist
-            if hasattr(musical, 'description'):
-                musical_dict['description'] = musical.description
-            if hasattr(musical, 'is_available'):
-                musical_dict['is_available'] = musical.is_available
-            if hasattr(musical, 'updated_at') and musical.updated_at:
-                musical_dict['updated_at'] = musical.updated_at.isoformat()
-            # include latest change timestamp if available
-            try:
-                last_change = MusicalChange.query.filter_by(musical_id=musical.id).order_by(MusicalChange.created_at.desc()).first()
-                if last_change and getattr(last_change, 'created_at', None):
-                    musical_dict['last_change'] = last_change.created_at.isoformat()
-            except Exception:
-                # if MusicalChange not available or query fails, skip silently
-                pass
-                
-            result.append(musical_dict)
-        
-        return jsonify(result)
+        rows = musical_queries.musicals_with_last_change()
+        return jsonify([musical_queries.musical_to_dict(musical, last_change) for musical, last_change in rows])
 
 @app.route("/api/suggest-site", methods=["POST"])
 @limiter.limit("10 per hour")
@@ -715,23 +741,10 @@ def api_suggest_site():
         "timestamp": datetime.now(UTC).isoformat()
     }
     
-    # Save to file
     try:
-        suggestions = []
-        if SUGGESTIONS_FILE.exists():
-            with SUGGESTIONS_FILE.open("r", encoding="utf-8") as f:
-                suggestions = json.load(f)
-        
-        suggestions.append(suggestion)
-        
-        # Ensure directory exists
-        SUGGESTIONS_FILE.parent.mkdir(parents=True, exist_ok=True)
-        
-        with SUGGESTIONS_FILE.open("w", encoding="utf-8") as f:
-            json.dump(suggestions, f, indent=2, ensure_ascii=False)
-        
         # Generate discount code for sender and attempt confirmation email
         discount_code = _generate_discount_code()
+        suggestion_store.add(site_name, site_url, reason=reason, contact=contact, discount_code=discount_code)
         suggestion['discount_code'] = discount_code
 
         # Send notifications to admins
@@ -755,84 +768,87 @@ def api_suggest_site():
         app.logger.error(f"Error saving suggestion: {e}")
         return jsonify({"ok": False, "error": str(e)}), 500
 
+@app.route("/api/suggestions", methods=["GET"])
+@require_auth
+def api_get_suggestions():
+    """Admin: suggestions newest first, paginated.
+
+    Query params:
+      - limit (int): page size (default 50, max 200)
+      - before (int): ``next`` cursor returned by the previous page
+    """
+    try:
+        limit = int(request.args.get('limit', suggestion_store.PAGE_SIZE))
+        before = request.args.get('before', type=int)
+    except Exception:
+        return jsonify({"ok": False, "error": "invalid pagination parameters"}), 400
+    items, next_cursor = suggestion_store.page(limit, before)
+    return jsonify({"ok": True, "items": items, "next": next_cursor, "total": suggestion_store.count()})
+
 @app.route("/api/check-now", methods=["POST"])
 @require_auth
 @limiter.limit("5 per hour")
 def api_check_now():
     """Trigger manual check"""
     try:
+        coordinator = MONITOR_COORDINATOR
+        urls, other_shards = None, 0
+        if coordinator is not None:
+            # only this worker's shards: the others are checked (and alerted on) by their lease holders
+            all_urls = [entry.url for entry in _build_watchlist()]
+            urls = coordinator.filter_urls(all_urls)
+            other_shards = len(all_urls) - len(urls)
         # Reuse the run-check logic via helper to keep behaviour consistent
-        res = run_check_and_alert()
-        return jsonify({"ok": True, "results": res})
+        res = run_check_and_alert(urls, coordinator)
+        return jsonify({"ok": True, "results": res, "stats": LAST_CHECK_STATS, "skipped_other_shards": other_shards})
     except Exception as e:
         return jsonify({"ok": False, "error": str(e)}), 500
 
 
-def _load_snapshots():
+def publish_musical_deltas(deltas):
+    """Push per-musical deltas to every open dashboard (``musical_delta`` Socket.IO event)."""
+    socketio.emit('musical_delta', {'musicals': deltas})
+    app.logger.info(f"📡 Pushed deltas for {len(deltas)} musicals")
+
+
+def _load_snapshots(urls=None):
     try:
-        if SNAPSHOTS_FILE.exists():
-            with SNAPSHOTS_FILE.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-                # Normalize legacy format (url -> hash) to new format (url -> {hash, body})
-                normalized = {}
-                for k, v in (data.items() if isinstance(data, dict) else []):
-                    if isinstance(v, dict):
-                        normalized[k] = v
-                    else:
-                        normalized[k] = {'hash': v, 'body': None, 'last_checked': None}
-                return normalized
-    except Exception:
-        pass
+        return snapshot_store.load(urls)
+    except Exception as e:
+        app.logger.warning(f"Could not load snapshots: {e}")
     return {}
 
 
-def _save_snapshots(snap):
+def _save_snapshot(url, entry):
+    """Persist one URL's snapshot immediately (one transaction per URL)."""
     try:
-        SNAPSHOTS_FILE.parent.mkdir(parents=True, exist_ok=True)
-        with SNAPSHOTS_FILE.open('w', encoding='utf-8') as f:
-            json.dump(snap, f, indent=2, ensure_ascii=False)
-    except Exception:
-        pass
+        snapshot_store.save(url, entry)
+    except Exception as e:
+        app.logger.warning(f"Could not save snapshot for {url}: {e}")
 
 
-def run_check_and_alert():
+def run_check_and_alert(urls=None, coordinator=None):
     """Check monitored URLs, detect body-hash changes and send Telegram alerts.
 
+    ``urls`` restricts the cycle to a subset of the watchlist (used by the
+    scheduler); by default every monitored URL is checked.
+    With a shard ``coordinator`` its leases are renewed during the cycle and
+    changes are only stored for URLs whose shard is still held.
     Returns a dict with per-URL status and whether a notification was sent.
     """
-    results = []
-    snapshots = _load_snapshots()
+    with app.app_context():
+        return _run_check_cycle(urls, coordinator)
 
-    # Build list of URLs to check from DB if possible, else from urls.json
-    urls_to_check = []
-    try:
-        with app.app_context():
-            musicals = Musical.query.all()
-            if musicals:
-                for m in musicals:
-                    links = MusicalLink.query.filter_by(musical_id=m.id).all()
-                    for ln in links:
-                        urls_to_check.append({'musical': m.name, 'url': ln.url, 'source': 'db'})
-    except Exception:
-        pass
-    # Also merge URLs from static/python/urls.json (avoid duplicates)
-    if URLS_FILE.exists():
-        try:
-            with URLS_FILE.open('r', encoding='utf-8') as f:
-                data = json.load(f)
-            if isinstance(data, list):
-                existing_urls = {entry.get('url') for entry in urls_to_check if entry.get('url')}
-                for item in data:
-                    name = item.get('musical') or item.get('name') or item.get('siteName') or 'unknown'
-                    urls = item.get('urls') or item.get('url') or []
-                    if isinstance(urls, str):
-                        urls = [urls]
-                    for u in urls:
-                        if u and u not in existing_urls:
-                            urls_to_check.append({'musical': name, 'url': u, 'source': 'file'})
-                            existing_urls.add(u)
-        except Exception as e:
-            app.logger.warning(f"Error reading {URLS_FILE}: {e}")
+
+def _build_watchlist():
+    """Watched entries (``watchlist.WatchEntry``) from the DB and urls.json, served from the resident index."""
+    with app.app_context():
+        return WATCHLIST.entries()
+
+
+def _run_check_cycle(urls=None, coordinator=None):
+    results = []
+    urls_to_check = _build_watchlist() if urls is None else WATCHLIST.lookup(urls)
 
     # Log which URLs we will check (useful for Render logs)
     if not urls_to_check:
@@ -843,8 +859,8 @@ def run_check_and_alert():
             # prepare a short preview of the first 20 entries
             preview_items = []
             for e in urls_to_check[:20]:
-                m = e.get('musical') or 'unknown'
-                u = e.get('url') or ''
+                m = e.musical or 'unknown'
+                u = e.url or ''
                 preview_items.append(f"{m}->{u}")
             preview_text = ", ".join(preview_items)
             more_text = f", ... (+{total-20} more)" if total > 20 else ""
@@ -852,219 +868,146 @@ def run_check_and_alert():
         except Exception:
             app.logger.info("Running check on URLs (unable to build preview)")
 
-    for entry in urls_to_check:
-        url = entry.get('url')
-        musical = entry.get('musical')
+    # Fetch stage runs concurrently; results are consumed in order so hashing,
+    # diffing, persistence and alerting behave exactly as before.
+    snapshots = _load_snapshots(entry.url for entry in urls_to_check)
+    norm_rules = normalizer.load_rules()
+    validators = {entry.url: conditional_headers(snapshots.get(entry.url)) for entry in urls_to_check}
+    limits = {entry.url: entry.max_body_bytes for entry in urls_to_check if entry.max_body_bytes}
+    stats = {'checked': 0, 'not_modified': 0, 'full_fetches': 0, 'truncated': 0, 'errors': 0, 'skipped': 0, 'bytes_downloaded': 0, 'bytes_saved': 0}
+    # change rows, their snapshots, alerts and link health, flushed in bulk
+    batch = ChangeBatch(channels=NOTIFIER.channels, on_commit=NOTIFIER.wake, on_delta=publish_musical_deltas,
+                        owns=coordinator.owns if coordinator is not None else None)
+    if NOTIFIER.channels:
+        NOTIFIER.start()
+    fetches = fetch_all((entry.url for entry in urls_to_check), validators=validators, limits=limits)
+    for entry, fetch in zip(urls_to_check, fetches):
+        url = entry.url
+        musical = entry.musical
+        r = None
+        if coordinator is not None and coordinator.renewal_due():
+            # keep our shards for the whole cycle; batches flush only URLs we still hold
+            coordinator.renew()
         try:
-            r = requests.get(url, timeout=8)
-            body = r.text or ''
-            h = hashlib.sha256(body.encode('utf-8')).hexdigest()
-
+            r = fetch.result()
+            stats['checked'] += 1
+            batch.record_outcome(url, r.status_code < 400)
             prev_entry = snapshots.get(url)
+            if r.status_code == 304 and validators.get(url):
+                # Not modified: skip download, hash and diff entirely
+                stats['not_modified'] += 1
+                stats['bytes_saved'] += (prev_entry or {}).get('body_size') or 0
+                prev_entry['last_checked'] = datetime.now(UTC).isoformat()
+                _save_snapshot(url, {'last_checked': prev_entry['last_checked']})
+                results.append({'musical': musical, 'url': url, 'status_code': r.status_code, 'changed': False, 'notified': False, 'diff_snippet': None, 'not_modified': True})
+                continue
+            stats['full_fetches'] += 1
+            stats['bytes_downloaded'] += len(r.content or b'')
+            stats['truncated'] += int(r.truncated)
+            # Raw bytes were hashed while streaming; text is decoded lazily below
+            h = r.sha256
+            body = None
+
             prev_hash = None
             prev_body = None
             if isinstance(prev_entry, dict):
                 prev_hash = prev_entry.get('hash')
-                prev_body = prev_entry.get('body')
             elif isinstance(prev_entry, str):
                 prev_hash = prev_entry
 
-            changed = (prev_hash is not None and prev_hash != h)
+            raw_changed = (prev_hash is not None and prev_hash != h)
+            prev_fingerprint = prev_entry.get('fingerprint') if isinstance(prev_entry, dict) else None
+
+            # Normalize (strip scripts/comments/noise) before fingerprinting;
+            # an identical raw body reuses the previous normalization.
+            if not raw_changed and prev_fingerprint:
+                text, stages = None, prev_entry.get('stages') or [['fingerprint', prev_fingerprint]]
+            else:
+                body = r.text or ''
+                text, stages = normalizer.normalize(body, url, norm_rules)
+            fingerprint = normalizer.fingerprint(stages)
+
+            # Snapshots written before normalization existed have no fingerprint:
+            # they become the new baseline instead of raising a spurious alert.
+            changed = (prev_fingerprint is not None and prev_fingerprint != fingerprint)
+            normalizer.record(raw_changed and prev_fingerprint is not None, changed,
+                              prev_entry.get('stages') if isinstance(prev_entry, dict) else None, stages)
             notified = False
             diff_snippet = None
 
             if changed:
-                # try to compute a unified diff if we have previous body
-                if prev_body is not None:
-                    prev_lines = prev_body.splitlines()
-                    curr_lines = body.splitlines()
-                    diff_lines = list(difflib.unified_diff(prev_lines, curr_lines, fromfile='before', tofile='after', lineterm=''))
-                    if diff_lines:
-                        diff_text = '\n'.join(diff_lines)
-                        # truncate to a safe size for messages and logs
-                        max_chars = 1200
-                        diff_snippet = diff_text if len(diff_text) <= max_chars else diff_text[:max_chars] + '\n... (truncated)'
-                # send Telegram notification (sync via asyncio.run)
+                # previous body/text are only read back from the blob store when needed
+                prev_body = snapshot_store.resolve(prev_entry, 'body')
+                prev_text = snapshot_store.resolve(prev_entry, 'text')
+                # try to compute a unified diff of the normalized text (raw bodies as fallback)
+                before, after = (prev_text, text) if prev_text is not None else (prev_body, body)
+                if before is not None:
+                    # time- and size-bounded diff, already truncated to a safe size for messages and logs
+                    diff_snippet = diff_engine.diff(before, after or '')
+                # queued in the outbox with the change row; the dispatcher delivers it
                 msg = f"🔔 Cambio detectado en {musical}: {url}"
                 if diff_snippet:
                     msg = msg + "\n\nDiff (truncated):\n" + diff_snippet
 
-                try:
-                    asyncio.run(send_telegram_notification_async(msg))
-                    notified = True
-                except Exception:
-                    notified = False
-
-                # Persist change to DB if possible
-                try:
-                    with app.app_context():
-                        # Prefer to find a MusicalLink by URL
-                        link = MusicalLink.query.filter_by(url=url).first()
-                        if link:
-                            old_val = (prev_body or '')[:20000]
-                            new_val = (body or '')[:20000]
-                            change = MusicalChange(
-                                musical_id=link.musical_id,
-                                change_type='page_diff',
-                                url=url,
-                                status_code=(r.status_code if 'r' in locals() and hasattr(r, 'status_code') else None),
-                                notified=bool(notified),
-                                diff_snippet=(diff_snippet or None),
-                                old_value=old_val,
-                                new_value=new_val,
-                                created_at=datetime.now(UTC)
-                            )
-                            db.session.add(change)
-                            # update last_checked on link
-                            try:
-                                link.last_checked = datetime.now(UTC)
-                            except Exception:
-                                pass
-                            # Update musical's updated_at timestamp
-                            try:
-                                musical_obj = Musical.query.get(link.musical_id)
-                                if musical_obj:
-                                    musical_obj.updated_at = datetime.now(UTC)
-                            except Exception:
-                                pass
-                            db.session.commit()
-                            app.logger.info(f"Saved change to DB for musical_id={link.musical_id} url={url}")
-                        else:
-                            # Try to match by musical name
-                            musical_obj = Musical.query.filter_by(name=musical).first()
-                            if musical_obj:
-                                old_val = (prev_body or '')[:20000]
-                                new_val = (body or '')[:20000]
-                                change = MusicalChange(
-                                    musical_id=musical_obj.id,
-                                    change_type='page_diff',
-                                    url=url,
-                                    status_code=(r.status_code if 'r' in locals() and hasattr(r, 'status_code') else None),
-                                    notified=bool(notified),
-                                    diff_snippet=(diff_snippet or None),
-                                    old_value=old_val,
-                                    new_value=new_val,
-                                    created_at=datetime.now(UTC)
-                                )
-                                db.session.add(change)
-                                # Update musical's updated_at timestamp
-                                musical_obj.updated_at = datetime.now(UTC)
-                                db.session.commit()
-                                app.logger.info(f"Saved change to DB for musical (by name) id={musical_obj.id} url={url}")
-                except Exception as e:
-                    app.logger.warning(f"Could not persist change to DB for {url}: {e}")
-
-            # store limited body to avoid unbounded snapshots sizes
-            store_body = body if len(body) <= 20000 else body[:20000]
-            snapshots[url] = {'hash': h, 'body': store_body, 'last_checked': datetime.now(UTC).isoformat()}
+            snapshots[url] = {
+                'hash': h,
+                'fingerprint': fingerprint,
+                'stages': stages,
+                'last_checked': datetime.now(UTC).isoformat(),
+                'etag': r.headers.get('ETag'),
+                'last_modified': r.headers.get('Last-Modified'),
+            }
+            # store limited body/text to avoid unbounded snapshot sizes (only when decoded)
+            if body is not None:
+                snapshots[url]['body'] = body[:20000]
+            if text is not None:
+                snapshots[url]['text'] = text[:20000]
+            if changed:
+                # change row + snapshot are committed together with the cycle's batch
+                batch.add_change(url, musical, prev_body, body, snapshot=snapshots[url], message=msg,
+                                 status_code=r.status_code, notified=False, diff_snippet=(diff_snippet or None))
+            else:
+                _save_snapshot(url, snapshots[url])
 
-            results.append({'musical': musical, 'url': url, 'status_code': r.status_code, 'changed': changed, 'notified': notified, 'diff_snippet': diff_snippet})
+            results.append({'musical': musical, 'url': url, 'status_code': r.status_code, 'changed': changed, 'notified': notified, 'queued': bool(changed and NOTIFIER.channels), 'diff_snippet': diff_snippet, 'truncated': r.truncated})
+        except HostBlocked as e:
+            # Host is rate limited or its breaker is open: not the link's fault
+            stats['skipped'] += 1
+            results.append({'musical': musical, 'url': url, 'error': str(e), 'skipped': True, 'changed': False, 'notified': False})
         except Exception as e:
+            stats['errors'] += 1
+            if r is None:
+                # the fetch itself failed (processing errors are not the link's fault)
+                batch.record_outcome(url, False)
             results.append({'musical': musical, 'url': url, 'error': str(e), 'changed': False, 'notified': False})
-
-    _save_snapshots(snapshots)
+    fetches.close()
+    if coordinator is not None and coordinator.renewal_due():
+        coordinator.renew()
+    batch.flush()
+    stats['changes_saved'] = batch.written
+
+    LAST_CHECK_STATS.clear()
+    LAST_CHECK_STATS.update(stats, finished_at=datetime.now(UTC).isoformat())
+    app.logger.info(
+        f"Check cycle done: {stats['not_modified']} not modified (304), {stats['full_fetches']} full fetches, "
+        f"{stats['errors']} errors, {stats['skipped']} skipped (host blocked), ~{stats['bytes_saved']} bytes saved"
+    )
     return results
 
 @app.route("/api/calendar-events", methods=["GET"])
 def api_calendar_events():
-    """Get events formatted for FullCalendar, with custom exclusions"""
-    from datetime import datetime, timedelta
-    
-    events = load_events()
-    exclusions = load_exclusions()
-    
-    # Debug: verificar que los eventos tienen imagen y URL
-    print(f"📊 Cargando {len(events)} eventos base")
-    for evt in events[:3]:  # Mostrar primeros 3
-        print(f"  - {evt.get('title')}: image={evt.get('image')}, url={evt.get('url')}")
-    
-    # Transform to FullCalendar format
-    calendar_events = []
-    
-    for event in events:
-        start_date = datetime.strptime(event.get('start'), '%Y-%m-%d')
-        end_date = datetime.strptime(event.get('end'), '%Y-%m-%d')
-        
-        musical_name = event.get('musical', '').lower()
-        musical_exclusions = exclusions.get(musical_name, {})
-        
-        # Get exclusion rules
-        exclude_dates = set(musical_exclusions.get('exclude_dates', []))
-        include_mondays = set(musical_exclusions.get('include_mondays', []))
-        only_dates = musical_exclusions.get('only_dates', None)
-        
-        # Determine color class
-        if 'wicked' in musical_name:
-            class_name = 'event-wicked'
-        elif 'book of mormon' in musical_name:
-            class_name = 'event-book-mormon'
-        elif 'misérables' in musical_name or 'miserables' in musical_name:
-            class_name = 'event-les-miserables'
-        elif 'rey león' in musical_name or 'rey leon' in musical_name:
-            class_name = 'event-rey-leon'
-        elif 'houdini' in musical_name:
-            class_name = 'event-houdini'
-        elif 'cabaret' in musical_name:
-            class_name = 'event-cabaret'
-        elif 'cenicienta' in musical_name:
-            class_name = 'event-cenicienta'
-        elif 'rent' in musical_name:
-            class_name = 'event-rent'
-        elif 'six' in musical_name:
-            class_name = 'event-six'
-        else:
-            class_name = 'event-default'
-        
-        # Generate daily events
-        current_date = start_date
-        while current_date <= end_date:
-            date_str = current_date.strftime('%Y-%m-%d')
-            is_monday = current_date.weekday() == 0
-            
-            should_include = False
-            
-            # Check if musical has "only_dates" rule
-            if only_dates is not None:
-                should_include = date_str in only_dates
-            else:
-                # Normal logic: exclude Mondays unless specified
-                if is_monday:
-                    should_include = date_str in include_mondays
-                else:
-                    should_include = date_str not in exclude_dates
-            
-            if should_include:
-                # IMPORTANTE: Incluir todos los campos del evento original
-                calendar_event = {
-                    'id': f"{event.get('id')}-{current_date.strftime('%Y%m%d')}",
-                    'title': event.get('title', event.get('musical', 'Sin título')),
-                    'start': date_str,
-                    'allDay': True,
-                    'className': class_name,
-                    'extendedProps': {
-                        'musical': event.get('musical', ''),
-                        'location': event.get('location', ''),
-                        'description': event.get('description', ''),
-                        'image': event.get('image', ''),
-                        'url': event.get('url', ''),
-                        'type': event.get('type', '')
-                    }
-                }
-                calendar_events.append(calendar_event)
-            
-            # Move to next day
-            current_date += timedelta(days=1)
-    
-    print(f"✅ Generated {len(calendar_events)} calendar events")
-    
-    # Debug: verificar primer evento generado
-    if calendar_events:
-        sample = calendar_events[0]
-        print(f"🔍 Primer evento: {sample['title']}")
-        print(f"   - image: {sample['extendedProps'].get('image')}")
-        print(f"   - url: {sample['extendedProps'].get('url')}")
-    
-    return jsonify(calendar_events)
+    """Get events formatted for FullCalendar, with custom exclusions.
+
+    Optional ``start``/``end`` (ISO date or datetime, as sent by FullCalendar)
+    limit the response to occurrences in that range, both days included.
+    ``format=compact`` returns one object per run with its recurrence rule
+    instead of one object per day.
+    """
+    start = calendar_index.parse_day(request.args.get('start'))
+    end = calendar_index.parse_day(request.args.get('end'))
+    if request.args.get('format') == 'compact':
+        return Response(CALENDAR.compact(start, end), mimetype='application/json')
+    return Response(CALENDAR.between(start, end), mimetype='application/json')
 
 
 @app.route("/api/changes", methods=["GET"])
@@ -1097,132 +1040,23 @@ def api_get_changes():
                 'status_code': getattr(r, 'status_code', None),
                 'notified': bool(getattr(r, 'notified', False)),
                 'diff_snippet': (getattr(r, 'diff_snippet', None) or '')[:2000],
-                'old_value': (r.old_value or '')[:2000],
-                'new_value': (r.new_value or '')[:2000],
+                'old_value': (r.old_value or blob_store.get(r.old_hash) or '')[:2000],
+                'new_value': (r.new_value or blob_store.get(r.new_hash) or '')[:2000],
                 'created_at': r.created_at.isoformat() if r.created_at else None
             })
         return jsonify(out)
 
-# Definir colores para cada musical
-MUSICAL_COLORS = {
-    'wicked': '#2ecc71',                    # Verde
-    'the book of mormon': '#e74c3c',        # Rojo
-    'les misérables': '#3498db',            # Azul
-    'el rey león': '#f39c12',               # Naranja/Amarillo
-    'cabaret': '#34495e',                   # Gris oscuro
-    'houdini': '#e67e22',                   # Naranja oscuro
-    'cenicienta': '#ec407a',                # Rosa
-    'oliver twist': '#78909c',              # Gris azulado
-    'raffaella': '#ab47bc',                 # Morado
-    'los pilares de la tierra': '#26a69a',  # Verde azulado
-}
-
-@app.route('/api/calendar-events')
-def get_calendar_events():
-    """Obtener eventos del calendario con colores específicos"""
-    try:
-        # Accept optional start/end query params (ISO date strings)
-        start_q = request.args.get('start')
-        end_q = request.args.get('end')
-        from datetime import datetime
-        start_dt = None
-        end_dt = None
-        if start_q:
-            try:
-                start_dt = datetime.fromisoformat(start_q)
-            except Exception:
-                start_dt = None
-        if end_q:
-            try:
-                end_dt = datetime.fromisoformat(end_q)
-            except Exception:
-                end_dt = None
-
-        events_out = []
-
-        # Prefer events.json source if present
-        if EVENTS_FILE.exists():
-            raw = load_events()
-            from datetime import datetime, timedelta
-            for ev in raw:
-                try:
-                    ev_start = datetime.strptime(ev.get('start'), '%Y-%m-%d')
-                    ev_end = datetime.strptime(ev.get('end'), '%Y-%m-%d')
-                except Exception:
-                    continue
-
-                # expand daily occurrences
-                cur = ev_start
-                while cur <= ev_end:
-                    # range filter
-                    if start_dt and cur.date() < (start_dt.date() if hasattr(start_dt,'date') else start_dt):
-                        cur = cur + timedelta(days=1)
-                        continue
-                    if end_dt and cur.date() > (end_dt.date() if hasattr(end_dt,'date') else end_dt):
-                        break
-
-                    date_str = cur.strftime('%Y-%m-%d')
-                    events_out.append({
-                        'id': f"{ev.get('id','e')}-{date_str}",
-                        'title': ev.get('title') or ev.get('musical') or 'Evento',
-                        'start': date_str,
-                        'allDay': True,
-                        'extendedProps': {
-                            'musical': ev.get('musical'),
-                            'location': ev.get('location'),
-                            'description': ev.get('description'),
-                            'image': ev.get('image'),
-                            'url': ev.get('url'),
-                            'type': ev.get('type')
-                        }
-                    })
-                    cur = cur + timedelta(days=1)
-
-            return jsonify(events_out)
-
-        # Fallback: build from DB musicals (limited, requires link dates)
-        musicals = Musical.query.all()
-        for musical in musicals:
-            musical_name = musical.name.lower()
-            color = MUSICAL_COLORS.get(musical_name, '#95a5a6')
-            css_class = 'event-' + musical_name.replace(' ', '-')
-            for link in musical.links:
-                # Attempt to use last_checked/created_at if no explicit date
-                dt = None
-                if hasattr(link, 'date') and getattr(link, 'date'):
-                    dt = getattr(link, 'date')
-                elif getattr(link, 'last_checked', None):
-                    dt = getattr(link, 'last_checked')
-                elif getattr(link, 'created_at', None):
-                    dt = getattr(link, 'created_at')
-                if not dt:
-                    continue
-                if start_dt and dt.date() < (start_dt.date() if hasattr(start_dt,'date') else start_dt):
-                    continue
-                if end_dt and dt.date() > (end_dt.date() if hasattr(end_dt,'date') else end_dt):
-                    continue
-                events_out.append({
-                    'title': musical.name,
-                    'start': dt.isoformat(),
-                    'backgroundColor': color,
-                    'borderColor': color,
-                    'textColor': '#ffffff',
-                    'classNames': [css_class],
-                    'extendedProps': {
-                        'musical': musical.name,
-                        'url': link.url,
-                        'isAvailable': link.is_available,
-                        'image': (musical.images[0] if musical.images else None),
-                        'description': f"{'✅ Disponible' if link.is_available else '❌ Agotado'}",
-                        'location': 'N/A'
-                    }
-                })
-
-        return jsonify(events_out)
-    except Exception as e:
-        print(f"❌ Error generating calendar events: {e}")
-        return jsonify([]), 500
-
+@app.route("/api/normalization-stats", methods=["GET"])
+def api_normalization_stats():
+    """How many raw page changes each normalization rule suppressed."""
+    rules = normalizer.load_rules()
+    return jsonify({
+        'stats': normalizer.get_stats(),
+        'rules': {
+            'global': [rule.name for rule in rules['global']],
+            'hosts': {host: [rule.name for rule in items] for host, items in rules['hosts'].items()},
+        }
+    })
 
 # Admin test endpoint for notifications (Telegram + Discord)
 @app.route('/admin/test-telegram', methods=['GET', 'POST'])
@@ -1279,7 +1113,11 @@ def health_check():
             'ok': True,
             'time': datetime.now(UTC).isoformat(),
             'port_env': int(os.getenv('PORT', 0)),
-            'monitor_interval': int(os.getenv('MONITOR_INTERVAL', '5'))
+            'monitor_interval': MONITOR_INTERVAL,
+            'last_check': LAST_CHECK_STATS,
+            'blocked_hosts': HOST_GUARD.status(),
+            'notifications': NOTIFIER.stats,
+            'mail': MAILER.stats
         })
     except Exception as e:
         return jsonify({'ok': False, 'error': str(e)}), 500
@@ -1293,31 +1131,104 @@ def about_page():
         app.logger.error(f"Error rendering about page: {e}")
         return "About page is unavailable", 500
 
+# ==================== BACKGROUND MONITOR ====================
+try:
+    MONITOR_INTERVAL = int(os.getenv('MONITOR_INTERVAL', '5'))
+except Exception:
+    MONITOR_INTERVAL = 5
+MONITOR_MIN_INTERVAL = int(os.getenv('MONITOR_MIN_INTERVAL', str(max(1, MONITOR_INTERVAL // 2))))
+MONITOR_MAX_INTERVAL = int(os.getenv('MONITOR_MAX_INTERVAL', str(MONITOR_INTERVAL * 20)))
+MONITOR_JITTER = float(os.getenv('MONITOR_JITTER', '0.1'))
+# How often the scheduler re-reads the watchlist to pick up added/removed links
+WATCHLIST_SYNC_SECONDS = 60
+MONITOR_MAX_SLEEP = 5
+
+
+def _monitor_loop(coordinator):
+    scheduler = LinkScheduler(MONITOR_INTERVAL, MONITOR_MIN_INTERVAL, MONITOR_MAX_INTERVAL, MONITOR_JITTER)
+    app.logger.info(
+        f"Background monitor started as {coordinator.worker_id} (interval={MONITOR_INTERVAL}s, "
+        f"min={scheduler.min_interval}s, max={scheduler.max_interval}s, shards={coordinator.num_shards})"
+    )
+    heartbeat_every = coordinator.lease_seconds / 3
+    last_sync = last_heartbeat = 0
+    synced_version = None
+    while True:
+        due = []
+        try:
+            if time.time() - last_heartbeat >= heartbeat_every:
+                owned_before = coordinator.owned
+                try:
+                    with app.app_context():
+                        coordinator.heartbeat()
+                finally:
+                    last_heartbeat = time.time()
+                    if coordinator.owned != owned_before:
+                        app.logger.info(f"Monitor shards owned by {coordinator.worker_id}: {sorted(coordinator.owned)}")
+                        last_sync = 0
+            entries = _build_watchlist()
+            if WATCHLIST.version != synced_version or time.time() - last_sync >= WATCHLIST_SYNC_SECONDS:
+                with app.app_context():
+                    urls = coordinator.filter_urls([entry.url for entry in entries])
+                    scheduler.sync(urls, snapshot_store.load_schedule(urls))
+                synced_version = WATCHLIST.version
+                last_sync = time.time()
+            due = scheduler.due()
+            if due:
+                results = run_check_and_alert(due, coordinator)
+                schedule = {}
+                for res in results:
+                    schedule[res['url']] = scheduler.record(res['url'], changed=res.get('changed'), failed='error' in res)
+                with app.app_context():
+                    snapshot_store.save_schedule(schedule)
+                due = []
+        except Exception as e:
+            app.logger.error(f"Background check error: {e}")
+            # never drop URLs from the queue because a cycle blew up
+            for url in due:
+                scheduler.record(url, failed=True)
+            if not coordinator.owned:
+                scheduler.sync([])
+        wake = scheduler.next_wakeup()
+        delay = MONITOR_MAX_SLEEP if wake is None else wake - time.time()
+        delay = min(delay, last_heartbeat + heartbeat_every - time.time())
+        time.sleep(min(MONITOR_MAX_SLEEP, max(0.5, delay)))
+
+
+# lease coordinator of this process's background monitor (None when it is not running)
+MONITOR_COORDINATOR = None
+
+
+def _start_background_monitor():
+    """Start this process's monitor thread; shards are coordinated with other workers via leases."""
+    global MONITOR_COORDINATOR
+    coordinator = MONITOR_COORDINATOR = ShardCoordinator()
+    with app.app_context():
+        # shards split big hosts across workers, so their per-host rate is counted in the database
+        HOST_GUARD.quota = HostQuota(db.engine)
+
+    def _release():
+        with app.app_context():
+            coordinator.release()
+
+    atexit.register(_release)
+    # also drains alerts left in the outbox by a previous run
+    NOTIFIER.start()
+    t = threading.Thread(target=_monitor_loop, args=(coordinator,), daemon=True, name='background-monitor')
+    t.start()
+    return t
+
+
+# Background monitor is opt-in. Set START_MONITOR=1 to enable background checks in every
+# process (gunicorn workers included); leases keep them from checking the same URLs.
+if os.getenv('START_MONITOR', '0') == '1':
+    app.logger.info('START_MONITOR=1 detected; starting background monitor')
+    _start_background_monitor()
+else:
+    app.logger.info('Background monitor disabled by default. Set START_MONITOR=1 to enable.')
+
+
 # ==================== RUN ====================
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
-    # Start background monitor thread if requested
-    try:
-        monitor_interval = int(os.getenv('MONITOR_INTERVAL', '5'))
-    except Exception:
-        monitor_interval = 5
-
-    def _start_background_monitor():
-        def _loop():
-            app.logger.info(f"Background monitor started (interval={monitor_interval}s)")
-            while True:
-                try:
-                    run_check_and_alert()
-                except Exception as e:
-                    app.logger.error(f"Background check error: {e}")
-                time.sleep(monitor_interval)
-        t = threading.Thread(target=_loop, daemon=True)
-        t.start()
-
-    # Background monitor is opt-in. Set START_MONITOR=1 to enable background checks.
-    if os.getenv('START_MONITOR', '0') == '1':
-        app.logger.info('START_MONITOR=1 detected; starting background monitor')
-        _start_background_monitor()
-    else:
-        app.logger.info('Background monitor disabled by default. Set START_MONITOR=1 to enable.')
-    socketio.run(app, debug=False, host='0.0.0.0', port=port)
\ No newline at end of file
+    socketio.run(app, debug=False, host='0.0.0.0', port=port)
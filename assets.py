@@ -0,0 +1,138 @@
+"""
+Fingerprinted, minified and precompressed builds of the front-end assets.
+
+``main.js``, ``calendar.js`` and ``style.css`` used to be served as written
+(comments and indentation included) with a date query string for cache
+busting, and Flask-Compress gzipped them again on every request.
+:func:`build` (run by ``static/python/build_assets.py`` at deploy time)
+minifies each file in :data:`ASSETS`, writes it to ``static/dist`` under a
+content-hashed name (``js/main.<hash>.js``) next to ``.gz`` and ``.br``
+copies, and records ``source -> built`` names in ``static/dist/manifest.json``.
+
+Templates call :func:`asset_url` (the ``asset_url`` Jinja global), which
+returns the built URL when the manifest lists the asset and the original
+``/static/...`` URL otherwise, so a tree that was never built still works.
+Built files never change once written, so ``serve_asset`` sends them with
+``Cache-Control: immutable`` and picks the precompressed copy from
+``Accept-Encoding`` (see :func:`pick_encoding`).
+
+Minification uses ``rjsmin``/``rcssmin`` when they are installed; without
+them files are copied as they are (still hashed and precompressed).
+"""
+import gzip
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+import json_store
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+STATIC_DIR = Path(__file__).parent / 'static'
+DIST_NAME = 'dist'
+DIST_DIR = STATIC_DIR / DIST_NAME
+MANIFEST_FILE = DIST_DIR / 'manifest.json'
+ASSETS = ('js/main.js', 'js/calendar.js', 'css/style.css')
+ASSET_MAX_AGE = int(os.getenv('ASSET_MAX_AGE', str(365 * 24 * 3600)))  # segundos
+HASH_LENGTH = 10
+# (Content-Encoding, file suffix), in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+logger = logging.getLogger(__name__)
+
+
+def minify(name, text):
+    """Minified ``text`` of the asset ``name`` (unchanged if no minifier is available)."""
+    if name.endswith('.js') and rjsmin is not None:
+        return rjsmin.jsmin(text)
+    if name.endswith('.css') and rcssmin is not None:
+        return rcssmin.cssmin(text)
+    return text
+
+
+def hashed_name(name, content):
+    """``js/main.js`` -> ``js/main.<hash>.js`` for ``content`` (bytes)."""
+    digest = hashlib.sha256(content).hexdigest()[:HASH_LENGTH]
+    stem, ext = os.path.splitext(name)
+    return f"{stem}.{digest}{ext}"
+
+
+def _write_bytes(path, content):
+    """Write ``content`` to ``path`` through a temp file, skipping it if already there."""
+    if path.exists() and path.stat().st_size == len(content):
+        return
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(content)
+    os.replace(tmp, path)
+
+
+def _compressed(content):
+    """``{suffix: bytes}`` precompressed copies of ``content``."""
+    out = {'.gz': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        out['.br'] = brotli.compress(content, quality=11)
+    return out
+
+
+def build(static_dir=STATIC_DIR, dist_dir=DIST_DIR, assets=ASSETS):
+    """Build every asset into ``dist_dir``, write the manifest and drop stale files.
+
+    Returns the manifest (``{source name: built path relative to static_dir}``).
+    """
+    static_dir, dist_dir = Path(static_dir), Path(dist_dir)
+    dist_prefix = dist_dir.relative_to(static_dir).as_posix()
+    manifest, keep = {}, {dist_dir / 'manifest.json'}
+    for name in assets:
+        source = static_dir / name
+        text = source.read_text(encoding='utf-8')
+        content = minify(name, text).encode('utf-8')
+        built = hashed_name(name, content)
+        target = dist_dir / built
+        _write_bytes(target, content)
+        keep.add(target)
+        for suffix, data in _compressed(content).items():
+            _write_bytes(target.with_name(target.name + suffix), data)
+            keep.add(target.with_name(target.name + suffix))
+        manifest[name] = f"{dist_prefix}/{built}"
+        logger.info(f"📦 {name} -> {manifest[name]} ({len(text.encode('utf-8'))} -> {len(content)} bytes)")
+    json_store.write(dist_dir / 'manifest.json', manifest)
+    # previous builds of these assets are no longer referenced by any template
+    for path in dist_dir.rglob('*'):
+        if path.is_file() and path not in keep:
+            path.unlink()
+    return manifest
+
+
+def asset_url(name):
+    """URL of the asset ``name`` (e.g. ``js/main.js``): the built file if there is one."""
+    built = json_store.load(MANIFEST_FILE, {}).get(name)
+    return f"/static/{built or name}"
+
+
+def is_built(filename):
+    """True if ``filename`` (relative to ``static/``) is a built asset (not the manifest or a compressed copy)."""
+    return (filename.startswith(DIST_NAME + '/') and not filename.endswith('manifest.json')
+            and not filename.endswith(tuple(suffix for _, suffix in ENCODINGS)))
+
+
+def pick_encoding(filename, accept_encodings, static_dir=STATIC_DIR):
+    """``(path, encoding)`` to send for a built file: a precompressed copy the client accepts, else the file itself."""
+    for encoding, suffix in ENCODINGS:
+        if accept_encodings[encoding] and os.path.isfile(os.path.join(static_dir, filename + suffix)):
+            return filename + suffix, encoding
+    return filename, None
@@ -0,0 +1,179 @@
+"""
+Content-addressed, compressed storage for page bodies (``content_blobs`` table).
+
+The same page body used to be stored over and over: once in every snapshot
+and twice (old/new) in every ``MusicalChange`` row. Bodies are now stored
+once, keyed by their SHA-256, compressed with zstd when ``zstandard`` is
+installed (zlib otherwise) and reference counted; snapshots and change rows
+only keep the hash. Reference counts are only ever changed by atomic
+``UPDATE`` statements and blobs are inserted with ``ON CONFLICT DO NOTHING``,
+so several monitor workers can share the table.
+
+All functions expect an active Flask application context.
+"""
+import hashlib
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timezone
+from threading import Lock
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+
+from models import db, ContentBlob
+
+try:
+    import zstandard
+    DEFAULT_CODEC = 'zstd'
+except ImportError:
+    zstandard = None
+    DEFAULT_CODEC = 'zlib'
+
+CACHE_SIZE = 256
+
+_cache = OrderedDict()
+_cache_lock = Lock()
+
+
+def digest(text):
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def _compress(raw, codec):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 9)
+
+
+def _decompress(data, codec):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read zstd-compressed blobs')
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def _insert_ignore(rows):
+    """INSERT ``rows`` into content_blobs, skipping hashes that already exist.
+
+    For a single row, returns whether it was inserted.
+    """
+    if not rows:
+        return 0
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(ContentBlob.__table__).on_conflict_do_nothing(index_elements=['hash'])
+        if len(rows) == 1:
+            return db.session.execute(stmt, rows[0]).rowcount == 1
+        db.session.execute(stmt, rows)
+        return None
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(ContentBlob.__table__.insert(), [row])
+            inserted += 1
+        except IntegrityError:
+            pass  # another worker stored it first
+    return inserted == 1 if len(rows) == 1 else None
+
+
+def _row(h, text, refcount):
+    raw = text.encode('utf-8')
+    return {'hash': h, 'codec': DEFAULT_CODEC, 'data': _compress(raw, DEFAULT_CODEC), 'size': len(raw),
+            'refcount': refcount, 'created_at': datetime.now(timezone.utc)}
+
+
+def _add_refs(h, delta):
+    """Atomically add ``delta`` to a blob's refcount; False if the blob does not exist."""
+    table = ContentBlob.__table__
+    result = db.session.execute(table.update().where(table.c.hash == h).values(refcount=table.c.refcount + delta))
+    return result.rowcount == 1
+
+
+def preload(texts):
+    """Store the blobs of ``texts`` that do not exist yet (with no references) in one query and one insert.
+
+    Later :func:`put` calls for them are then a single ``UPDATE``. Returns
+    their hashes.
+    """
+    by_hash = {digest(text): text for text in texts if text is not None}
+    if not by_hash:
+        return []
+    existing = {h for (h,) in db.session.query(ContentBlob.hash).filter(ContentBlob.hash.in_(list(by_hash)))}
+    _insert_ignore([_row(h, text, 0) for h, text in by_hash.items() if h not in existing])
+    return list(by_hash)
+
+
+def put(text):
+    """Store ``text`` (if new) and take one reference to it. Returns its hash.
+
+    Reference counts are only changed with ``refcount = refcount + 1``
+    statements, so concurrent workers never lose an increment. The caller's
+    transaction is not committed here.
+    """
+    if text is None:
+        return None
+    h = digest(text)
+    # the blob can be inserted or deleted by another worker in between: retry until one step wins
+    while not _add_refs(h, 1):
+        if _insert_ignore([_row(h, text, 1)]):
+            break
+    return h
+
+
+def release(h):
+    """Drop one reference to a blob and delete it once nothing points at it."""
+    if not h:
+        return
+    if not _add_refs(h, -1):
+        return
+    table = ContentBlob.__table__
+    deleted = db.session.execute(table.delete().where(table.c.hash == h).where(table.c.refcount <= 0)).rowcount
+    if deleted:
+        with _cache_lock:
+            _cache.pop(h, None)
+
+
+def get(h):
+    """Return the decompressed text of a blob (``None`` if unknown)."""
+    if not h:
+        return None
+    with _cache_lock:
+        if h in _cache:
+            _cache.move_to_end(h)
+            return _cache[h]
+    blob = db.session.get(ContentBlob, h)
+    if blob is None:
+        return None
+    text = _decompress(blob.data, blob.codec).decode('utf-8')
+    with _cache_lock:
+        _cache[h] = text
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return text
+
+
+def size(h):
+    """Uncompressed size in bytes of a blob, without decompressing it."""
+    if not h:
+        return 0
+    return db.session.query(ContentBlob.size).filter_by(hash=h).scalar() or 0
+
+
+def release_on_delete(model, *columns):
+    """Release the blobs referenced by ``columns`` whenever a ``model`` row is deleted."""
+    table = ContentBlob.__table__
+
+    @event.listens_for(model, 'after_delete')
+    def _release(mapper, connection, target):
+        for column in columns:
+            h = getattr(target, column, None)
+            if not h:
+                continue
+            connection.execute(table.update().where(table.c.hash == h).values(refcount=table.c.refcount - 1))
+            connection.execute(table.delete().where(table.c.hash == h).where(table.c.refcount <= 0))
@@ -0,0 +1,207 @@
+"""
+Date-indexed occurrences for ``/api/calendar-events``.
+
+The endpoint used to re-read ``events.json`` and ``exclusions.json`` on every
+request and expand every event into one dict per day with a ``while`` loop,
+only then filtering by the ``start``/``end`` FullCalendar asked for.
+:class:`CalendarIndex` expands the events once, applies the exclusion rules,
+and keeps the daily occurrences sorted by date next to a parallel list of
+their dates, each already serialized to JSON. It is rebuilt only when the
+mtime (or size) of either file changes; a range query is two ``bisect``
+calls and a slice.
+
+``?format=compact`` skips the per-day expansion altogether: each event is
+sent once with a :func:`recurrence` rule (weekly pattern plus ``exdate`` /
+``rdate`` lists) that ``static/js/calendar.js`` expands in the browser.
+"""
+import bisect
+import json
+import logging
+import threading
+from datetime import date, datetime, timedelta
+
+import json_store
+
+logger = logging.getLogger(__name__)
+
+# (substrings of the lowercased musical name, CSS class); first match wins
+CLASS_NAMES = (
+    (('wicked',), 'event-wicked'),
+    (('book of mormon',), 'event-book-mormon'),
+    (('misérables', 'miserables'), 'event-les-miserables'),
+    (('rey león', 'rey leon'), 'event-rey-leon'),
+    (('houdini',), 'event-houdini'),
+    (('cabaret',), 'event-cabaret'),
+    (('cenicienta',), 'event-cenicienta'),
+    (('rent',), 'event-rent'),
+    (('six',), 'event-six'),
+)
+
+
+def class_name(musical_name):
+    for needles, css_class in CLASS_NAMES:
+        if any(needle in musical_name for needle in needles):
+            return css_class
+    return 'event-default'
+
+
+def parse_day(value):
+    """``date`` from a FullCalendar ``start``/``end`` (date or ISO datetime), None if missing/invalid."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+    except ValueError:
+        try:
+            return date.fromisoformat(value[:10])
+        except ValueError:
+            return None
+
+
+def _dumps(obj):
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+
+def _js_weekday(day):
+    """Day of week as JavaScript's ``Date.getDay()`` numbers it (0 = Sunday)."""
+    return (day.weekday() + 1) % 7
+
+
+def recurrence(start, end, rules):
+    """Recurrence of a run from ``start`` to ``end`` under its ``exclusions.json`` rules.
+
+    A day is on when its weekday is in ``daysOfWeek`` and it is not in
+    ``exdate``, or when it is in ``rdate``. Mondays are dark unless listed in
+    ``include_mondays``; ``only_dates`` replaces the weekly pattern entirely.
+    Dates outside the run are dropped.
+    """
+    lo, hi = start.isoformat(), end.isoformat()
+    only_dates = rules.get('only_dates')
+    if only_dates is not None:
+        return {'daysOfWeek': [], 'exdate': [], 'rdate': sorted(d for d in set(only_dates) if lo <= d <= hi)}
+    exdate, rdate = set(), set()
+    for date_str in rules.get('exclude_dates', []):
+        try:
+            day = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            continue
+        if lo <= date_str <= hi and day.weekday() != 0:
+            exdate.add(date_str)
+    for date_str in rules.get('include_mondays', []):
+        try:
+            day = date.fromisoformat(date_str)
+        except (TypeError, ValueError):
+            continue
+        if lo <= date_str <= hi and day.weekday() == 0:
+            rdate.add(date_str)
+    return {'daysOfWeek': [0, 2, 3, 4, 5, 6], 'exdate': sorted(exdate), 'rdate': sorted(rdate)}
+
+
+def parse_runs(events, exclusions):
+    """``(start, end, event_dict, recurrence)`` per valid event, in events.json order."""
+    for event in events:
+        try:
+            start = datetime.strptime(event.get('start'), '%Y-%m-%d').date()
+            end = datetime.strptime(event.get('end'), '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            logger.warning(f"Skipping calendar event with invalid dates: {event.get('id')}")
+            continue
+        musical_name = event.get('musical', '').lower()
+        yield start, end, {
+            'id': event.get('id'),
+            'title': event.get('title', event.get('musical', 'Sin título')),
+            'allDay': True,
+            'className': class_name(musical_name),
+            'extendedProps': {
+                'musical': event.get('musical', ''),
+                'location': event.get('location', ''),
+                'description': event.get('description', ''),
+                'image': event.get('image', ''),
+                'url': event.get('url', ''),
+                'type': event.get('type', ''),
+            },
+        }, recurrence(start, end, exclusions.get(musical_name, {}))
+
+
+def expand(runs):
+    """Daily occurrences of ``runs``, as ``[(date_str, occurrence)]`` sorted by date."""
+    out = []
+    for start, end, run, rule in runs:
+        weekdays, exdate, rdate = set(rule['daysOfWeek']), set(rule['exdate']), set(rule['rdate'])
+        day = start
+        while day <= end:
+            date_str = day.isoformat()
+            if (_js_weekday(day) in weekdays and date_str not in exdate) or date_str in rdate:
+                out.append((date_str, {
+                    'id': f"{run['id']}-{day.strftime('%Y%m%d')}",
+                    'title': run['title'],
+                    'start': date_str,
+                    'allDay': True,
+                    'className': run['className'],
+                    'extendedProps': run['extendedProps'],
+                }))
+            day += timedelta(days=1)
+    # stable: same-day occurrences keep events.json order
+    out.sort(key=lambda item: item[0])
+    return out
+
+
+class CalendarIndex:
+    def __init__(self, events_file, exclusions_file):
+        self.events_file = events_file
+        self.exclusions_file = exclusions_file
+        self._lock = threading.Lock()
+        self._sig = None
+        self._index = ([], [])  # (sorted dates, serialized occurrences), swapped as one
+        self._runs = []  # (start, end, serialized compact event)
+
+    def _signature(self):
+        return (json_store.signature(self.events_file), json_store.signature(self.exclusions_file))
+
+    def _refresh(self):
+        sig = self._signature()
+        if sig == self._sig:
+            return
+        with self._lock:
+            if sig == self._sig:
+                return
+            events = json_store.load(self.events_file, ())
+            exclusions = json_store.load(self.exclusions_file, {})
+            if not isinstance(events, tuple):
+                events = ()
+            runs = list(parse_runs(events, exclusions if isinstance(exclusions, dict) else {}))
+            occurrences = expand(runs)
+            self._runs = [
+                (start, end, _dumps({**run, 'start': start.isoformat(), 'end': end.isoformat(), 'recurrence': rule}))
+                for start, end, run, rule in runs
+            ]
+            self._index = (
+                [date_str for date_str, _ in occurrences],
+                [_dumps(occ) for _, occ in occurrences],
+            )
+            self._sig = sig
+            logger.info(f"📅 Calendar index rebuilt: {len(events)} events, {len(occurrences)} occurrences")
+
+    def between(self, start=None, end=None):
+        """JSON array (as text) of the occurrences with start <= date <= end; open ends are unbounded."""
+        self._refresh()
+        dates, encoded = self._index
+        lo = bisect.bisect_left(dates, start.isoformat()) if start else 0
+        hi = bisect.bisect_right(dates, end.isoformat()) if end else len(dates)
+        return '[' + ','.join(encoded[lo:hi]) + ']'
+
+    def compact(self, start=None, end=None):
+        """JSON array (as text) of the runs overlapping start..end, one object per event.
+
+        Each run carries its inclusive ``start``/``end`` and a ``recurrence``
+        (see :func:`recurrence`) for the client to expand.
+        """
+        self._refresh()
+        return '[' + ','.join(
+            encoded for run_start, run_end, encoded in self._runs
+            if (not start or run_end >= start) and (not end or run_start <= end)
+        ) + ']'
+
+    def __len__(self):
+        self._refresh()
+        return len(self._index[0])
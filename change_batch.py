@@ -0,0 +1,210 @@
+"""
+Buffered persistence of what a monitor cycle writes back to the database.
+
+Every detected change used to cost its own app context, an unindexed
+``MusicalLink`` lookup by URL, a ``Musical.query.get`` and a commit. A
+:class:`ChangeBatch` instead buffers, for the whole cycle:
+
+* the new ``MusicalChange`` rows (bodies go to the blob store),
+* the snapshots of the changed URLs, so a change row and the snapshot that
+  "consumed" it are always committed together,
+* ``MusicalLink.last_checked`` / failure streak updates (link quarantine),
+* the ``Musical.updated_at`` bumps,
+* the ``notification_outbox`` rows announcing each change (see
+  :mod:`notifier`), so an alert can never be lost or sent for a change that
+  was not stored,
+
+and writes them in one transaction with a handful of set-based statements,
+every ``MONITOR_FLUSH_SIZE`` changes and once more at the end of the cycle.
+With ``owns``, URLs whose shard this worker no longer holds are left out.
+After each successful commit ``on_delta`` receives one compact entry per
+affected musical (see :meth:`ChangeBatch._deltas`), which the app pushes to
+the dashboards over Socket.IO.
+
+All methods expect an active Flask application context.
+"""
+import logging
+import os
+from datetime import datetime, timezone
+
+from sqlalchemy import insert, update
+
+import blob_store
+import notifier
+import snapshot_store
+import watchlist
+from models import db, Musical, MusicalChange, MusicalLink
+
+MONITOR_FLUSH_SIZE = int(os.getenv('MONITOR_FLUSH_SIZE', '100'))
+# Bodies stored with a change row are capped like snapshot bodies
+MAX_STORED_CHARS = 20000
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeBatch:
+    def __init__(self, flush_size=MONITOR_FLUSH_SIZE, channels=(), on_commit=None, on_delta=None, owns=None):
+        self.flush_size = max(1, flush_size)
+        self.channels = tuple(channels)  # notification channels every change is queued on
+        self.on_commit = on_commit
+        self.on_delta = on_delta
+        self.owns = owns  # url -> bool: shard still held by this worker (None: everything is ours)
+        self.written = 0
+        self._changes = []
+        self._snapshots = {}
+        self._outcomes = {}
+
+    def __len__(self):
+        return len(self._changes)
+
+    def add_change(self, url, musical, old_body, new_body, snapshot=None, message=None, **fields):
+        """Queue a ``page_diff`` change (``fields``: status_code, diff_snippet...) and its alert ``message``."""
+        self._changes.append({
+            'url': url,
+            'musical': musical,
+            'message': message,
+            'old_body': (old_body or '')[:MAX_STORED_CHARS],
+            'new_body': (new_body or '')[:MAX_STORED_CHARS],
+            'fields': fields,
+            'created_at': datetime.now(timezone.utc),
+        })
+        if snapshot is not None:
+            self._snapshots[url] = snapshot
+        if len(self._changes) >= self.flush_size:
+            self.flush()
+
+    def record_outcome(self, url, ok):
+        """Remember whether ``url`` was fetched successfully (last_checked, quarantine)."""
+        self._outcomes[url] = bool(ok)
+
+    @staticmethod
+    def _update_links(links, outcomes, now):
+        """Apply fetch outcomes to ``links``; returns the links whose availability flipped."""
+        flipped = []
+        for link in links:
+            if link.url not in outcomes:
+                continue
+            link.last_checked = now
+            if outcomes[link.url]:
+                if watchlist.is_quarantined(link):
+                    link.is_available = True
+                    flipped.append(link)
+                    logger.info(f"✅ Link back online, quarantine lifted: {link.url}")
+                link.consecutive_failures = 0
+                continue
+            link.consecutive_failures = (link.consecutive_failures or 0) + 1
+            if link.consecutive_failures >= watchlist.MONITOR_QUARANTINE_AFTER and link.is_available:
+                link.is_available = False
+                flipped.append(link)
+                logger.warning(f"🚫 Link quarantined after {link.consecutive_failures} consecutive failures: {link.url}")
+        return flipped
+
+    @staticmethod
+    def _deltas(flipped, change_rows, now):
+        """One entry per musical with new change rows or links that flipped availability.
+
+        ``change_rows`` are ``(musical_id, change_id, created_at)``. Only the
+        fields that changed are present; datetimes use the naive UTC format
+        ``/api/musicals`` serves.
+        """
+        deltas = {}
+
+        def entry(musical_id):
+            return deltas.setdefault(musical_id, {'id': musical_id})
+
+        for musical_id, change_id, created_at in change_rows:
+            delta = entry(musical_id)
+            delta.setdefault('change_ids', []).append(change_id)
+            delta['last_change'] = max(delta.get('last_change', ''), created_at.replace(tzinfo=None).isoformat())
+            delta['updated_at'] = now.replace(tzinfo=None).isoformat()
+        for link in flipped:
+            entry(link.musical_id).setdefault('links', []).append({
+                'url': link.url,
+                'is_available': link.is_available,
+                'last_checked': now.replace(tzinfo=None).isoformat(),
+            })
+        return list(deltas.values())
+
+    def flush(self):
+        """Write everything buffered in a single transaction. Returns the number of change rows written."""
+        changes, snapshots, outcomes = self._changes, self._snapshots, self._outcomes
+        self._changes, self._snapshots, self._outcomes = [], {}, {}
+        if self.owns is not None:
+            # another worker took the shard over: it will detect and alert on these itself
+            dropped = sum(1 for c in changes if not self.owns(c['url']))
+            changes = [c for c in changes if self.owns(c['url'])]
+            snapshots = {url: s for url, s in snapshots.items() if self.owns(url)}
+            outcomes = {url: ok for url, ok in outcomes.items() if self.owns(url)}
+            if dropped:
+                logger.warning(f"Dropped {dropped} changes for shards this worker no longer holds")
+        if not (changes or snapshots or outcomes):
+            return 0
+        now = datetime.now(timezone.utc)
+        written = 0
+        deltas = []
+        try:
+            urls = set(outcomes) | {c['url'] for c in changes}
+            links = MusicalLink.query.filter(MusicalLink.url.in_(urls)).order_by(MusicalLink.id).all() if urls else []
+            flipped = self._update_links(links, outcomes, now)
+
+            # Resolve musicals: first link with the URL, else a musical with the same name
+            musical_by_url = {}
+            for link in links:
+                musical_by_url.setdefault(link.url, link.musical_id)
+            names = {c['musical'] for c in changes if c['url'] not in musical_by_url and c['musical']}
+            musical_by_name = {}
+            if names:
+                for musical_id, name in db.session.query(Musical.id, Musical.name).filter(Musical.name.in_(names)).order_by(Musical.id):
+                    musical_by_name.setdefault(name, musical_id)
+
+            blob_store.preload(text for c in changes for text in (c['old_body'], c['new_body']))
+            rows, stored, touched, change_rows = [], [], set(), []
+            policy = notifier.load_policy() if self.channels else None
+            for c in changes:
+                musical_id = musical_by_url.get(c['url']) or musical_by_name.get(c['musical'])
+                if musical_id is None:
+                    logger.warning(f"No musical found for change on {c['url']}; not persisted")
+                    if c['message'] and self.channels:
+                        notifier.enqueue(self.channels, c['message'], musical=c['musical'], url=c['url'], policy=policy)
+                    continue
+                stored.append(c)
+                rows.append(dict(
+                    musical_id=musical_id,
+                    change_type='page_diff',
+                    url=c['url'],
+                    old_hash=blob_store.put(c['old_body']),
+                    new_hash=blob_store.put(c['new_body']),
+                    created_at=c['created_at'],
+                    **c['fields'],
+                ))
+                touched.add(musical_id)
+            if rows:
+                # One multi-row INSERT; ids come back in parameter order for the outbox rows
+                ids = db.session.execute(
+                    insert(MusicalChange).returning(MusicalChange.id, sort_by_parameter_order=True), rows
+                ).scalars().all()
+                change_rows = [(row['musical_id'], change_id, row['created_at']) for row, change_id in zip(rows, ids)]
+                for c, change_id in zip(stored, ids):
+                    if c['message'] and self.channels:
+                        notifier.enqueue(self.channels, c['message'], change_id=change_id,
+                                         musical=c['musical'], url=c['url'], policy=policy)
+            if touched:
+                db.session.execute(update(Musical).where(Musical.id.in_(touched)).values(updated_at=now))
+            snapshot_store.save_many(snapshots, commit=False)
+            # read before commit expires the link objects
+            pending = self._deltas(flipped, change_rows, now)
+            db.session.commit()
+            written = len(rows)
+            deltas = pending
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not persist monitor batch ({len(changes)} changes): {e}")
+        if changes and self.on_commit is not None:
+            self.on_commit()
+        if deltas and self.on_delta is not None:
+            try:
+                self.on_delta(deltas)
+            except Exception as e:
+                logger.warning(f"Could not publish {len(deltas)} musical deltas: {e}")
+        self.written += written
+        return written
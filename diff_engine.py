@@ -0,0 +1,200 @@
+"""
+Fast, time-bounded diff used to build the snippet attached to change alerts.
+
+``difflib.unified_diff`` over complete page bodies is quadratic on the long
+single-line documents produced by minified HTML, and the monitor threw away
+everything past 1,200 characters anyway. This engine:
+
+* splits the inputs into lines, tag-level tokens (``token``) or the text of
+  block elements (``dom``) and interns every piece as an integer;
+* trims the common prefix/suffix, anchors on pieces that are unique in both
+  sides (patience diff) and only falls back to ``difflib`` on small gaps;
+* stops as soon as the snippet budget is filled or the time budget is spent,
+  in which case the remaining region is reported as a single replacement.
+"""
+import difflib
+import os
+import re
+import time
+from bisect import bisect_left
+
+MODES = ('line', 'token', 'dom')
+DIFF_MODE = os.getenv('MONITOR_DIFF_MODE', 'line')
+DIFF_TIME_BUDGET = float(os.getenv('MONITOR_DIFF_TIME_BUDGET', '0.25'))  # segundos
+MAX_SNIPPET_CHARS = 1200
+MAX_PIECE_CHARS = 240
+MAX_PIECES = 50000
+# Gaps smaller than this (len(a) * len(b)) are handed to difflib
+SMALL_GAP = 40000
+LONG_LINE = 2000
+CONTEXT = 1
+
+_TOKEN_SPLIT = re.compile(r'(?<=>)|(?=<)')
+_BLOCKS = ('p', 'div', 'li', 'td', 'th', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'option', 'span', 'a', 'button')
+
+
+def _tokens(text):
+    return [t for t in (piece.strip() for piece in _TOKEN_SPLIT.split(text)) if t]
+
+
+def _lines(text):
+    lines = text.splitlines()
+    # Minified documents: one huge line tells us nothing, fall back to tokens
+    if any(len(line) > LONG_LINE for line in lines):
+        out = []
+        for line in lines:
+            out.extend(_tokens(line) if len(line) > LONG_LINE else [line])
+        return out
+    return lines
+
+
+def _dom_lines(text):
+    try:
+        import lxml.html
+        doc = lxml.html.document_fromstring(text)
+    except Exception:
+        return _lines(text)
+    out = []
+    for el in doc.iter(*_BLOCKS):
+        own = ' '.join(' '.join(t.split()) for t in [el.text or ''] + [child.tail or '' for child in el])
+        own = own.strip()
+        if own:
+            out.append(f"<{el.tag}> {own}")
+    return out
+
+
+def split(text, mode='line'):
+    if mode == 'dom':
+        return _dom_lines(text)
+    if mode == 'token':
+        return _tokens(text)
+    return _lines(text)
+
+
+def _intern(a_pieces, b_pieces):
+    table = {}
+    a = [table.setdefault(p, len(table)) for p in a_pieces]
+    b = [table.setdefault(p, len(table)) for p in b_pieces]
+    return a, b
+
+
+def _unique_positions(seq, lo, hi):
+    seen = {}
+    for i in range(lo, hi):
+        x = seq[i]
+        seen[x] = -1 if x in seen else i
+    return {x: i for x, i in seen.items() if i >= 0}
+
+
+def _patience_anchors(a, alo, ahi, b, blo, bhi):
+    """Pairs (i, j) of pieces unique in both ranges, longest increasing run by j."""
+    ua = _unique_positions(a, alo, ahi)
+    ub = _unique_positions(b, blo, bhi)
+    pairs = sorted((i, ub[x]) for x, i in ua.items() if x in ub)
+    if not pairs:
+        return []
+    # Longest increasing subsequence on j (patience sorting)
+    tails, tails_idx, prev = [], [], [None] * len(pairs)
+    for k, (_, j) in enumerate(pairs):
+        pos = bisect_left(tails, j)
+        if pos == len(tails):
+            tails.append(j)
+            tails_idx.append(k)
+        else:
+            tails[pos] = j
+            tails_idx[pos] = k
+        prev[k] = tails_idx[pos - 1] if pos else None
+    out, k = [], tails_idx[-1]
+    while k is not None:
+        out.append(pairs[k])
+        k = prev[k]
+    return out[::-1]
+
+
+def _changes(a, alo, ahi, b, blo, bhi, deadline):
+    """Yield (i1, i2, j1, j2) for every changed region, in order."""
+    while alo < ahi and blo < bhi and a[alo] == b[blo]:
+        alo += 1
+        blo += 1
+    while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+        ahi -= 1
+        bhi -= 1
+    if alo == ahi and blo == bhi:
+        return
+    if alo == ahi or blo == bhi or time.monotonic() > deadline:
+        yield (alo, ahi, blo, bhi)
+        return
+    if (ahi - alo) * (bhi - blo) <= SMALL_GAP:
+        matcher = difflib.SequenceMatcher(None, a[alo:ahi], b[blo:bhi], autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag != 'equal':
+                yield (alo + i1, alo + i2, blo + j1, blo + j2)
+        return
+    anchors = _patience_anchors(a, alo, ahi, b, blo, bhi)
+    if not anchors:
+        yield (alo, ahi, blo, bhi)
+        return
+    i, j = alo, blo
+    for ai, bj in anchors:
+        yield from _changes(a, i, ai, b, j, bj, deadline)
+        i, j = ai + 1, bj + 1
+    yield from _changes(a, i, ahi, b, j, bhi, deadline)
+
+
+def _clip(piece):
+    return piece if len(piece) <= MAX_PIECE_CHARS else piece[:MAX_PIECE_CHARS] + '…'
+
+
+def _differing_region(before, after, context=MAX_PIECE_CHARS):
+    """``before``/``after`` without their common prefix and suffix (keeping ``context`` chars of each)."""
+    prefix = len(os.path.commonprefix([before, after]))
+    suffix = min(len(os.path.commonprefix([before[::-1], after[::-1]])), min(len(before), len(after)) - prefix)
+    start = max(0, prefix - context)
+    return before[start:len(before) - max(0, suffix - context)], after[start:len(after) - max(0, suffix - context)]
+
+
+def diff(before, after, mode=None, max_chars=MAX_SNIPPET_CHARS, time_budget=None):
+    """Return a unified-style diff snippet of at most ``max_chars``.
+
+    ``None`` if the texts are identical, or too large to diff even line by line
+    (the caller then reports the change without a snippet).
+    """
+    if before is None or after is None or before == after:
+        return None
+    mode = mode if mode in MODES else (DIFF_MODE if DIFF_MODE in MODES else 'line')
+    deadline = time.monotonic() + (DIFF_TIME_BUDGET if time_budget is None else time_budget)
+
+    a_pieces, b_pieces = split(before, mode), split(after, mode)
+    if max(len(a_pieces), len(b_pieces)) > MAX_PIECES:
+        # too many pieces: only diff the region that differs, rather than
+        # cutting both sides short (and missing a change past the cut)
+        before, after = _differing_region(before, after)
+        a_pieces, b_pieces = split(before, mode), split(after, mode)
+        if max(len(a_pieces), len(b_pieces)) > MAX_PIECES:
+            a_pieces, b_pieces = before.splitlines(), after.splitlines()
+            if max(len(a_pieces), len(b_pieces)) > MAX_PIECES:
+                return None
+    a, b = _intern(a_pieces, b_pieces)
+
+    out = ['--- before', '+++ after']
+    size = sum(len(line) + 1 for line in out)
+    last_i = 0
+    truncated = False
+    for i1, i2, j1, j2 in _changes(a, 0, len(a), b, 0, len(b), deadline):
+        hunk = [f"@@ -{i1 + 1},{i2 - i1} +{j1 + 1},{j2 - j1} @@"]
+        hunk += [' ' + _clip(p) for p in a_pieces[max(last_i, i1 - CONTEXT):i1]]
+        hunk += ['-' + _clip(p) for p in a_pieces[i1:i2]]
+        hunk += ['+' + _clip(p) for p in b_pieces[j1:j2]]
+        last_i = i2
+        for line in hunk:
+            if size + len(line) + 1 > max_chars:
+                truncated = True
+                break
+            out.append(line)
+            size += len(line) + 1
+        if truncated:
+            break
+    if len(out) == 2:
+        return None
+    text = '\n'.join(out)
+    return text + '\n... (truncated)' if truncated else text
@@ -0,0 +1,280 @@
+"""
+Concurrent fetch stage for the ticket monitor.
+
+Pages are downloaded by a bounded thread pool so a full cycle takes roughly
+as long as the slowest host instead of the sum of every page latency.
+A global limit caps the number of in-flight requests and a per-host limit
+keeps us polite with the ticketing sites (most URLs share a few hosts).
+
+Bodies are streamed: the raw bytes are hashed incrementally while they are
+read, downloads stop at a per-link size cap, and text is only decoded when
+the monitor actually needs it (normalization / diff).
+
+Every fetch also goes through the per-host rate limiter and circuit breaker
+in :mod:`host_guard`; blocked hosts fail fast with ``HostBlocked``. URLs are
+queued per host and only handed to the pool when their host is below its
+limit and has a request slot, so a busy or throttled host never ties up pool
+threads that other hosts could use.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import http_client
+from host_guard import GUARD, HostBlocked
+
+MONITOR_MAX_WORKERS = int(os.getenv('MONITOR_MAX_WORKERS', '16'))
+MONITOR_PER_HOST_LIMIT = int(os.getenv('MONITOR_PER_HOST_LIMIT', '4'))
+MONITOR_MAX_BODY_BYTES = int(os.getenv('MONITOR_MAX_BODY_BYTES', str(2 * 1024 * 1024)))
+FETCH_TIMEOUT = 8  # segundos
+CHUNK_SIZE = 64 * 1024
+
+_META_CHARSET = re.compile(rb'<meta[^>]+charset=["\']?([\w-]+)', re.IGNORECASE)
+
+# requests in flight per host across every fetch_all call; guarded by _host_cond
+_host_in_flight = Counter()
+_host_cond = threading.Condition()
+
+
+def host_of(url):
+    """Return the lower-cased host of a URL ('' if it cannot be parsed)."""
+    try:
+        return (urlsplit(url).hostname or '').lower()
+    except Exception:
+        return ''
+
+
+def conditional_headers(snapshot):
+    """Build If-None-Match / If-Modified-Since headers from a stored snapshot entry.
+
+    Validators are only sent when the snapshot also holds the previous body,
+    otherwise a 304 would leave us without anything to diff against later.
+    """
+    if not isinstance(snapshot, dict) or not (snapshot.get('body_hash') or snapshot.get('body') is not None):
+        return {}
+    headers = {}
+    if snapshot.get('etag'):
+        headers['If-None-Match'] = snapshot['etag']
+    if snapshot.get('last_modified'):
+        headers['If-Modified-Since'] = snapshot['last_modified']
+    return headers
+
+
+class FetchedPage:
+    """A downloaded page: status, headers, capped raw bytes and their SHA-256."""
+
+    __slots__ = ('url', 'status_code', 'headers', 'content', 'sha256', 'truncated', 'encoding', '_text')
+
+    def __init__(self, url, status_code, headers, content, sha256, truncated=False, encoding=None):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.sha256 = sha256
+        self.truncated = truncated
+        self.encoding = encoding
+        self._text = None
+
+    @property
+    def text(self):
+        """Body decoded on first access (declared charset, then <meta charset>, then UTF-8)."""
+        if self._text is None:
+            encoding = self.encoding
+            if not encoding:
+                match = _META_CHARSET.search(self.content[:4096])
+                encoding = match.group(1).decode('ascii') if match else 'utf-8'
+            try:
+                self._text = self.content.decode(encoding, errors='replace')
+            except LookupError:
+                self._text = self.content.decode('utf-8', errors='replace')
+        return self._text
+
+
+def fetch_url(url, headers=None, timeout=FETCH_TIMEOUT, max_bytes=None):
+    """Stream a single page (optionally as a conditional GET), hashing raw bytes as they arrive."""
+    max_bytes = max_bytes or MONITOR_MAX_BODY_BYTES
+    digest = hashlib.sha256()
+    chunks = []
+    received = 0
+    truncated = False
+    with http_client.get(url, headers=headers or None, timeout=timeout, stream=True) as r:
+        for chunk in r.iter_content(CHUNK_SIZE):
+            if received + len(chunk) > max_bytes:
+                chunk = chunk[:max_bytes - received]
+                truncated = True
+            digest.update(chunk)
+            chunks.append(chunk)
+            received += len(chunk)
+            if truncated:
+                break
+        # Only trust a charset the server declared; never run detection over the body
+        encoding = r.encoding if 'charset' in r.headers.get('Content-Type', '').lower() else None
+        return FetchedPage(url, r.status_code, r.headers, b''.join(chunks), digest.hexdigest(), truncated, encoding)
+
+
+class _Dispatcher:
+    """Hands URLs to the pool only when their host can take them.
+
+    URLs wait in one queue per host. A URL is submitted once its host is
+    below the per-host limit (shared by every concurrent ``fetch_all`` call
+    in the process) and the guard grants a request slot without sleeping;
+    a host that has to wait is simply skipped until its slot is due, so it
+    never holds a pool thread while other hosts have work.
+
+    The guard may ask the shared quota in the database, so it is only called
+    with ``_host_cond`` released: each round reserves the head URL of every
+    host that has room, asks the guard for those outside the lock, then
+    submits the granted ones and puts the others back.
+    """
+
+    def __init__(self, items, guard, per_host_limit, max_in_flight, run):
+        self.guard = guard
+        self.per_host_limit = per_host_limit
+        self.max_in_flight = max_in_flight
+        self.run_one = run
+        self.queues = OrderedDict()
+        for url, future in items:
+            self.queues.setdefault(host_of(url), deque()).append((url, future))
+        self.in_flight = 0
+        self.ready_at = {}  # host -> monotonic time its next request slot is due
+        self.waiting_since = {}  # host -> when its head URL started waiting
+        self.stopped = False
+
+    def _reserve(self, now):
+        """Take the head URL of every host that may start one now; returns ``(picks, next_due)``.
+
+        Must be called with ``_host_cond`` held. Picked URLs already count as in flight.
+        """
+        picks, next_due = [], None
+        for host, queue in self.queues.items():
+            if not queue:
+                continue  # its last URL is being settled
+            due = self.ready_at.get(host, 0)
+            if due > now:
+                next_due = due if next_due is None else min(next_due, due)
+                continue
+            if self.in_flight < self.max_in_flight and _host_in_flight[host] < self.per_host_limit:
+                picks.append((host, queue.popleft()))
+                self.in_flight += 1
+                _host_in_flight[host] += 1
+        return picks, next_due
+
+    def _ask(self, host):
+        """0 if the guard grants ``host`` a request slot now, else the wait (or the HostBlocked raised)."""
+        if self.guard is None:
+            return 0
+        try:
+            return self.guard.try_acquire(host)
+        except HostBlocked as e:
+            return e
+
+    def _settle(self, pool, picks, answers, now):
+        """Submit granted picks; put back (or fail) the others. Must be called with ``_host_cond`` held."""
+        for (host, (url, future)), answer in zip(picks, answers):
+            if answer == 0 and not self.stopped:
+                self.waiting_since.pop(host, None)
+                pool.submit(self.run_one, self, host, url, future)
+                continue
+            self.in_flight -= 1
+            _host_in_flight[host] -= 1
+            if isinstance(answer, HostBlocked):
+                future.set_exception(answer)
+                self.waiting_since.pop(host, None)
+            elif answer and now - self.waiting_since.setdefault(host, now) + answer > self.guard.max_wait:
+                future.set_exception(HostBlocked(host, answer))
+                self.waiting_since.pop(host, None)
+            else:
+                if answer:
+                    self.ready_at[host] = now + answer
+                self.queues.setdefault(host, deque()).appendleft((url, future))
+        for host in [host for host, queue in self.queues.items() if not queue]:
+            del self.queues[host]
+        # released slots may let another dispatcher go ahead
+        _host_cond.notify_all()
+
+    def finished(self, host):
+        with _host_cond:
+            self.in_flight -= 1
+            _host_in_flight[host] -= 1
+            _host_cond.notify_all()
+
+    def run(self, pool):
+        while True:
+            with _host_cond:
+                now = time.monotonic()
+                picks, next_due = ([], None) if self.stopped else self._reserve(now)
+                if not picks:
+                    if self.stopped or not self.queues:
+                        break
+                    # woken by any fetch finishing (this call or another one) or when a host is due
+                    _host_cond.wait(None if next_due is None else max(0.0, next_due - now))
+                    continue
+            answers = [self._ask(host) for host, _ in picks]
+            with _host_cond:
+                self._settle(pool, picks, answers, time.monotonic())
+        with _host_cond:
+            for queue in self.queues.values():
+                for _, future in queue:
+                    future.cancel()
+            self.queues.clear()
+
+    def stop(self):
+        with _host_cond:
+            self.stopped = True
+            _host_cond.notify_all()
+
+
+def fetch_all(urls, fetch=fetch_url, validators=None, limits=None, max_workers=None, per_host_limit=None, guard=GUARD):
+    """Fetch every URL concurrently and yield one future per URL, in input order.
+
+    ``validators`` maps a URL to the conditional request headers to send
+    (see :func:`conditional_headers`); URLs without an entry get a plain GET.
+    ``limits`` maps a URL to its maximum body size in bytes
+    (``MONITOR_MAX_BODY_BYTES`` when absent).
+    ``guard`` rate-limits and circuit-breaks each host (``None`` disables it);
+    futures of skipped URLs raise :class:`host_guard.HostBlocked`.
+
+    Callers consume the futures sequentially and call ``future.result()``,
+    which returns the response or re-raises the exception the fetch raised,
+    so the processing stage keeps its original one-URL-at-a-time semantics
+    while later pages are still downloading.
+    """
+    urls = list(urls)
+    if not urls:
+        return
+    max_workers = max(1, min(max_workers or MONITOR_MAX_WORKERS, len(urls)))
+    per_host_limit = max(1, per_host_limit or MONITOR_PER_HOST_LIMIT)
+
+    validators = validators or {}
+    limits = limits or {}
+
+    def _fetch_one(dispatcher, host, url, future):
+        try:
+            page = fetch(url, headers=validators.get(url), max_bytes=limits.get(url))
+        except Exception as e:
+            if guard is not None:
+                guard.record(host, error=True)
+            future.set_exception(e)
+        else:
+            if guard is not None:
+                guard.record(host, page.status_code, page.headers)
+            future.set_result(page)
+        finally:
+            dispatcher.finished(host)
+
+    futures = [Future() for _ in urls]
+    dispatcher = _Dispatcher(zip(urls, futures), guard, per_host_limit, max_workers, _fetch_one)
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='monitor-fetch') as pool:
+        thread = threading.Thread(target=dispatcher.run, args=(pool,), daemon=True, name='monitor-dispatch')
+        thread.start()
+        try:
+            for fut in futures:
+                yield fut
+        finally:
+            dispatcher.stop()
+            thread.join()
@@ -0,0 +1,194 @@
+"""
+Per-host rate limiting and circuit breaking for the fetch stage.
+
+A slow or rate-limiting ticketing host used to cost the full fetch timeout on
+every one of its URLs, every cycle. Every host now gets:
+
+* a token bucket (``MONITOR_HOST_RATE`` requests/second, bursts of
+  ``MONITOR_HOST_BURST``) that is paused whenever the host answers 429/503
+  with ``Retry-After``;
+* a circuit breaker that opens after ``MONITOR_BREAKER_FAILURES`` consecutive
+  failures (errors, 5xx, 429) and stops hitting the host for
+  ``MONITOR_BREAKER_COOLDOWN`` seconds. After the cooldown a single probe is
+  let through: success closes the breaker, failure re-opens it.
+
+Fetches that would have to wait longer than ``MONITOR_HOST_MAX_WAIT`` are not
+attempted at all; :meth:`HostGuard.acquire` raises :class:`HostBlocked`.
+
+The bucket is per process. When several workers monitor the same host, a
+shared ``quota`` (``sharding.HostQuota``) is consulted as well, so the rate
+holds across all of them.
+"""
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+MONITOR_HOST_RATE = float(os.getenv('MONITOR_HOST_RATE', '4'))
+MONITOR_HOST_BURST = int(os.getenv('MONITOR_HOST_BURST', '8'))
+MONITOR_BREAKER_FAILURES = int(os.getenv('MONITOR_BREAKER_FAILURES', '5'))
+MONITOR_BREAKER_COOLDOWN = int(os.getenv('MONITOR_BREAKER_COOLDOWN', '300'))  # segundos
+MONITOR_HOST_MAX_WAIT = float(os.getenv('MONITOR_HOST_MAX_WAIT', '10'))  # segundos
+MAX_RETRY_AFTER = 3600
+
+
+class HostBlocked(Exception):
+    """The host is rate limited or its circuit breaker is open; the fetch was skipped."""
+
+    def __init__(self, host, retry_in):
+        super().__init__(f"{host} blocked for {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value, now=None):
+    """Seconds to wait from a ``Retry-After`` header (delta-seconds or HTTP date), capped."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            when = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        seconds = (when - (now or datetime.now(timezone.utc))).total_seconds()
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+class _HostState:
+    __slots__ = ('tokens', 'updated', 'paused_until', 'failures', 'open_until', 'probing')
+
+    def __init__(self, burst, now):
+        self.tokens = float(burst)
+        self.updated = now
+        self.paused_until = 0.0
+        self.failures = 0
+        self.open_until = 0.0
+        self.probing = False
+
+
+class HostGuard:
+    def __init__(self, rate=MONITOR_HOST_RATE, burst=MONITOR_HOST_BURST, failures=MONITOR_BREAKER_FAILURES,
+                 cooldown=MONITOR_BREAKER_COOLDOWN, max_wait=MONITOR_HOST_MAX_WAIT,
+                 clock=time.monotonic, sleep=time.sleep, quota=None):
+        self.rate = max(0.01, rate)
+        self.burst = max(1, burst)
+        self.failure_threshold = max(1, failures)
+        self.cooldown = cooldown
+        self.max_wait = max_wait
+        self.clock = clock
+        self.sleep = sleep
+        self.quota = quota  # object with take(host) -> seconds to wait (0 = allowed), shared across workers
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _state(self, host, now):
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(self.burst, now)
+        return state
+
+    def _reserve(self, host):
+        """Take a token now (returns 0) or return how long to wait before trying again."""
+        now = self.clock()
+        with self._lock:
+            state = self._state(host, now)
+            if state.open_until:
+                if now < state.open_until:
+                    raise HostBlocked(host, state.open_until - now)
+                if state.probing:
+                    raise HostBlocked(host, self.cooldown)
+                # Half-open: let exactly one probe through, right away
+                state.probing = True
+                return 0
+            if now < state.paused_until:
+                return state.paused_until - now
+            state.tokens = min(self.burst, state.tokens + (now - state.updated) * self.rate)
+            state.updated = now
+            if state.tokens >= 1:
+                state.tokens -= 1
+                return 0
+            return (1 - state.tokens) / self.rate
+
+    def _refund(self, host):
+        with self._lock:
+            state = self._hosts.get(host)
+            if state is None:
+                return
+            if state.open_until:
+                state.probing = False  # the half-open probe was not sent
+            else:
+                state.tokens = min(self.burst, state.tokens + 1)
+
+    def try_acquire(self, host):
+        """Take a request slot for ``host`` now (returns 0) or return how long to wait; never sleeps.
+
+        Raises :class:`HostBlocked` while the circuit breaker is open.
+        """
+        wait = self._reserve(host)
+        if wait or self.quota is None:
+            return wait
+        wait = self.quota.take(host)
+        if wait:
+            # the shared quota said no: give the local token back
+            self._refund(host)
+        return wait
+
+    def acquire(self, host):
+        """Block until a request to ``host`` is allowed, or raise :class:`HostBlocked`."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(host)
+            if not wait:
+                return
+            if waited + wait > self.max_wait:
+                raise HostBlocked(host, wait)
+            self.sleep(wait)
+            waited += wait
+
+    def record(self, host, status_code=None, headers=None, error=False):
+        """Feed back the outcome of a fetch: an exception (``error``) or the response status/headers."""
+        now = self.clock()
+        retry_after = None
+        if status_code in (429, 503) and headers is not None:
+            retry_after = parse_retry_after(headers.get('Retry-After'))
+        failed = error or status_code == 429 or (status_code or 0) >= 500
+        with self._lock:
+            state = self._state(host, now)
+            if retry_after:
+                state.paused_until = max(state.paused_until, now + retry_after)
+            if not failed:
+                state.failures = 0
+                state.open_until = 0.0
+                state.probing = False
+                return
+            state.failures += 1
+            if state.probing or state.failures >= self.failure_threshold:
+                state.open_until = now + max(self.cooldown, retry_after or 0)
+                state.probing = False
+            elif status_code == 429:
+                # Rate limited: never come back before the server said so
+                state.paused_until = max(state.paused_until, now + (retry_after or 1 / self.rate))
+
+    def status(self):
+        """{host: {...}} for every host that is currently failing, paused or open."""
+        now = self.clock()
+        out = {}
+        with self._lock:
+            for host, state in self._hosts.items():
+                if not (state.failures or state.open_until > now or state.paused_until > now):
+                    continue
+                out[host] = {
+                    'state': 'open' if state.open_until > now else ('half_open' if state.open_until else 'closed'),
+                    'failures': state.failures,
+                    'retry_in': round(max(state.open_until, state.paused_until, now) - now, 1),
+                }
+        return out
+
+
+GUARD = HostGuard()
@@ -0,0 +1,150 @@
+"""
+Shared, long-lived HTTP client for every outbound call (monitor + notifiers).
+
+A single ``requests.Session`` keeps per-host keep-alive connection pools, so
+the TLS handshake with the ticketing hosts, Telegram and Discord happens once
+per connection instead of once per request. The session's connections look
+hosts up through a small, bounded in-process DNS cache (nothing else in the
+process is affected) and responses are negotiated with brotli/gzip.
+"""
+import os
+import socket
+import threading
+import time
+from collections import OrderedDict
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+try:
+    import brotli  # noqa: F401  (urllib3 decodes 'br' when available)
+    ACCEPT_ENCODING = 'br, gzip, deflate'
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        ACCEPT_ENCODING = 'br, gzip, deflate'
+    except ImportError:
+        ACCEPT_ENCODING = 'gzip, deflate'
+
+HTTP_POOL_HOSTS = int(os.getenv('HTTP_POOL_HOSTS', '64'))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '16'))
+DNS_CACHE_TTL = int(os.getenv('DNS_CACHE_TTL', '300'))  # segundos
+DNS_CACHE_SIZE = int(os.getenv('DNS_CACHE_SIZE', '256'))
+
+_session = None
+_session_lock = threading.Lock()
+
+# ==================== DNS CACHE ====================
+# Only connections opened by the shared session use it; socket.getaddrinfo is
+# left alone for every other library (SMTP, Socket.IO...).
+_dns_cache = OrderedDict()
+_dns_lock = threading.Lock()
+
+
+def resolve(host, port):
+    """IP addresses of ``host`` (in getaddrinfo order), cached for ``DNS_CACHE_TTL`` seconds."""
+    key = (host, port, allowed_gai_family())
+    now = time.monotonic()
+    with _dns_lock:
+        hit = _dns_cache.get(key)
+        if hit and hit[0] > now:
+            _dns_cache.move_to_end(key)
+            return hit[1]
+    infos = socket.getaddrinfo(host, port, key[2], socket.SOCK_STREAM)
+    addresses = list(dict.fromkeys(info[4][0] for info in infos))
+    with _dns_lock:
+        for stale in [k for k, (expires, _) in _dns_cache.items() if expires <= now]:
+            del _dns_cache[stale]
+        _dns_cache[key] = (now + DNS_CACHE_TTL, addresses)
+        _dns_cache.move_to_end(key)
+        while len(_dns_cache) > DNS_CACHE_SIZE:
+            _dns_cache.popitem(last=False)
+    return addresses
+
+
+def clear_dns_cache():
+    with _dns_lock:
+        _dns_cache.clear()
+
+
+class _CachedDNSMixin:
+    """urllib3 connection that connects to the cached addresses of its host, one after another."""
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = resolve(host, self.port)
+        except socket.gaierror:
+            return super()._new_conn()  # urllib3 raises its usual NameResolutionError
+        error = None
+        for address in addresses:
+            # TLS still uses self.host for SNI and certificate checks
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except (NewConnectionError, ConnectTimeoutError) as e:
+                error = e
+            finally:
+                self._dns_host = host
+        raise error
+
+
+class _HTTPConnection(_CachedDNSMixin, HTTPConnection):
+    pass
+
+
+class _HTTPSConnection(_CachedDNSMixin, HTTPSConnection):
+    pass
+
+
+class _HTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _HTTPConnection
+
+
+class _HTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _HTTPSConnection
+
+
+class CachedDNSAdapter(HTTPAdapter):
+    """``HTTPAdapter`` whose connection pools resolve hosts through :func:`resolve`."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {'http': _HTTPConnectionPool, 'https': _HTTPSConnectionPool}
+
+
+# ==================== SESSION ====================
+def _build_session():
+    session = requests.Session()
+    adapter_cls = CachedDNSAdapter if DNS_CACHE_TTL > 0 else HTTPAdapter
+    adapter = adapter_cls(pool_connections=HTTP_POOL_HOSTS, pool_maxsize=HTTP_POOL_SIZE, pool_block=False)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers['Accept-Encoding'] = ACCEPT_ENCODING
+    # Behave like one-off requests.get calls: never carry cookies between
+    # fetches, otherwise session cookies would show up as page "changes".
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session():
+    """Return the process-wide pooled session (created on first use)."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = _build_session()
+    return _session
+
+
+def get(url, **kwargs):
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    return get_session().post(url, **kwargs)
@@ -0,0 +1,231 @@
+"""
+Resized, re-encoded variants of the photos under ``static/fotos``.
+
+Posters and gallery photos were always sent at their original size (several
+MB for a 300 px wide card on a phone). ``/static/fotos/<path>?w=<px>`` now
+returns a variant whose width is the smallest of ``IMAGE_VARIANT_WIDTHS``
+that is >= ``w`` (capped at the source width, never upscaled), encoded as
+AVIF or WebP when the browser's ``Accept`` header allows it and as JPEG (PNG
+for images with transparency) otherwise. :func:`srcset` builds the matching
+``srcset`` attribute, whose URLs carry ``v=<source version>`` (see
+:func:`source_version`), as do :func:`photo_url` and the URLs ``main.js``
+builds from :func:`photo_versions`: only such URLs are cached for ``IMAGE_MAX_AGE``,
+any other variant request gets ``IMAGE_REVALIDATE_AGE`` and an ETag, so an
+edited photo is picked up without waiting for long-lived copies to expire.
+
+Variants are generated on first request and stored under
+``IMAGE_CACHE_DIR`` with names keyed by the SHA-256 of the source file, so
+an edited photo gets new variants and stale ones are simply never read
+again. Without Pillow installed the original file is served unchanged.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:
+    Image = None
+
+IMAGE_VARIANT_WIDTHS = tuple(sorted(
+    int(w) for w in os.getenv('IMAGE_VARIANT_WIDTHS', '320,640,960,1440').split(',') if w.strip()
+))
+IMAGE_CACHE_DIR = Path(os.getenv('IMAGE_CACHE_DIR', str(Path(__file__).parent / 'instance' / 'image_cache')))
+IMAGE_MAX_AGE = int(os.getenv('IMAGE_MAX_AGE', str(30 * 24 * 3600)))  # segundos
+IMAGE_REVALIDATE_AGE = int(os.getenv('IMAGE_REVALIDATE_AGE', '300'))  # segundos
+STATIC_DIR = Path(__file__).parent / 'static'
+QUALITY = {'avif': 55, 'webp': 78, 'jpeg': 82}
+MIMETYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg', 'png': 'png'}
+SOURCE_FORMATS = {'.jpg': 'jpeg', '.jpeg': 'jpeg', '.png': 'png', '.webp': 'webp', '.avif': 'avif'}
+
+logger = logging.getLogger(__name__)
+
+
+def available():
+    return Image is not None
+
+
+def _supported(fmt):
+    if Image is None:
+        return False
+    if fmt in ('jpeg', 'png'):
+        return True
+    try:
+        return bool(features.check(fmt))
+    except Exception:
+        return False
+
+
+_SUPPORTED = {fmt: _supported(fmt) for fmt in MIMETYPES}
+
+
+def snap_width(requested):
+    """Smallest configured width >= ``requested`` (the largest one if none is)."""
+    for width in IMAGE_VARIANT_WIDTHS:
+        if width >= requested:
+            return width
+    return IMAGE_VARIANT_WIDTHS[-1]
+
+
+def negotiate(accept, alpha=False):
+    """Best output format for an ``Accept`` header."""
+    accept = accept or ''
+    for fmt in ('avif', 'webp'):
+        if MIMETYPES[fmt] in accept and _SUPPORTED[fmt]:
+            return fmt
+    return 'png' if alpha else 'jpeg'
+
+
+def source_version(path):
+    """Short token that changes whenever the file at ``path`` is replaced or edited."""
+    st = os.stat(path)
+    return f"{st.st_mtime_ns:x}{st.st_size:x}"
+
+
+def _version_param(url):
+    """``&v=<version>`` for a ``/static/fotos/...`` URL ('' if the file can't be found)."""
+    relpath = url[len('/static/'):]
+    if '..' in relpath.split('/'):
+        return ''
+    try:
+        return f"&v={source_version(STATIC_DIR / relpath)}"
+    except OSError:
+        return ''
+
+
+def photo_url(url, width):
+    """URL of the ``width`` px variant of a ``/static/fotos/...`` URL, versioned when the file exists."""
+    if not (url or '').startswith('/static/fotos/') or '?' in url:
+        return url
+    return f"{url}?w={width}{_version_param(url)}"
+
+
+def srcset(url):
+    """``srcset`` value for a ``/static/fotos/...`` URL ('' for any other URL)."""
+    if Image is None or not (url or '').startswith('/static/fotos/') or '?' in url:
+        return ''
+    version = _version_param(url)
+    return ', '.join(f"{url}?w={width}{version} {width}w" for width in IMAGE_VARIANT_WIDTHS)
+
+
+def photo_versions(relpaths):
+    """``{lower-cased /static/fotos URL: version}`` for ``relpaths`` (under ``static/fotos``).
+
+    Lets scripts that build variant URLs themselves (``main.js``) add ``v=``.
+    """
+    if Image is None:
+        return {}
+    versions = {}
+    for relpath in relpaths:
+        if Path(relpath).suffix.lower() not in SOURCE_FORMATS:
+            continue
+        try:
+            versions[f"/static/fotos/{relpath}".lower()] = source_version(STATIC_DIR / 'fotos' / relpath)
+        except OSError:
+            continue
+    return versions
+
+
+class _Source:
+    __slots__ = ('sig', 'digest', 'width', 'alpha')
+
+    def __init__(self, sig, digest, width, alpha):
+        self.sig = sig
+        self.digest = digest
+        self.width = width
+        self.alpha = alpha
+
+
+class VariantCache:
+    def __init__(self, cache_dir=IMAGE_CACHE_DIR):
+        self.cache_dir = Path(cache_dir)
+        self._sources = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+        self.stats = {'hits': 0, 'generated': 0, 'errors': 0}
+
+    def _lock_for(self, key):
+        with self._guard:
+            lock = self._locks.get(key)
+            if lock is None:
+                # only ever holds one lock per variant currently being generated
+                lock = self._locks[key] = threading.Lock()
+            return lock
+
+    def _source(self, path):
+        """Digest/width of ``path``, re-read only when its mtime or size changes."""
+        st = os.stat(path)
+        sig = (st.st_mtime_ns, st.st_size)
+        info = self._sources.get(path)
+        if info is not None and info.sig == sig:
+            return info
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        with Image.open(path) as img:
+            # EXIF orientations 5-8 are rotated by 90 degrees
+            width = img.height if img.getexif().get(0x0112, 1) in (5, 6, 7, 8) else img.width
+            alpha = img.mode in ('RGBA', 'LA', 'PA') or (img.mode == 'P' and 'transparency' in img.info)
+        info = self._sources[path] = _Source(sig, h.hexdigest(), width, alpha)
+        return info
+
+    def _render(self, source_path, target, width, fmt):
+        with Image.open(source_path) as img:
+            img = ImageOps.exif_transpose(img)
+            if img.width > width:
+                img = img.resize((width, max(1, round(img.height * width / img.width))), Image.LANCZOS)
+            if fmt == 'jpeg':
+                img = img.convert('RGB')
+            elif img.mode not in ('RGB', 'RGBA'):
+                img = img.convert('RGBA' if 'A' in img.mode or 'transparency' in img.info else 'RGB')
+            target.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp = tempfile.mkstemp(prefix='.variant.', dir=target.parent)
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    options = {'quality': QUALITY[fmt]} if fmt in QUALITY else {'optimize': True}
+                    if fmt == 'jpeg':
+                        options.update(optimize=True, progressive=True)
+                    img.save(f, format=fmt.upper(), **options)
+                os.replace(tmp, target)
+            except BaseException:
+                try:
+                    os.unlink(tmp)
+                except OSError:
+                    pass
+                raise
+
+    def variant(self, source_path, requested_width, accept=None):
+        """``(path, mimetype)`` of the variant to send, or None to send the original."""
+        if Image is None or Path(source_path).suffix.lower() not in SOURCE_FORMATS:
+            return None
+        try:
+            source = self._source(os.fspath(source_path))
+            width = min(snap_width(requested_width), source.width)
+            fmt = negotiate(accept, source.alpha)
+            if width == source.width and SOURCE_FORMATS.get(Path(source_path).suffix.lower()) == fmt:
+                return None  # same size, same format: the original is as good
+            target = self.cache_dir / source.digest[:2] / f"{source.digest}-{width}.{EXTENSIONS[fmt]}"
+            if target.exists():
+                self.stats['hits'] += 1
+                return target, MIMETYPES[fmt]
+            key = os.fspath(target)
+            lock = self._lock_for(key)
+            with lock:
+                if not target.exists():
+                    self._render(source_path, target, width, fmt)
+                    self.stats['generated'] += 1
+            with self._guard:
+                self._locks.pop(key, None)
+            return target, MIMETYPES[fmt]
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.warning(f"Could not build image variant for {source_path}: {e}")
+            return None
+
+
+VARIANTS = VariantCache()
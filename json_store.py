@@ -0,0 +1,168 @@
+"""
+Cached, atomically written JSON data files (``static/data``, ``static/python``).
+
+Every loader (events, exclusions, ``urls.json``, normalization rules, the
+notification policy...) used to open and ``json.load`` its file on every call,
+several of them on hot request or monitor paths. :func:`load` parses a file
+once and then only ``stat``s it: the cached value is reused until the file's
+mtime or size changes.
+
+Cached values are shared between callers, so they are handed out frozen:
+dicts become :class:`FrozenDict` and lists become tuples. Both still serialize
+with ``json``/``jsonify``. Use :func:`load_copy` to get plain, mutable
+containers, and :func:`write` to replace a file: the data is written to a
+temporary file in the same directory and renamed over the original under a
+per-file lock, so readers never see a half-written file.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+class FrozenDict(dict):
+    """A read-only ``dict``; still a ``dict`` for ``json`` and Jinja."""
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError('cached JSON data is read-only; use json_store.load_copy() to modify it')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __ior__ = _readonly
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (FrozenDict, (dict(self),))
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Plain (mutable) copy of a frozen value."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def signature(path):
+    """``(mtime_ns, size)`` of ``path``, or None if it does not exist."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+class _Entry:
+    __slots__ = ('sig', 'value')
+
+    def __init__(self, sig, value):
+        self.sig = sig
+        self.value = value
+
+
+_cache = {}
+_locks = {}
+_guard = threading.Lock()
+
+
+def _lock_for(path):
+    with _guard:
+        lock = _locks.get(path)
+        if lock is None:
+            lock = _locks[path] = threading.Lock()
+        return lock
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    return json.loads(content) if content.strip() else None
+
+
+def load(path, default=None, cache=True):
+    """Frozen contents of the JSON file at ``path``; ``default`` if missing, empty or invalid.
+
+    The same object is returned for as long as the file is unchanged, so
+    callers can memoize anything derived from it by identity. One-shot
+    readers (imports) pass ``cache=False`` to avoid keeping the data around.
+    """
+    key = os.fspath(path)
+    sig = signature(key)
+    if sig is None:
+        _cache.pop(key, None)
+        return default
+    entry = _cache.get(key)
+    if entry is not None and entry.sig == sig:
+        return default if entry.value is None else entry.value
+    with _lock_for(key):
+        entry = _cache.get(key)
+        if entry is not None and entry.sig == sig:
+            return default if entry.value is None else entry.value
+        try:
+            value = freeze(_read(key))
+        except FileNotFoundError:
+            return default
+        except Exception as e:
+            logger.warning(f"Error loading {Path(key).name}: {e}")
+            value = None
+        if cache:
+            # keyed on the stat taken before reading: a write racing the read is picked up next call
+            _cache[key] = _Entry(sig, value)
+    return default if value is None else value
+
+
+def load_copy(path, default=None):
+    """Mutable copy of :func:`load`."""
+    return thaw(load(path, default))
+
+
+def write(path, data, indent=2):
+    """Atomically replace the JSON file at ``path`` with ``data`` (temp file + rename)."""
+    key = os.fspath(path)
+    directory = os.path.dirname(key) or '.'
+    with _lock_for(key):
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(prefix='.' + os.path.basename(key) + '.', suffix='.tmp', dir=directory)
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                try:
+                    os.chmod(tmp, os.stat(key).st_mode & 0o777)
+                except OSError:
+                    os.chmod(tmp, 0o644)
+                json.dump(thaw(data), f, indent=indent, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, key)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        _cache.pop(key, None)
+
+
+def invalidate(path=None):
+    """Forget the cached contents of ``path`` (or of every file)."""
+    if path is None:
+        _cache.clear()
+    else:
+        _cache.pop(os.fspath(path), None)
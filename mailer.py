@@ -0,0 +1,183 @@
+"""
+Background SMTP mailer.
+
+Suggestion confirmations used to open a new SMTP connection (connect,
+STARTTLS, login) inside the HTTP request, blocking the worker for up to the
+10 s timeout. Requests now only :meth:`QueuedMailer.enqueue` a message; one
+background thread owns a single authenticated SMTP session, sends whatever
+is queued in batches, reconnects (and retries the message) when the server
+drops the connection, and closes the session after ``MAIL_IDLE_SECONDS``
+without mail. A failed message is put aside with a not-before time (backing
+off exponentially) instead of the worker sleeping, so the rest of the queue
+keeps flowing meanwhile.
+
+The queue lives in memory and is bounded by ``MAIL_QUEUE_SIZE``.
+"""
+import heapq
+import itertools
+import logging
+import os
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from email.message import EmailMessage
+
+MAIL_QUEUE_SIZE = int(os.getenv('MAIL_QUEUE_SIZE', '1000'))
+MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', '20'))
+MAIL_IDLE_SECONDS = float(os.getenv('MAIL_IDLE_SECONDS', '60'))
+MAIL_MAX_ATTEMPTS = 3
+MAIL_MAX_BACKOFF = 30  # segundos
+SMTP_TIMEOUT = 10  # segundos
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedMailer:
+    def __init__(self, server, port, username, password, sender,
+                 batch_size=MAIL_BATCH_SIZE, idle_seconds=MAIL_IDLE_SECONDS, queue_size=MAIL_QUEUE_SIZE):
+        self.server = server
+        self.port = port
+        self.username = username
+        self.password = password
+        self.sender = sender
+        self.batch_size = max(1, batch_size)
+        self.idle_seconds = idle_seconds
+        self.stats = {'queued': 0, 'sent': 0, 'failed': 0, 'dropped': 0, 'connections': 0}
+        self._queue = queue.Queue(maxsize=max(1, queue_size))
+        self._retries = []  # heap of (not_before, seq, msg, attempts); only touched by the worker thread
+        self._retry_seq = itertools.count()
+        self._smtp = None
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def configured(self):
+        return bool(self.server and self.username and self.password and self.sender)
+
+    def enqueue(self, recipient, subject, body):
+        """Queue one plain-text email. Returns False if the mailer is not configured or the queue is full."""
+        if not self.configured:
+            return False
+        msg = EmailMessage()
+        msg['From'] = self.sender
+        msg['To'] = recipient
+        msg['Subject'] = subject
+        msg.set_content(body)
+        try:
+            self._queue.put_nowait((msg, 0))
+        except queue.Full:
+            self.stats['dropped'] += 1
+            logger.error(f"Mail queue full; dropping email to {recipient}")
+            return False
+        self.stats['queued'] += 1
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, daemon=True, name='mailer')
+                self._thread.start()
+
+    # ---- SMTP session ----------------------------------------------------
+    def _connect(self):
+        smtp = smtplib.SMTP(self.server, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            smtp.starttls(context=ssl.create_default_context())
+            smtp.login(self.username, self.password)
+        except Exception:
+            smtp.close()
+            raise
+        self.stats['connections'] += 1
+        return smtp
+
+    def _session(self):
+        """The open SMTP session, reconnecting if the server dropped it."""
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except smtplib.SMTPException:
+                pass
+            except OSError:
+                pass
+            self._close()
+        self._smtp = self._connect()
+        return self._smtp
+
+    def _close(self):
+        if self._smtp is None:
+            return
+        try:
+            self._smtp.quit()
+        except Exception:
+            try:
+                self._smtp.close()
+            except Exception:
+                pass
+        self._smtp = None
+
+    # ---- worker ----------------------------------------------------------
+    def _due_retries(self):
+        now = time.monotonic()
+        due = []
+        while self._retries and self._retries[0][0] <= now and len(due) < self.batch_size:
+            _, _, msg, attempts = heapq.heappop(self._retries)
+            due.append((msg, attempts))
+        return due
+
+    def _next_batch(self):
+        batch = self._due_retries()
+        if not batch:
+            timeout = self.idle_seconds
+            if self._retries:
+                # wake up when the next retry is due
+                timeout = min(timeout, max(0.0, self._retries[0][0] - time.monotonic()))
+            try:
+                batch = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                return self._due_retries()
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                if not self._retries:
+                    # Idle: don't keep the session open on the server's dime
+                    self._close()
+                continue
+            for msg, attempts in batch:
+                self._send(msg, attempts)
+
+    def _send(self, msg, attempts):
+        try:
+            self._session().send_message(msg)
+            self.stats['sent'] += 1
+            return
+        except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused) as e:
+            # permanent for this message; the session is still fine
+            self.stats['failed'] += 1
+            logger.error(f"Email to {msg['To']} refused: {e}")
+            return
+        except Exception as e:
+            self._close()
+            attempts += 1
+            if attempts >= MAIL_MAX_ATTEMPTS:
+                self.stats['failed'] += 1
+                logger.error(f"Error sending email to {msg['To']} after {attempts} attempts: {e}")
+                return
+            logger.warning(f"Email to {msg['To']} failed ({e}); reconnecting and retrying")
+        if len(self._retries) >= self._queue.maxsize:
+            self.stats['dropped'] += 1
+            logger.error(f"Mail retry backlog full; dropping email to {msg['To']}")
+            return
+        not_before = time.monotonic() + min(MAIL_MAX_BACKOFF, 2 ** attempts)
+        heapq.heappush(self._retries, (not_before, next(self._retry_seq), msg, attempts))
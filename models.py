@@ -26,10 +26,12 @@ class MusicalLink(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     musical_id = db.Column(db.Integer, db.ForeignKey('musicals.id'), nullable=False)
-    url = db.Column(db.String(500), nullable=False)
+    url = db.Column(db.String(500), nullable=False, index=True)
     is_available = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     last_checked = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    max_body_bytes = db.Column(db.Integer)  # None -> MONITOR_MAX_BODY_BYTES
+    consecutive_failures = db.Column(db.Integer, default=0)  # quarantined at MONITOR_QUARANTINE_AFTER
     
     # Relationship - back_populates en lugar de backref
     musical = db.relationship('Musical', back_populates='links')
@@ -39,6 +41,7 @@ class MusicalLink(db.Model):
 
 class MusicalChange(db.Model):
     __tablename__ = 'musical_changes'
+    __table_args__ = (db.Index('ix_musical_changes_musical_created', 'musical_id', 'created_at'),)
     
     id = db.Column(db.Integer, primary_key=True)
     musical_id = db.Column(db.Integer, db.ForeignKey('musicals.id'), nullable=False)
@@ -47,12 +50,112 @@ class MusicalChange(db.Model):
     status_code = db.Column(db.Integer)
     notified = db.Column(db.Boolean, default=False)
     diff_snippet = db.Column(db.Text)
+    # Legacy inline bodies; new rows reference content_blobs via old_hash/new_hash
     old_value = db.Column(db.Text)
     new_value = db.Column(db.Text)
+    old_hash = db.Column(db.String(64))
+    new_hash = db.Column(db.String(64))
     created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
     # Relationship - back_populates en lugar de backref
     musical = db.relationship('Musical', back_populates='changes')
     
     def __repr__(self):
-        return f'<MusicalChange {self.change_type}>'
\ No newline at end of file
+        return f'<MusicalChange {self.change_type}>'
+
+class UrlSnapshot(db.Model):
+    __tablename__ = 'url_snapshots'
+    
+    url = db.Column(db.String(500), primary_key=True)
+    hash = db.Column(db.String(64))
+    fingerprint = db.Column(db.String(64))
+    stages = db.Column(db.JSON)
+    text_hash = db.Column(db.String(64))
+    body_hash = db.Column(db.String(64))
+    body_size = db.Column(db.Integer)
+    etag = db.Column(db.String(500))
+    last_modified = db.Column(db.String(100))
+    last_checked = db.Column(db.DateTime)
+    # Adaptive scheduler state
+    next_due = db.Column(db.DateTime)
+    check_interval = db.Column(db.Integer)
+    
+    def __repr__(self):
+        return f'<UrlSnapshot {self.url}>'
+
+class ContentBlob(db.Model):
+    __tablename__ = 'content_blobs'
+    
+    hash = db.Column(db.String(64), primary_key=True)
+    codec = db.Column(db.String(10), nullable=False)
+    data = db.Column(db.LargeBinary, nullable=False)
+    size = db.Column(db.Integer)
+    refcount = db.Column(db.Integer, nullable=False, default=0)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    
+    def __repr__(self):
+        return f'<ContentBlob {self.hash[:12]} refs={self.refcount}>'
+
+class MonitorWorker(db.Model):
+    __tablename__ = 'monitor_workers'
+    
+    worker_id = db.Column(db.String(100), primary_key=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<MonitorWorker {self.worker_id}>'
+
+class HostQuota(db.Model):
+    __tablename__ = 'host_quotas'
+    
+    host = db.Column(db.String(255), primary_key=True)
+    window_start = db.Column(db.BigInteger, nullable=False)  # epoch second the count belongs to
+    used = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<HostQuota {self.host} {self.used}@{self.window_start}>'
+
+class MonitorLease(db.Model):
+    __tablename__ = 'monitor_leases'
+    
+    shard_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    owner = db.Column(db.String(100), index=True)
+    expires_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<MonitorLease {self.shard_id} owner={self.owner}>'
+
+class NotificationOutbox(db.Model):
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (db.Index('ix_notification_outbox_due', 'status', 'next_attempt_at'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    change_id = db.Column(db.Integer, db.ForeignKey('musical_changes.id', ondelete='SET NULL'), index=True)
+    channel = db.Column(db.String(20), nullable=False)  # telegram | discord
+    message = db.Column(db.Text, nullable=False)
+    group_key = db.Column(db.String(200))  # musical name; alerts are coalesced per group
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending | sending | sent | failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(64))
+    locked_until = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime)
+    
+    def __repr__(self):
+        return f'<NotificationOutbox {self.channel} {self.status}>'
+
+class Suggestion(db.Model):
+    __tablename__ = 'suggestions'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    site_name = db.Column(db.String(200), nullable=False)
+    site_url = db.Column(db.String(500), nullable=False)
+    reason = db.Column(db.Text)
+    contact = db.Column(db.String(200))
+    discount_code = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc), index=True)
+    
+    def __repr__(self):
+        return f'<Suggestion {self.site_name}>'
@@ -0,0 +1,70 @@
+"""
+Read side of the musicals catalogue shared by the dashboard, the admin page
+and ``/api/musicals``.
+
+Those views used to run ``Musical.query.all()`` and then, per musical, a
+``MusicalLink`` query and a "latest ``MusicalChange``" query (2N+1 queries on
+a page the front end polls every few seconds), reassigning ``musical.links``
+on the way. :func:`musicals_with_last_change` loads everything in two
+queries whatever the number of musicals: one for the musicals joined to a
+grouped ``max(created_at)`` subquery over ``musical_changes``, one
+``selectinload`` for all their links.
+
+All functions expect an active Flask application context.
+"""
+from sqlalchemy import func
+from sqlalchemy.orm import selectinload
+
+from models import db, Musical, MusicalChange
+
+
+def _last_change_subquery():
+    return (db.session.query(MusicalChange.musical_id.label('musical_id'),
+                             func.max(MusicalChange.created_at).label('last_change'))
+            .group_by(MusicalChange.musical_id)
+            .subquery())
+
+
+def musicals_with_links():
+    """All musicals with ``links`` eagerly loaded."""
+    return Musical.query.options(selectinload(Musical.links)).order_by(Musical.id).all()
+
+
+def musicals_with_last_change():
+    """``[(musical, last_change_datetime_or_None)]`` with ``links`` eagerly loaded."""
+    last = _last_change_subquery()
+    return (db.session.query(Musical, last.c.last_change)
+            .outerjoin(last, last.c.musical_id == Musical.id)
+            .options(selectinload(Musical.links))
+            .order_by(Musical.id)
+            .all())
+
+
+def link_counts(musical):
+    """``(active, sold_out)`` link counts for the dashboard cards."""
+    active = sum(1 for link in musical.links if link.is_available)
+    return active, len(musical.links) - active
+
+
+def musical_to_dict(musical, last_change=None):
+    """JSON shape served by ``/api/musicals``."""
+    links = []
+    for link in musical.links:
+        link_dict = {'url': link.url, 'is_available': link.is_available}
+        if link.last_checked:
+            link_dict['last_checked'] = link.last_checked.isoformat()
+        if link.created_at:
+            link_dict['created_at'] = link.created_at.isoformat()
+        links.append(link_dict)
+    out = {
+        'id': musical.id,
+        'name': musical.name,
+        'links': links,
+        'description': musical.description,
+        'is_available': musical.is_available,
+    }
+    if musical.updated_at:
+        out['updated_at'] = musical.updated_at.isoformat()
+    if last_change:
+        out['last_change'] = last_change.isoformat()
+    return out
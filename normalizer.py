@@ -0,0 +1,200 @@
+"""
+Noise-stripping normalization applied to page bodies before fingerprinting.
+
+Ticketing pages change on every request because of CSRF tokens, analytics
+nonces, cache-busting query strings and inline scripts. The pipeline below
+removes that noise so only meaningful changes reach the diff, the database
+and the notifiers:
+
+    strip_scripts -> strip_comments -> html scrubbers -> visible_text -> text scrubbers
+
+Scrubbers are regular expressions configured in ``static/data/normalization.json``
+(global rules plus per-host rules). Every stage output is hashed, so when the
+raw page changed but the final fingerprint did not, we know which rule
+suppressed the change and can count it (see :func:`get_stats`).
+"""
+import hashlib
+import logging
+import re
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import lxml.html
+from lxml import etree
+
+import json_store
+
+RULES_FILE = Path(__file__).parent / "static" / "data" / "normalization.json"
+
+# Elements whose content is never visible text
+NOISE_TAGS = ('script', 'style', 'noscript', 'template')
+# Elements that start a new line of visible text
+BLOCK_TAGS = frozenset((
+    'address', 'article', 'aside', 'blockquote', 'br', 'dd', 'div', 'dl', 'dt', 'fieldset',
+    'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header',
+    'hr', 'li', 'main', 'nav', 'ol', 'option', 'p', 'pre', 'section', 'table', 'td', 'th',
+    'tr', 'ul',
+))
+# lxml refuses str input that starts with an XML declaration naming an encoding
+XML_DECLARATION = re.compile(r'^\s*<\?xml[^>]*\?>', re.IGNORECASE)
+
+logger = logging.getLogger(__name__)
+
+_stats = {'raw_changes': 0, 'meaningful_changes': 0, 'suppressed': {}}
+_stats_lock = threading.Lock()
+
+
+class Rule:
+    __slots__ = ('name', 'pattern', 'replace', 'target')
+
+    def __init__(self, name, pattern, replace='', target='html', flags=0):
+        self.name = name
+        self.pattern = re.compile(pattern, flags)
+        self.replace = replace
+        self.target = target
+
+    def apply(self, value):
+        return self.pattern.sub(self.replace, value)
+
+
+def _parse_rules(items):
+    rules = []
+    for item in items or []:
+        try:
+            flags = re.IGNORECASE if item.get('ignore_case', True) else 0
+            rules.append(Rule(item['name'], item['pattern'], item.get('replace', ''), item.get('target', 'html'), flags))
+        except (KeyError, re.error) as e:
+            logger.warning(f"⚠️  Invalid normalization rule {item!r}: {e}")
+    return rules
+
+
+# (source data, parsed rules): rules are only recompiled when the file changes
+_parsed = (None, None)
+
+
+def load_rules(path=RULES_FILE):
+    """Load scrubber rules as {'global': [Rule], 'hosts': {host: [Rule]}}."""
+    global _parsed
+    data = json_store.load(path, {})
+    if not isinstance(data, dict):
+        return {'global': [], 'hosts': {}}
+    source, rules = _parsed
+    if source is data:
+        return rules
+    rules = {
+        'global': _parse_rules(data.get('global')),
+        'hosts': {host.lower(): _parse_rules(items) for host, items in (data.get('hosts') or {}).items()},
+    }
+    _parsed = (data, rules)
+    return rules
+
+
+def rules_for(url, rules):
+    host = (urlsplit(url).hostname or '').lower()
+    return list(rules.get('global', [])) + list(rules.get('hosts', {}).get(host, []))
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode('utf-8')).hexdigest()
+
+
+def _parse(html):
+    """Parse ``html`` (str) into a document, ignoring any XML declaration; None if lxml can't."""
+    try:
+        return lxml.html.document_fromstring(XML_DECLARATION.sub('', html, count=1))
+    except (etree.ParserError, ValueError):
+        return None
+
+
+def _visible_text(html):
+    doc = _parse(html)
+    if doc is None:
+        return html
+    for el in doc.iter(*BLOCK_TAGS):
+        el.tail = '\n' + (el.tail or '')
+    text = doc.text_content()
+    lines = (' '.join(line.split()) for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def normalize(body, url='', rules=None):
+    """Run the normalization pipeline on a page body.
+
+    Returns ``(text, stages)`` where ``text`` is the normalized visible text and
+    ``stages`` is a list of ``[stage_name, sha256]`` pairs, the first one being
+    the raw body and the last one the fingerprint used for change detection.
+    """
+    body = body or ''
+    rules = rules_for(url, rules) if rules is not None else []
+    stages = [['raw', _digest(body)]]
+
+    doc = _parse(body) if body.strip() else None
+
+    if doc is not None:
+        for el in list(doc.iter(*NOISE_TAGS)):
+            if el.getparent() is not None:
+                el.drop_tree()
+        html = etree.tostring(doc, encoding='unicode', method='html')
+        stages.append(['strip_scripts', _digest(html)])
+
+        for comment in list(doc.iter(etree.Comment)):
+            if comment.getparent() is not None:
+                comment.drop_tree()
+        html = etree.tostring(doc, encoding='unicode', method='html')
+        stages.append(['strip_comments', _digest(html)])
+    else:
+        html = body
+
+    for rule in rules:
+        if rule.target == 'html':
+            html = rule.apply(html)
+            stages.append([rule.name, _digest(html)])
+
+    text = _visible_text(html) if html.strip() else ''
+    stages.append(['visible_text', _digest(text)])
+
+    for rule in rules:
+        if rule.target == 'text':
+            text = rule.apply(text)
+            stages.append([rule.name, _digest(text)])
+
+    return text, stages
+
+
+def fingerprint(stages):
+    return stages[-1][1] if stages else None
+
+
+def suppressing_stage(prev_stages, stages):
+    """Name of the first stage at which two differing raw bodies became equal."""
+    if not prev_stages or not stages:
+        return None
+    prev = {name: h for name, h in prev_stages}
+    for name, h in stages[1:]:
+        if prev.get(name) == h:
+            return name
+    return None
+
+
+def record(raw_changed, meaningful, prev_stages=None, stages=None):
+    """Update the suppression counters for one checked URL."""
+    if not raw_changed:
+        return
+    with _stats_lock:
+        _stats['raw_changes'] += 1
+        if meaningful:
+            _stats['meaningful_changes'] += 1
+            return
+        name = suppressing_stage(prev_stages, stages) or 'unknown'
+        _stats['suppressed'][name] = _stats['suppressed'].get(name, 0) + 1
+
+
+def get_stats():
+    with _stats_lock:
+        return {
+            'raw_changes': _stats['raw_changes'],
+            'meaningful_changes': _stats['meaningful_changes'],
+            'suppressed_total': sum(_stats['suppressed'].values()),
+            'suppressed_by_rule': dict(_stats['suppressed']),
+        }
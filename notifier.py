@@ -0,0 +1,418 @@
+"""
+Outbox-based delivery of change alerts (Telegram, Discord).
+
+Alerts used to be sent inline from the monitor loop with
+``asyncio.run(...)`` per change, so one slow Telegram response stalled the
+whole check cycle. The monitor now only writes ``notification_outbox`` rows,
+in the same transaction as the ``MusicalChange`` they announce (see
+:mod:`change_batch`), and an :class:`OutboxDispatcher` delivers them:
+
+* a long-lived thread runs one asyncio event loop; every channel gets its
+  own task, so Telegram and Discord are sent in parallel;
+* each channel is paced to its provider's rate limit and waits out
+  ``429``/``retry_after`` answers before sending anything else;
+* failed deliveries are retried with exponential backoff up to
+  ``NOTIFY_MAX_ATTEMPTS`` times, then marked ``failed``;
+* on success the row is marked ``sent`` and ``MusicalChange.notified`` flips.
+
+Alerts are coalesced into digests: rows wait ``digest_window_seconds`` and
+are then sent as one message per musical (or one for every musical when
+``across_musicals`` is set), trimmed to the provider's length limit.
+``static/data/notifications.json`` can mark a musical (or some of its URLs,
+by substring) as ``immediate``; those alerts skip the window.
+
+Rows are claimed with a compare-and-set ``UPDATE`` plus a lock timeout, so
+several processes can run a dispatcher against the same database, and rows
+left ``sending`` by a crashed process are picked up again.
+"""
+import asyncio
+import logging
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import and_, or_, update
+
+import http_client
+import json_store
+from models import db, MusicalChange, NotificationOutbox
+
+NOTIFY_MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '8'))
+NOTIFY_RETRY_BASE = int(os.getenv('NOTIFY_RETRY_BASE', '30'))  # segundos, x2 por intento
+NOTIFY_RETRY_MAX = int(os.getenv('NOTIFY_RETRY_MAX', '3600'))
+NOTIFY_POLL_SECONDS = float(os.getenv('NOTIFY_POLL_SECONDS', '5'))
+NOTIFY_BATCH_SIZE = int(os.getenv('NOTIFY_BATCH_SIZE', '50'))
+LOCK_SECONDS = 300
+# Longest provider-requested pause we wait for in place before rescheduling
+MAX_INLINE_RETRY_AFTER = 60
+# Rate-limited sends retried in place before the message goes back to the outbox backoff
+MAX_INLINE_ATTEMPTS = 3
+
+# Messages per second per channel (Telegram: ~1/s per chat, Discord webhooks: 5 per 2 s)
+CHANNEL_RATES = {
+    'telegram': float(os.getenv('NOTIFY_TELEGRAM_RATE', '1')),
+    'discord': float(os.getenv('NOTIFY_DISCORD_RATE', '2')),
+}
+
+# Provider message limits (Telegram: 4096, Discord: 2000), with some margin
+CHANNEL_LIMITS = {'telegram': 4000, 'discord': 1900}
+MIN_DIGEST_ITEM_CHARS = 160
+
+POLICY_FILE = Path(__file__).parent / "static" / "data" / "notifications.json"
+NOTIFY_DIGEST_WINDOW = int(os.getenv('NOTIFY_DIGEST_WINDOW', '60'))  # segundos
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    # Naive UTC: compares consistently on SQLite and Postgres
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class Delivery:
+    """Outcome of one send attempt."""
+
+    __slots__ = ('ok', 'retry_after', 'error')
+
+    def __init__(self, ok, retry_after=None, error=None):
+        self.ok = ok
+        self.retry_after = retry_after
+        self.error = error
+
+
+def telegram_sender(token, chat_id, timeout=8):
+    """Blocking sender for the Telegram Bot API ``sendMessage`` method."""
+    api = f"https://api.telegram.org/bot{token}/sendMessage"
+
+    def send(message):
+        r = http_client.post(api, json={'chat_id': chat_id, 'text': message}, timeout=timeout)
+        try:
+            data = r.json()
+        except ValueError:
+            data = {}
+        if r.ok and data.get('ok'):
+            return Delivery(True)
+        retry_after = (data.get('parameters') or {}).get('retry_after') if r.status_code == 429 else None
+        return Delivery(False, retry_after, f"HTTP {r.status_code}: {data.get('description') or r.text[:200]}")
+
+    return send
+
+
+def discord_sender(webhook_url, timeout=6):
+    """Blocking sender for a Discord webhook."""
+
+    def send(message):
+        r = http_client.post(webhook_url, json={'content': message}, timeout=timeout)
+        if r.ok:
+            return Delivery(True)
+        retry_after = None
+        if r.status_code == 429:
+            try:
+                retry_after = float(r.headers.get('Retry-After') or r.json().get('retry_after'))
+            except (TypeError, ValueError):
+                retry_after = 1.0
+        return Delivery(False, retry_after, f"HTTP {r.status_code}: {r.text[:200]}")
+
+    return send
+
+
+class DigestPolicy:
+    """How long alerts wait to be coalesced, how they are grouped and which skip the wait."""
+
+    __slots__ = ('window', 'across_musicals', 'immediate')
+
+    def __init__(self, window=NOTIFY_DIGEST_WINDOW, across_musicals=False, immediate=None):
+        self.window = max(0, window)
+        self.across_musicals = across_musicals
+        self.immediate = immediate or {}  # lower-cased musical -> True | [url substrings]
+
+    def is_immediate(self, musical, url):
+        rule = self.immediate.get((musical or '').lower())
+        if rule is True:
+            return True
+        return bool(rule) and any(pattern in (url or '') for pattern in rule)
+
+
+def load_policy(path=POLICY_FILE):
+    data = json_store.load(path, {})
+    if not isinstance(data, dict):
+        return DigestPolicy()
+    immediate = {}
+    for name, conf in (data.get('musicals') or {}).items():
+        rule = conf.get('immediate') if isinstance(conf, dict) else None
+        if rule is True or (isinstance(rule, list) and rule):
+            immediate[name.lower()] = True if rule is True else [str(p) for p in rule]
+    return DigestPolicy(
+        window=int(data.get('digest_window_seconds', NOTIFY_DIGEST_WINDOW)),
+        across_musicals=bool(data.get('across_musicals', False)),
+        immediate=immediate,
+    )
+
+
+def enqueue(channels, message, change_id=None, musical=None, url=None, policy=None):
+    """Add one outbox row per channel to the current session (the caller commits).
+
+    Unless ``policy`` marks the alert as immediate, the rows only become due
+    after the digest window so alerts of the same cycle go out together.
+    """
+    policy = policy or load_policy()
+    now = _now()
+    due = now if policy.is_immediate(musical, url) else now + timedelta(seconds=policy.window)
+    rows = [NotificationOutbox(change_id=change_id, channel=channel, message=message, group_key=musical,
+                               status='pending', attempts=0, next_attempt_at=due)
+            for channel in channels]
+    db.session.add_all(rows)
+    return rows
+
+
+def _clip(text, limit):
+    return text if len(text) <= limit else text[:max(0, limit - 1)] + '…'
+
+
+def build_digest(messages, limit, title=None):
+    """Join alert ``messages`` into one message of at most ``limit`` characters.
+
+    Every item gets a fair share of the space (short items leave theirs to
+    the others); items that cannot get ``MIN_DIGEST_ITEM_CHARS`` are only
+    counted in a footer.
+    """
+    if len(messages) == 1:
+        return _clip(messages[0], limit)
+    header = title or f"🔔 {len(messages)} cambios detectados"
+    sep = '\n\n'
+    shown = len(messages)
+    while True:
+        footer = f"{sep}… y {len(messages) - shown} cambios más" if shown < len(messages) else ''
+        budget = limit - len(header) - len(footer) - len(sep) * shown
+        if shown == 1 or budget // shown >= MIN_DIGEST_ITEM_CHARS:
+            break
+        shown -= 1
+    items = []
+    remaining = max(0, budget)
+    for i, message in enumerate(messages[:shown]):
+        share = remaining // (shown - i)
+        items.append(_clip(message, share))
+        remaining -= len(items[-1])
+    return _clip(sep.join([header] + items) + footer, limit)
+
+
+def backoff(attempts):
+    return min(NOTIFY_RETRY_MAX, NOTIFY_RETRY_BASE * 2 ** max(0, attempts - 1))
+
+
+class _Pacer:
+    """Spaces sends on one channel ``1 / rate`` seconds apart."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / max(0.01, rate)
+        self.next_slot = 0.0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        if self.next_slot > now:
+            await asyncio.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+    def pause(self, seconds):
+        loop = asyncio.get_running_loop()
+        self.next_slot = max(self.next_slot, loop.time() + seconds)
+
+
+class OutboxDispatcher:
+    def __init__(self, app, senders, rates=None, poll_seconds=NOTIFY_POLL_SECONDS, batch_size=NOTIFY_BATCH_SIZE):
+        self.app = app
+        self.senders = dict(senders)  # channel -> blocking send(message) -> Delivery
+        self.poll_seconds = poll_seconds
+        self.batch_size = batch_size
+        self.stats = {'sent': 0, 'retried': 0, 'failed': 0}
+        self._pacers = {channel: _Pacer((rates or CHANNEL_RATES).get(channel, 1)) for channel in self.senders}
+        self._thread = None
+        self._loop = None
+        self._wakeup = None
+        self._start_lock = threading.Lock()
+
+    @property
+    def channels(self):
+        return tuple(self.senders)
+
+    # ---- lifecycle -------------------------------------------------------
+    def start(self):
+        """Start the dispatcher thread (idempotent)."""
+        if not self.senders:
+            return None
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._thread_main, daemon=True, name='notification-dispatcher')
+                self._thread.start()
+        return self._thread
+
+    def wake(self):
+        """Deliver newly committed rows now instead of at the next poll."""
+        if self._loop is not None and self._wakeup is not None:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _thread_main(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        logger.info(f"Notification dispatcher started (channels: {', '.join(self.senders)})")
+        self._loop.run_until_complete(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                delivered = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Notification dispatcher error: {e}")
+                delivered = 0
+            if delivered:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    # ---- one round -------------------------------------------------------
+    async def dispatch_once(self):
+        """Claim due rows, send them as digests (channels in parallel) and record the outcomes."""
+        policy = load_policy()
+        claimed = await asyncio.to_thread(self._claim, policy)
+        if not claimed:
+            return 0
+        by_channel = {}
+        for row in claimed:
+            by_channel.setdefault(row.channel, []).append(row)
+        results = await asyncio.gather(*(self._send_channel(channel, self._digests(channel, rows, policy))
+                                         for channel, rows in by_channel.items()))
+        outcomes = [outcome for channel_outcomes in results for outcome in channel_outcomes]
+        await asyncio.to_thread(self._record, outcomes)
+        return len(outcomes)
+
+    @staticmethod
+    def _digests(channel, rows, policy):
+        """[(rows, text)]: one digest per musical, or a single one when grouping across musicals."""
+        groups = {}
+        for row in rows:
+            groups.setdefault(None if policy.across_musicals else row.group_key, []).append(row)
+        limit = CHANNEL_LIMITS.get(channel, 2000)
+        digests = []
+        for key, group in groups.items():
+            title = f"🔔 {len(group)} cambios detectados" + (f" en {key}" if key else '')
+            digests.append((group, build_digest([row.message for row in group], limit, title)))
+        return digests
+
+    async def _send_channel(self, channel, digests):
+        send = self.senders.get(channel)
+        pacer = self._pacers.get(channel) or _Pacer(1)
+        outcomes = []
+        for rows, message in digests:
+            if send is None:
+                delivery = Delivery(False, error=f'channel {channel} not configured')
+            else:
+                for attempt in range(1, MAX_INLINE_ATTEMPTS + 1):
+                    await pacer.wait()
+                    try:
+                        delivery = await asyncio.to_thread(send, message)
+                    except Exception as e:
+                        delivery = Delivery(False, error=str(e))
+                    if (delivery.ok or not delivery.retry_after or delivery.retry_after > MAX_INLINE_RETRY_AFTER
+                            or attempt == MAX_INLINE_ATTEMPTS):
+                        break
+                    # Rate limited by the provider: respect it, then retry this message
+                    pacer.pause(delivery.retry_after)
+                if delivery.retry_after:
+                    pacer.pause(min(delivery.retry_after, MAX_INLINE_RETRY_AFTER))
+            outcomes.extend((row.id, row.change_id, row.attempts, delivery) for row in rows)
+        return outcomes
+
+    def _claim(self, policy):
+        with self.app.app_context():
+            now = _now()
+            token = uuid.uuid4().hex
+            claimable = or_(
+                and_(NotificationOutbox.status == 'pending',
+                     or_(NotificationOutbox.next_attempt_at.is_(None), NotificationOutbox.next_attempt_at <= now)),
+                and_(NotificationOutbox.status == 'sending', NotificationOutbox.locked_until < now),
+            )
+            try:
+                due = (db.session.query(NotificationOutbox.id, NotificationOutbox.channel, NotificationOutbox.group_key)
+                       .filter(claimable, NotificationOutbox.channel.in_(list(self.senders)))
+                       .order_by(NotificationOutbox.id).limit(self.batch_size).all())
+                if not due:
+                    db.session.rollback()
+                    return []
+                ids = [row_id for row_id, _, _ in due]
+                # Fresh alerts of the same groups still inside their window join the digest now
+                if policy.across_musicals:
+                    same_group = NotificationOutbox.channel.in_({channel for _, channel, _ in due})
+                else:
+                    same_group = or_(*(and_(NotificationOutbox.channel == channel,
+                                            NotificationOutbox.group_key.is_(None) if group_key is None
+                                            else NotificationOutbox.group_key == group_key)
+                                       for channel, group_key in {(channel, key) for _, channel, key in due}))
+                siblings = (db.session.query(NotificationOutbox.id)
+                            .filter(NotificationOutbox.status == 'pending', NotificationOutbox.attempts == 0,
+                                    NotificationOutbox.id.notin_(ids), same_group)
+                            .order_by(NotificationOutbox.id).limit(self.batch_size).all())
+                ids += [row_id for (row_id,) in siblings]
+                db.session.execute(
+                    update(NotificationOutbox)
+                    .where(NotificationOutbox.id.in_(ids), or_(claimable, NotificationOutbox.status == 'pending'))
+                    .values(status='sending', locked_by=token, locked_until=now + timedelta(seconds=LOCK_SECONDS))
+                )
+                db.session.commit()
+                return (db.session.query(NotificationOutbox.id, NotificationOutbox.change_id, NotificationOutbox.channel,
+                                         NotificationOutbox.group_key, NotificationOutbox.message, NotificationOutbox.attempts)
+                        .filter(NotificationOutbox.locked_by == token, NotificationOutbox.status == 'sending')
+                        .order_by(NotificationOutbox.id).all())
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _record(self, outcomes):
+        with self.app.app_context():
+            now = _now()
+            sent_ids, notified_changes = [], set()
+            try:
+                for row_id, change_id, attempts, delivery in outcomes:
+                    if delivery.ok:
+                        sent_ids.append(row_id)
+                        if change_id:
+                            notified_changes.add(change_id)
+                        continue
+                    attempts += 1
+                    if attempts >= NOTIFY_MAX_ATTEMPTS:
+                        values = {'status': 'failed'}
+                        self.stats['failed'] += 1
+                        logger.error(f"Notification {row_id} dropped after {attempts} attempts: {delivery.error}")
+                    else:
+                        delay = max(backoff(attempts), delivery.retry_after or 0)
+                        values = {'status': 'pending', 'next_attempt_at': now + timedelta(seconds=delay)}
+                        self.stats['retried'] += 1
+                        logger.warning(f"Notification {row_id} failed ({delivery.error}); retry in {delay:.0f}s")
+                    db.session.execute(
+                        update(NotificationOutbox).where(NotificationOutbox.id == row_id)
+                        .values(attempts=attempts, last_error=(delivery.error or '')[:1000],
+                                locked_by=None, locked_until=None, **values)
+                    )
+                if sent_ids:
+                    db.session.execute(
+                        update(NotificationOutbox).where(NotificationOutbox.id.in_(sent_ids))
+                        .values(status='sent', sent_at=now, locked_by=None, locked_until=None, last_error=None)
+                    )
+                    self.stats['sent'] += len(sent_ids)
+                if notified_changes:
+                    db.session.execute(
+                        update(MusicalChange).where(MusicalChange.id.in_(notified_changes)).values(notified=True)
+                    )
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def pending_count(self):
+        return db.session.query(NotificationOutbox.id).filter(NotificationOutbox.status.in_(('pending', 'sending'))).count()
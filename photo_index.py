@@ -0,0 +1,122 @@
+"""
+Case-insensitive index of the files under ``static/fotos``.
+
+``serve_foto`` used to try several casing permutations with
+``os.path.exists`` on every miss and then ``os.walk`` the whole tree, and its
+cache only remembered hits, so every request for a missing image walked the
+tree again. :class:`PhotoIndex` walks the tree once into a
+``lowercased path -> real path`` dict and keeps each directory's mtime:
+
+* every ``PHOTO_INDEX_RECHECK`` seconds a lookup re-``stat``s the indexed
+  directories (not their files) and re-walks only if one of them changed;
+* misses are remembered in a bounded LRU (``PHOTO_NEGATIVE_CACHE`` entries).
+  A path that is not in it yet triggers at most one early recheck per
+  second, so a newly uploaded photo is found at once but a flood of 404s
+  for random names never turns into filesystem scans.
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+PHOTO_INDEX_RECHECK = float(os.getenv('PHOTO_INDEX_RECHECK', '30'))  # segundos
+PHOTO_NEGATIVE_CACHE = int(os.getenv('PHOTO_NEGATIVE_CACHE', '1024'))
+MISS_RECHECK = 1.0  # segundos
+
+logger = logging.getLogger(__name__)
+
+
+def normalize(relpath):
+    return relpath.replace('\\', '/').strip('/')
+
+
+class PhotoIndex:
+    def __init__(self, root, recheck=PHOTO_INDEX_RECHECK, negative_size=PHOTO_NEGATIVE_CACHE, clock=time.monotonic):
+        self.root = os.fspath(root)
+        self.recheck = recheck
+        self.negative_size = max(0, negative_size)
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._by_lower = {}
+        self._dir_mtimes = {}
+        self._misses = OrderedDict()
+        self._checked_at = None
+        self.stats = {'builds': 0, 'hits': 0, 'misses': 0, 'negative_hits': 0}
+
+    def _walk(self):
+        by_lower, dir_mtimes = {}, {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            try:
+                dir_mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+            except OSError:
+                continue
+            rel_dir = os.path.relpath(dirpath, self.root)
+            for name in filenames:
+                rel = name if rel_dir == '.' else f"{rel_dir}/{name}"
+                rel = rel.replace(os.sep, '/')
+                # first one wins if two files differ only in case
+                by_lower.setdefault(rel.lower(), rel)
+        return by_lower, dir_mtimes
+
+    def _changed(self):
+        if not self._dir_mtimes:
+            return True
+        for dirpath, mtime in self._dir_mtimes.items():
+            try:
+                if os.stat(dirpath).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _revalidate(self, now):
+        """Re-walk the tree if a directory changed. Caller holds the lock."""
+        self._checked_at = now
+        if not self._changed():
+            return
+        self._by_lower, self._dir_mtimes = self._walk()
+        self._misses.clear()
+        self.stats['builds'] += 1
+        logger.info(f"🖼️  Photo index built: {len(self._by_lower)} files in {len(self._dir_mtimes)} folders")
+
+    def refresh(self):
+        with self._lock:
+            self._revalidate(self.clock())
+
+    def paths(self):
+        """Real paths (relative to the root) of every indexed file."""
+        now = self.clock()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.recheck:
+                self._revalidate(now)
+            return list(self._by_lower.values())
+
+    def resolve(self, relpath):
+        """Real path (relative to the root) of ``relpath``, matched case-insensitively, or None."""
+        key = normalize(relpath).lower()
+        now = self.clock()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.recheck:
+                self._revalidate(now)
+            found = self._by_lower.get(key)
+            if found is not None:
+                self.stats['hits'] += 1
+                return found
+            if key in self._misses:
+                self._misses.move_to_end(key)
+                self.stats['negative_hits'] += 1
+                return None
+            if now - self._checked_at >= MISS_RECHECK:
+                # maybe it was just added
+                self._revalidate(now)
+                found = self._by_lower.get(key)
+                if found is not None:
+                    self.stats['hits'] += 1
+                    return found
+            self.stats['misses'] += 1
+            if self.negative_size:
+                self._misses[key] = None
+                if len(self._misses) > self.negative_size:
+                    self._misses.popitem(last=False)
+            return None
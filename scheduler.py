@@ -0,0 +1,98 @@
+"""
+Adaptive per-link scheduler for the background monitor.
+
+Each monitored URL has its own interval and next-due time, kept in a
+priority queue (heap ordered by due time). Intervals tighten when a page
+changes and back off while it stays the same (or keeps failing), so static
+"elenco" pages end up polled far less often than live ticket pages.
+Every due time carries random jitter so checks spread across the interval
+instead of firing in bursts.
+
+Due times and intervals are persisted by the caller (see
+``snapshot_store.save_schedule``) and passed back to :meth:`LinkScheduler.sync`
+after a restart; overdue URLs are then spread over their interval instead of
+all firing at once.
+"""
+import heapq
+import itertools
+import random
+import time
+
+
+class LinkScheduler:
+    def __init__(self, base_interval, min_interval=None, max_interval=None,
+                 jitter=0.1, backoff=1.5, clock=time.time):
+        self.base_interval = max(1, base_interval)
+        self.min_interval = max(1, min_interval or self.base_interval)
+        self.max_interval = max(self.base_interval, max_interval or self.base_interval * 20)
+        self.jitter = jitter
+        self.backoff = backoff
+        self.clock = clock
+        self._heap = []
+        self._state = {}  # url -> [due, interval]
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self._state)
+
+    def _jittered(self, interval):
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def _push(self, url, due, interval):
+        self._state[url] = [due, interval]
+        heapq.heappush(self._heap, (due, next(self._seq), url))
+
+    def sync(self, urls, persisted=None):
+        """Track exactly ``urls``; ``persisted`` maps url -> (due_ts, interval) saved earlier."""
+        now = self.clock()
+        persisted = persisted or {}
+        wanted = set(urls)
+        for url in list(self._state):
+            if url not in wanted:
+                del self._state[url]  # stale heap entries are skipped lazily
+        for url in urls:
+            if url in self._state:
+                continue
+            due, interval = persisted.get(url) or (None, None)
+            interval = min(self.max_interval, max(self.min_interval, interval or self.base_interval))
+            if due is None or due <= now:
+                # New or overdue after a restart: spread over one interval
+                due = now + random.uniform(0, interval)
+            self._push(url, due, interval)
+
+    def due(self, now=None, limit=None):
+        """Pop and return the URLs whose due time has passed (earliest first)."""
+        now = self.clock() if now is None else now
+        out = []
+        while self._heap and self._heap[0][0] <= now and (limit is None or len(out) < limit):
+            due, _, url = heapq.heappop(self._heap)
+            state = self._state.get(url)
+            if state is None or state[0] != due:
+                continue
+            out.append(url)
+        return out
+
+    def next_wakeup(self):
+        """Due time of the earliest live entry (``None`` when nothing is scheduled)."""
+        while self._heap:
+            due, _, url = self._heap[0]
+            state = self._state.get(url)
+            if state is not None and state[0] == due:
+                return due
+            heapq.heappop(self._heap)
+        return None
+
+    def record(self, url, changed=False, failed=False, now=None):
+        """Reschedule ``url`` after a check. Returns (next_due_ts, interval)."""
+        now = self.clock() if now is None else now
+        interval = (self._state.get(url) or [None, self.base_interval])[1]
+        if changed:
+            interval = self.min_interval
+        elif failed:
+            interval = interval * self.backoff * self.backoff
+        else:
+            interval = interval * self.backoff
+        interval = min(self.max_interval, max(self.min_interval, interval))
+        due = now + self._jittered(interval)
+        self._push(url, due, interval)
+        return due, interval
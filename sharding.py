@@ -0,0 +1,239 @@
+"""
+Coordinated monitoring across gunicorn workers and app instances.
+
+The watchlist is split into ``MONITOR_SHARDS`` shards and every process that
+runs the background monitor claims a disjoint subset of them through the
+``monitor_leases`` table, so each URL is fetched (and alerted on) by exactly
+one process:
+
+* A URL's shard is a hash of the URL alone (:func:`shard_of`), so every
+  worker agrees on the mapping whatever version of the watchlist it has
+  cached, and the URLs of a big ticketing host are spread over all shards
+  (and workers) instead of pinning the host to one of them.
+* Per-host politeness therefore has to be shared: :class:`HostQuota` counts
+  the requests made to each host in the current second in the
+  ``host_quotas`` table, so ``MONITOR_HOST_RATE`` holds across every worker.
+* Live processes heartbeat in ``monitor_workers``; each one aims for
+  ``ceil(shards / live_workers)`` leases, releasing extras when a new worker
+  joins and claiming free or expired leases otherwise.
+* Leases are renewed on every heartbeat and, during a check cycle, by
+  :meth:`ShardCoordinator.renew`. A worker that dies stops renewing and its
+  shards are taken over once the lease expires; a worker that finds it lost
+  a lease stops writing changes and alerts for that shard's URLs.
+
+All claims are compare-and-set ``UPDATE`` statements, which works the same on
+SQLite and Postgres. Methods expect an active Flask application context.
+"""
+import hashlib
+import logging
+import math
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, text, update
+from sqlalchemy.exc import IntegrityError
+
+from host_guard import MONITOR_HOST_RATE
+from models import db, MonitorLease, MonitorWorker
+
+MONITOR_SHARDS = int(os.getenv('MONITOR_SHARDS', '16'))
+MONITOR_LEASE_SECONDS = int(os.getenv('MONITOR_LEASE_SECONDS', '60'))
+
+logger = logging.getLogger(__name__)
+
+
+def _now():
+    # Naive UTC: compares consistently on SQLite and Postgres
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def shard_of(url, num_shards=MONITOR_SHARDS):
+    """Shard of ``url``: depends on nothing but the URL, so every worker computes the same one."""
+    digest = hashlib.sha1(url.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % max(1, num_shards)
+
+
+def assign_shards(urls, num_shards=MONITOR_SHARDS):
+    """``{url: shard}`` for ``urls`` (see :func:`shard_of`)."""
+    return {url: shard_of(url, num_shards) for url in urls}
+
+
+_TAKE_QUOTA = text("""
+    INSERT INTO host_quotas (host, window_start, used) VALUES (:host, :window, 1)
+    ON CONFLICT (host) DO UPDATE SET
+        used = CASE WHEN host_quotas.window_start = excluded.window_start THEN host_quotas.used + 1 ELSE 1 END,
+        window_start = excluded.window_start
+    WHERE host_quotas.window_start <> excluded.window_start OR host_quotas.used < :limit
+    RETURNING used
+""")
+
+
+class HostQuota:
+    """Requests per host and second shared by every worker (``host_quotas`` table).
+
+    Each request is one atomic upsert; it is only counted while the host has
+    quota left in the current second. Used from the fetch threads, so it
+    talks to the engine directly instead of through ``db.session``.
+    """
+
+    def __init__(self, engine, rate=MONITOR_HOST_RATE, clock=time.time):
+        self.engine = engine
+        self.limit = max(1, math.ceil(rate))
+        self.clock = clock
+
+    def take(self, host):
+        """Count one request to ``host`` (returns 0) or return the seconds until its next window."""
+        now = self.clock()
+        window = int(now)
+        try:
+            with self.engine.begin() as conn:
+                taken = conn.execute(_TAKE_QUOTA, {'host': host, 'window': window, 'limit': self.limit}).first()
+        except Exception as e:
+            # the per-process limits still apply
+            logger.warning(f"Shared host quota unavailable for {host}: {e}")
+            return 0
+        return 0 if taken is not None else (window + 1) - now
+
+
+class ShardCoordinator:
+    def __init__(self, worker_id=None, num_shards=MONITOR_SHARDS, lease_seconds=MONITOR_LEASE_SECONDS):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self.num_shards = max(1, num_shards)
+        self.lease_seconds = max(5, lease_seconds)
+        self.owned = frozenset()
+        self.renewed_at = 0.0  # time.monotonic() of the last confirmed renewal
+
+    def _ensure_shards(self):
+        existing = {shard for (shard,) in db.session.query(MonitorLease.shard_id).all()}
+        missing = [MonitorLease(shard_id=i) for i in range(self.num_shards) if i not in existing]
+        if not missing:
+            return
+        try:
+            db.session.add_all(missing)
+            db.session.commit()
+        except IntegrityError:
+            # another worker created them first
+            db.session.rollback()
+
+    def _forget_dead_workers(self, now):
+        cutoff = now - timedelta(seconds=self.lease_seconds * 10)
+        db.session.query(MonitorWorker).filter(MonitorWorker.heartbeat_at < cutoff).delete(synchronize_session=False)
+
+    def _live_workers(self, now):
+        cutoff = now - timedelta(seconds=self.lease_seconds)
+        return db.session.query(MonitorWorker).filter(MonitorWorker.heartbeat_at >= cutoff).count()
+
+    def heartbeat(self):
+        """Renew presence and leases, rebalance, and return the set of owned shard ids."""
+        now = _now()
+        expires = now + timedelta(seconds=self.lease_seconds)
+        try:
+            self._ensure_shards()
+            worker = db.session.get(MonitorWorker, self.worker_id)
+            if worker is None:
+                db.session.add(MonitorWorker(worker_id=self.worker_id, heartbeat_at=now))
+            else:
+                worker.heartbeat_at = now
+            self._forget_dead_workers(now)
+            # Renew whatever we still hold
+            db.session.execute(
+                update(MonitorLease)
+                .where(MonitorLease.owner == self.worker_id, MonitorLease.expires_at >= now)
+                .values(expires_at=expires)
+            )
+            db.session.commit()
+
+            owned = [shard for (shard,) in db.session.query(MonitorLease.shard_id)
+                     .filter(MonitorLease.owner == self.worker_id, MonitorLease.expires_at >= now)
+                     .order_by(MonitorLease.shard_id).all()]
+            share = math.ceil(self.num_shards / max(1, self._live_workers(now)))
+
+            # Hand back extras so newly started workers can pick them up
+            for shard in owned[share:]:
+                db.session.execute(
+                    update(MonitorLease)
+                    .where(MonitorLease.shard_id == shard, MonitorLease.owner == self.worker_id)
+                    .values(owner=None, expires_at=None)
+                )
+            owned = owned[:share]
+
+            # Claim free or expired shards up to our fair share
+            if len(owned) < share:
+                free = [shard for (shard,) in db.session.query(MonitorLease.shard_id)
+                        .filter(or_(MonitorLease.owner.is_(None), MonitorLease.expires_at.is_(None), MonitorLease.expires_at < now))
+                        .order_by(MonitorLease.shard_id).all()]
+                for shard in free:
+                    if len(owned) >= share:
+                        break
+                    result = db.session.execute(
+                        update(MonitorLease)
+                        .where(MonitorLease.shard_id == shard)
+                        .where(or_(MonitorLease.owner.is_(None), MonitorLease.expires_at.is_(None), MonitorLease.expires_at < now))
+                        .values(owner=self.worker_id, expires_at=expires)
+                    )
+                    if result.rowcount == 1:
+                        owned.append(shard)
+            db.session.commit()
+            self.owned = frozenset(owned)
+            self.renewed_at = time.monotonic()
+        except Exception:
+            db.session.rollback()
+            # Without a confirmed lease we must not keep monitoring
+            self.owned = frozenset()
+            raise
+        return self.owned
+
+    def renewal_due(self):
+        """True once a third of the lease has passed since the last renewal."""
+        return time.monotonic() - self.renewed_at >= self.lease_seconds / 3
+
+    def renew(self):
+        """Extend the leases still held (no rebalancing) and drop the ones that were lost.
+
+        Called during long check cycles so another worker never takes a shard
+        mid-cycle. Returns the confirmed set of owned shards (empty if the
+        database could not confirm any).
+        """
+        now = _now()
+        try:
+            db.session.execute(
+                update(MonitorLease)
+                .where(MonitorLease.owner == self.worker_id, MonitorLease.expires_at >= now)
+                .values(expires_at=now + timedelta(seconds=self.lease_seconds))
+            )
+            db.session.commit()
+            held = {shard for (shard,) in db.session.query(MonitorLease.shard_id)
+                    .filter(MonitorLease.owner == self.worker_id, MonitorLease.expires_at >= now).all()}
+            self.renewed_at = time.monotonic()
+        except Exception as e:
+            db.session.rollback()
+            logger.warning(f"Could not renew monitor leases: {e}")
+            held = set()
+        lost = self.owned - held
+        if lost:
+            logger.warning(f"Monitor leases lost mid-cycle by {self.worker_id}: {sorted(lost)}")
+        self.owned = frozenset(self.owned & held)
+        return self.owned
+
+    def owns(self, url):
+        """True if ``url`` belongs to a shard this worker currently holds."""
+        return shard_of(url, self.num_shards) in self.owned
+
+    def release(self):
+        """Give up every lease (clean shutdown) so other workers take over immediately."""
+        try:
+            db.session.execute(
+                update(MonitorLease).where(MonitorLease.owner == self.worker_id).values(owner=None, expires_at=None)
+            )
+            db.session.query(MonitorWorker).filter_by(worker_id=self.worker_id).delete()
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        self.owned = frozenset()
+
+    def filter_urls(self, urls):
+        """The subset of ``urls`` that belongs to the shards this worker owns."""
+        return [url for url in urls if self.owns(url)]
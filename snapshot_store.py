@@ -0,0 +1,192 @@
+"""
+Incremental per-URL snapshot store backed by the ``url_snapshots`` table.
+
+Replaces the old ``static/data/snapshots.json`` file, which was parsed in full
+at the start of every cycle and rewritten in full at the end of it. Each URL
+is now written in its own transaction as soon as it has been checked, so a
+crash mid-cycle loses at most the state of the URL being processed.
+
+Snapshot entries are plain dicts::
+
+    {'hash', 'fingerprint', 'stages', 'text_hash', 'body_hash', 'body_size',
+     'etag', 'last_modified', 'last_checked'}
+
+Bodies and normalized text live in the content-addressed blob store; pass
+``body`` / ``text`` in an entry to :func:`save` and they are stored there,
+use :func:`resolve` to read them back.
+
+All functions expect an active Flask application context.
+"""
+from datetime import datetime, timezone
+
+import blob_store
+import json_store
+from models import db, UrlSnapshot
+
+FIELDS = ('hash', 'fingerprint', 'stages', 'text_hash', 'body_hash', 'body_size', 'etag', 'last_modified')
+# entry key -> column holding the blob reference
+BLOB_FIELDS = {'body': 'body_hash', 'text': 'text_hash'}
+
+
+def _to_entry(row):
+    entry = {field: getattr(row, field) for field in FIELDS}
+    entry['last_checked'] = row.last_checked.isoformat() if row.last_checked else None
+    return entry
+
+
+def _parse_dt(value):
+    if isinstance(value, datetime) or value is None:
+        return value
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def load(urls=None):
+    """Return {url: entry} for the given URLs (all stored URLs when ``urls`` is None)."""
+    query = UrlSnapshot.query
+    if urls is not None:
+        urls = [u for u in set(urls) if u]
+        if not urls:
+            return {}
+        query = query.filter(UrlSnapshot.url.in_(urls))
+    return {row.url: _to_entry(row) for row in query.all()}
+
+
+def _apply(row, entry):
+    for field in FIELDS:
+        if field in entry and field not in BLOB_FIELDS.values():
+            setattr(row, field, entry[field])
+    for key, column in BLOB_FIELDS.items():
+        if key in entry:
+            _set_blob(row, column, entry[key])
+    if 'body' in entry:
+        row.body_size = len(entry['body'].encode('utf-8')) if entry['body'] is not None else None
+    if 'last_checked' in entry:
+        row.last_checked = _parse_dt(entry['last_checked'])
+
+
+def _set_blob(row, column, text):
+    old_hash = getattr(row, column)
+    new_hash = blob_store.digest(text) if text is not None else None
+    if old_hash == new_hash:
+        return
+    blob_store.put(text)
+    blob_store.release(old_hash)
+    setattr(row, column, new_hash)
+
+
+def resolve(entry, key):
+    """Return the stored ``body`` or ``text`` of a snapshot entry (``None`` if absent)."""
+    if not isinstance(entry, dict):
+        return None
+    if entry.get(key) is not None:
+        return entry[key]
+    return blob_store.get(entry.get(BLOB_FIELDS[key]))
+
+
+def save(url, entry, commit=True):
+    """Insert or update the snapshot of one URL in its own transaction."""
+    try:
+        row = db.session.get(UrlSnapshot, url)
+        if row is None:
+            row = UrlSnapshot(url=url)
+            db.session.add(row)
+        _apply(row, entry)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def save_many(entries, commit=True):
+    """Insert or update the snapshots of several URLs ({url: entry}) with one lookup query."""
+    if not entries:
+        return
+    try:
+        rows = {row.url: row for row in UrlSnapshot.query.filter(UrlSnapshot.url.in_(list(entries))).all()}
+        # New blobs are inserted in one statement; references are taken below
+        blob_store.preload(entry.get(key) for entry in entries.values() for key in BLOB_FIELDS)
+        for url, entry in entries.items():
+            row = rows.get(url)
+            if row is None:
+                row = rows[url] = UrlSnapshot(url=url)
+                db.session.add(row)
+            _apply(row, entry)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def normalize_legacy(data):
+    """Normalize the JSON file formats: legacy ``url -> hash`` and ``url -> {hash, body, ...}``."""
+    normalized = {}
+    for url, value in (data.items() if isinstance(data, dict) else []):
+        if isinstance(value, dict):
+            normalized[url] = value
+        else:
+            normalized[url] = {'hash': value, 'body': None, 'last_checked': None}
+    return normalized
+
+
+def import_json(path, overwrite=False):
+    """One-shot import of a ``snapshots.json`` file. Returns the number of URLs imported."""
+    data = normalize_legacy(json_store.load(path, {}, cache=False))
+
+    existing = {url for (url,) in db.session.query(UrlSnapshot.url).all()}
+    imported = 0
+    for url, entry in data.items():
+        if not url or (url in existing and not overwrite):
+            continue
+        row = db.session.get(UrlSnapshot, url) if url in existing else None
+        if row is None:
+            row = UrlSnapshot(url=url)
+            db.session.add(row)
+        _apply(row, entry)
+        imported += 1
+    db.session.commit()
+    return imported
+
+
+def load_schedule(urls):
+    """Return {url: (next_due_ts, interval_seconds)} persisted by the scheduler."""
+    urls = [u for u in set(urls) if u]
+    if not urls:
+        return {}
+    rows = (db.session.query(UrlSnapshot.url, UrlSnapshot.next_due, UrlSnapshot.check_interval)
+            .filter(UrlSnapshot.url.in_(urls)).all())
+    out = {}
+    for url, next_due, interval in rows:
+        if next_due is None:
+            continue
+        if next_due.tzinfo is None:
+            next_due = next_due.replace(tzinfo=timezone.utc)
+        out[url] = (next_due.timestamp(), interval)
+    return out
+
+
+def save_schedule(schedule):
+    """Persist {url: (next_due_ts, interval_seconds)} in a single transaction."""
+    if not schedule:
+        return
+    try:
+        rows = {row.url: row for row in UrlSnapshot.query.filter(UrlSnapshot.url.in_(list(schedule))).all()}
+        for url, (due, interval) in schedule.items():
+            row = rows.get(url)
+            if row is None:
+                row = UrlSnapshot(url=url)
+                db.session.add(row)
+            row.next_due = datetime.fromtimestamp(due, timezone.utc)
+            row.check_interval = int(interval)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def is_empty():
+    return db.session.query(UrlSnapshot.url).first() is None
@@ -50,6 +50,13 @@ document.addEventListener('DOMContentLoaded', function() {
     if(parts.length<3 || isNaN(parts[0])) return null;
     return new Date(parts[0], (parts[1]||1)-1, parts[2]||1);
   }
+  // request a resized server-side variant for local photos (see image_variants.py)
+  // versioned when the page lists the photo's version (window.PHOTO_VERSIONS, see image_variants.py)
+  function sizedPhoto(url, width){
+    if (!url || !url.startsWith('/static/fotos/') || url.includes('?')) return url;
+    const version = (window.PHOTO_VERSIONS || {})[url.toLowerCase()];
+    return version ? `${url}?w=${width}&v=${version}` : `${url}?w=${width}`;
+  }
   function formatLocalDate(d){ const y=d.getFullYear(); const m=String(d.getMonth()+1).padStart(2,'0'); const day=String(d.getDate()).padStart(2,'0'); return `${y}-${m}-${day}`; }
 
   // safe build dropdown only if elements exist
@@ -106,18 +113,31 @@ document.addEventListener('DOMContentLoaded', function() {
   function toggleSelection(name, checked){ if(checked) selectedSet.add(name); else selectedSet.delete(name); updateInputPlaceholder(); calendar.refetchEvents(); }
   function getSelectedMusicalsArray(){ return Array.from(selectedSet); }
   function updateInputPlaceholder(){ const arr=getSelectedMusicalsArray(); if(!inputEl) return; inputEl.value = arr.length ? `${arr.slice(0,3).join(', ')}${arr.length>3?'…':''}` : ''; inputEl.placeholder = arr.length ? '' : 'Escribe para buscar / Escoge (click)'; }
-  function updateFilterCount(n){ if(!countEl) return; if(typeof n === 'undefined') n = allEventsCache ? allEventsCache.length : 0; countEl.textContent = `${n} evento(s)`; }
+  function updateFilterCount(n){ if(!countEl) return; if(typeof n === 'undefined') n = allEventsCache ? countOccurrences(allEventsCache) : 0; countEl.textContent = `${n} evento(s)`; }
+
+  // the count is per performance day (as with the per-day payload): a compact run counts the days its rule matches
+  const occurrenceCounts = new WeakMap();
+  function occurrenceCount(ev){
+    if(!ev.recurrence) return 1;
+    if(!occurrenceCounts.has(ev)){
+      const s = parseLocalDate(ev.start);
+      const e = parseLocalDate(ev.end || ev.start);
+      occurrenceCounts.set(ev, (s && e) ? expandRecurrence(ev, s, e, ev.musical || ev.title || '').length : 0);
+    }
+    return occurrenceCounts.get(ev);
+  }
+  function countOccurrences(events){ return events.reduce((n, ev) => n + occurrenceCount(ev), 0); }
 
   function applyFilter(events){
     const selected = getSelectedMusicalsArray();
-    if(!selected || selected.length===0){ updateFilterCount(events.length); return events; }
+    if(!selected || selected.length===0){ updateFilterCount(countOccurrences(events)); return events; }
     // compare normalized keys so UI labels (lowercase) match event titles
     const selNorm = selected.map(s => normalizeKey(s));
     const filtered = events.filter(e => {
       const name = e.musical || e.title || '';
       return selNorm.includes(normalizeKey(name));
     });
-    updateFilterCount(filtered.length);
+    updateFilterCount(countOccurrences(filtered));
     return filtered;
   }
 
@@ -136,6 +156,36 @@ document.addEventListener('DOMContentLoaded', function() {
     }catch(err){ console.warn('no exclusions file', err); exclusionsMap = {}; }
   }
 
+  function textColorFor(hex){ hex = hex.replace('#',''); if(hex.length===3) hex = hex.split('').map(c=>c+c).join(''); const r=parseInt(hex.substr(0,2),16), g=parseInt(hex.substr(2,2),16), b=parseInt(hex.substr(4,2),16); return (0.2126*r+0.7152*g+0.0722*b) > 180 ? '#111827' : '#ffffff'; }
+
+  // expand a compact run: a day is on if its weekday is in daysOfWeek and it is not an exdate, or it is an rdate
+  function expandRecurrence(ev, s, e, rawName){
+    const rule = ev.recurrence;
+    const weekdays = new Set(rule.daysOfWeek || []);
+    const exdate = new Set(rule.exdate || []);
+    const rdate = new Set(rule.rdate || []);
+    const bg = pickColorFor(rawName);
+    const textColor = textColorFor(bg);
+    const out = [];
+    for(let d = new Date(s); d <= e; d.setDate(d.getDate() + 1)){
+      const dayStr = formatLocalDate(d);
+      if(!((weekdays.has(d.getDay()) && !exdate.has(dayStr)) || rdate.has(dayStr))) continue;
+      const occ = Object.assign({}, ev, {
+        id: `${ev.id}-${dayStr.replace(/-/g,'')}`,
+        start: dayStr,
+        end: dayStr,
+        allDay: true,
+        backgroundColor: bg,
+        borderColor: bg,
+        textColor,
+        fromRule: true
+      });
+      delete occ.recurrence;
+      out.push(occ);
+    }
+    return out;
+  }
+
   // preferred ordering: wicked then book of mormon; rest alphabetical
   const PREFERRED_ORDER = ['wicked','the book of mormon'];
   function orderKeyForEvent(ev){
@@ -226,8 +276,8 @@ document.addEventListener('DOMContentLoaded', function() {
     events: async function(fetchInfo, successCallback, failureCallback){
       try{
         if(!allEventsCache){
-          // load events + exclusions (use server calendar endpoint)
-          const res = await fetch('/api/calendar-events');
+          // load events + exclusions (compact: one object per run with its recurrence rule)
+          const res = await fetch('/api/calendar-events?format=compact');
           allEventsCache = await res.json();
           await loadExclusions();
           buildMusicalDropdown(allEventsCache);
@@ -247,6 +297,18 @@ document.addEventListener('DOMContentLoaded', function() {
           }
         }catch(e){/* ignore filtering errors */}
 
+        // compact runs are only expanded over the visible range (and from today when past days are hidden)
+        let rangeStart = fetchInfo && fetchInfo.start ? parseLocalDate(formatLocalDate(fetchInfo.start)) : null;
+        let rangeEnd = null;
+        if(fetchInfo && fetchInfo.end){
+          rangeEnd = parseLocalDate(formatLocalDate(fetchInfo.end));
+          rangeEnd.setDate(rangeEnd.getDate() - 1); // FullCalendar's end is exclusive
+        }
+        if(!showPast){
+          const todayObj = parseLocalDate(formatLocalDate(new Date()));
+          if(!rangeStart || rangeStart < todayObj) rangeStart = todayObj;
+        }
+
         // expand multi-day events into per-day events, parse local dates, skip Mondays and exclusions
         const expanded = [];
         for(const ev of filtered){
@@ -254,6 +316,12 @@ document.addEventListener('DOMContentLoaded', function() {
           const e = parseLocalDate(ev.end || ev.start);
           if(!s || !e) continue;
           const rawName = (ev.musical || ev.title || '');
+          if(ev.recurrence){
+            const from = (rangeStart && rangeStart > s) ? rangeStart : s;
+            const to = (rangeEnd && rangeEnd < e) ? rangeEnd : e;
+            if(from <= to) expanded.push(...expandRecurrence(ev, from, to, rawName));
+            continue;
+          }
           const eventKey = normalizeKey(rawName);
 
           // match exclusions: exact normalized key OR partial contains
@@ -293,8 +361,8 @@ document.addEventListener('DOMContentLoaded', function() {
           }
         }
 
-        // final safety: ensure no Mondays slipped through
-        const final = expanded.filter(e => { const dt = parseLocalDate(e.start); return dt && dt.getDay() !== 1; });
+        // final safety: ensure no Mondays slipped through (unless the server rule includes them)
+        const final = expanded.filter(e => { const dt = parseLocalDate(e.start); return dt && (dt.getDay() !== 1 || e.fromRule); });
 
         console.debug('events fetched', (allEventsCache||[]).length, 'expanded', final.length);
         successCallback(final);
@@ -397,7 +465,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const img = document.createElement('img'); img.className='cdp-thumb'; img.alt = ev.title || 'img';
         const url = (ev.extendedProps && ev.extendedProps.url) || (ev.url || '#');
         const imgSrc = (ev.extendedProps && ev.extendedProps.image) || (`/static/fotos/${(ev.extendedProps && ev.extendedProps.musical)||''}`) || '';
-        if(imgSrc) img.src = imgSrc; else img.src = `https://via.placeholder.com/160x90?text=${encodeURIComponent(ev.title||'')}`;
+        if(imgSrc) img.src = sizedPhoto(imgSrc, 320); else img.src = `https://via.placeholder.com/160x90?text=${encodeURIComponent(ev.title||'')}`;
         const meta = document.createElement('div'); meta.className='cdp-meta';
         const title = document.createElement('a'); title.className='cdp-title'; title.textContent = ev.title || 'Evento'; title.href = url || '#'; title.target='_blank';
         const desc = document.createElement('div'); desc.className='cdp-desc'; desc.textContent = (ev.extendedProps && ev.extendedProps.description) || '';
@@ -538,14 +606,14 @@ document.addEventListener('DOMContentLoaded', function() {
       const img = document.createElement('img');
       img.className = 'tooltip-image';
       img.alt = event.title || 'Imagen';
-      img.src = image;
+      img.src = sizedPhoto(image, 640);
       img.loading = 'lazy';
       img.addEventListener('error', function(){ img.src = `https://via.placeholder.com/380x200/ff69b4/ffffff?text=${encodeURIComponent(event.title.substring(0, 20))}`; });
 
       const content = document.createElement('div'); content.className = 'tooltip-content';
       const h3 = document.createElement('h3'); h3.className = 'tooltip-title'; h3.textContent = event.title;
 
-      const meta = document.createElement('div'); meta.className = 'tooltip-meta';
+      const metaEl = document.createElement('div'); metaEl.className = 'tooltip-meta';
       const metaLoc = document.createElement('div'); metaLoc.className = 'tooltip-meta-item';
       metaLoc.innerHTML = `<span>📍</span>`;
       const aLoc = document.createElement('a'); aLoc.href = mapsUrl; aLoc.target = '_blank'; aLoc.className = 'tooltip-location-link'; aLoc.textContent = location; aLoc.addEventListener('click', (ev)=>ev.stopPropagation());
@@ -557,7 +625,7 @@ document.addEventListener('DOMContentLoaded', function() {
       availSpan.textContent = isAvailable ? '✅ Entradas disponibles' : '❌ Agotado';
       metaAvail.appendChild(availSpan);
 
-      meta.appendChild(metaLoc); meta.appendChild(metaAvail);
+      metaEl.appendChild(metaLoc); metaEl.appendChild(metaAvail);
 
       const p = document.createElement('p'); p.className = 'tooltip-description'; p.textContent = description;
 
@@ -572,7 +640,7 @@ document.addEventListener('DOMContentLoaded', function() {
       const closeBtn = document.createElement('button'); closeBtn.className = 'tooltip-close'; closeBtn.setAttribute('aria-label','Cerrar'); closeBtn.innerHTML = '✕';
       closeBtn.addEventListener('click', function(ev){ ev.stopPropagation(); tooltipEl.classList.remove('active'); setTimeout(()=>{ tooltipEl.innerHTML=''; },200); });
 
-      content.appendChild(h3); content.appendChild(meta); content.appendChild(p); content.appendChild(btns);
+      content.appendChild(h3); content.appendChild(metaEl); content.appendChild(p); content.appendChild(btns);
       tooltipEl.appendChild(img); tooltipEl.appendChild(content); tooltipEl.appendChild(closeBtn);
 
       // Positioning
@@ -75,6 +75,11 @@
   let fetchInFlight = false;
   const LAST_FETCH_CACHE_KEY = 'tm_last_fetch_v1';
 
+  // server push (Socket.IO `musical_delta`); polling only runs while it is down
+  const POLL_INTERVAL_MS = 8000;
+  let liveSocket = null;
+  let liveConnected = false;
+
   // load session baseline (taken at first full data load)
   function loadSessionSnapshot(){
     try {
@@ -657,6 +662,11 @@
         // store full candidate list for robust fallback attempts
         try { img.dataset.candidates = JSON.stringify(images); } catch(e) { img.dataset.candidates = images.join(','); }
         img.dataset.src = src;
+        const srcset = photoSrcset(src);
+        if (srcset) {
+          img.dataset.srcset = srcset;
+          img.sizes = '(max-width: 640px) 100vw, 400px';
+        }
         img.alt = (item.musical || item.name || 'Imagen');
         img.loading = 'lazy';
         if (i === 0) img.classList.add('active');
@@ -683,6 +693,7 @@
       card.addEventListener('click', () => {
         const imgs = Array.from(slideWrap.querySelectorAll('img.deferred-img'));
         imgs.forEach(iimg => {
+          if (iimg.dataset.srcset && !iimg.srcset) iimg.srcset = iimg.dataset.srcset;
           try {
             const candidates = iimg.dataset.candidates ? JSON.parse(iimg.dataset.candidates) : (iimg.dataset.src ? [iimg.dataset.src] : []);
             if (candidates && candidates.length) setImageWithFallback(iimg, candidates).catch(()=>{});
@@ -870,6 +881,17 @@
     try { renderCards(musicals); } catch(e){}
   }
 
+  // srcset of resized server-side variants for local photos (see image_variants.py);
+  // the source version from the page lets the browser keep them cached long-term
+  const PHOTO_WIDTHS = [320, 640, 960, 1440];
+  const PHOTO_VERSIONS = window.PHOTO_VERSIONS || {};
+  function photoSrcset(url){
+    if (!url || !url.startsWith('/static/fotos/') || url.includes('?')) return '';
+    const version = PHOTO_VERSIONS[url.toLowerCase()];
+    const v = version ? `&v=${version}` : '';
+    return PHOTO_WIDTHS.map(w => `${url}?w=${w}${v} ${w}w`).join(', ');
+  }
+
   // Map item to available static images
   function getImagesForItem(item){
     const m = ((item.musical || item.name || '').toLowerCase());
@@ -1167,7 +1189,7 @@
       autoRefresh = !!arToggle.checked;
       if (arState) arState.textContent = autoRefresh ? 'ON' : 'OFF';
       try { arToggle.setAttribute('aria-checked', autoRefresh ? 'true' : 'false'); } catch(e){}
-      if (autoRefresh) { if (!intervalId) intervalId = setInterval(fetchData, 8000); fetchData(); } else { clearInterval(intervalId); }
+      if (autoRefresh) { if (!intervalId && !liveConnected) intervalId = setInterval(fetchData, POLL_INTERVAL_MS); fetchData(); } else { clearInterval(intervalId); intervalId = null; }
     };
     arToggle.addEventListener('change', handleArToggleChange);
 
@@ -1274,26 +1296,7 @@
         const res = await fetch(api);
         if (!res.ok) throw new Error('Network response not ok');
         const data = await res.json();
-        musicals = Array.isArray(data) ? data : musicals;
-
-        // cache latest successful fetch to sessionStorage so UI can recover on transient failures
-        try { sessionStorage.setItem(LAST_FETCH_CACHE_KEY, JSON.stringify(musicals)); } catch(e) { /* ignore */ }
-
-        // ensure session baseline exists for this tab
-        let sessionSnap = loadSessionSnapshot();
-        if (!sessionSnap) {
-          saveSessionSnapshot(musicals);
-          sessionSnap = loadSessionSnapshot();
-        }
-
-        // compute changes relative to session baseline
-        changesMap = computeChangesMap(sessionSnap || [], musicals);
-
-        // notify (sound + popup) if new changes since last fetch
-        notifyIfNewChanges(changesMap);
-
-        renderTable(filter(musicals));
-        updateLastChecked();
+        applyMusicals(Array.isArray(data) ? data : musicals);
       } catch (e) {
         console.error('fetchData', e);
         // on error, try to use cached data
@@ -1313,6 +1316,73 @@
       }
     }
 
+    // shared by polling and push: cache, baseline, change detection, notify, render
+    function applyMusicals(list) {
+      musicals = list;
+
+      // cache latest successful fetch to sessionStorage so UI can recover on transient failures
+      try { sessionStorage.setItem(LAST_FETCH_CACHE_KEY, JSON.stringify(musicals)); } catch(e) { /* ignore */ }
+
+      // ensure session baseline exists for this tab
+      let sessionSnap = loadSessionSnapshot();
+      if (!sessionSnap) {
+        saveSessionSnapshot(musicals);
+        sessionSnap = loadSessionSnapshot();
+      }
+
+      // compute changes relative to session baseline
+      changesMap = computeChangesMap(sessionSnap || [], musicals);
+
+      // notify (sound + popup) if new changes since last fetch
+      notifyIfNewChanges(changesMap);
+
+      renderTable(filter(musicals));
+      updateLastChecked();
+    }
+
+    // merge a `musical_delta` payload ({musicals: [{id, updated_at?, last_change?, change_ids?, links?}]})
+    function applyDelta(payload) {
+      const deltas = (payload && Array.isArray(payload.musicals)) ? payload.musicals : [];
+      if (!deltas.length) return;
+      const byId = new Map(musicals.map(m => [m.id, m]));
+      if (deltas.some(d => !byId.has(d.id))) { fetchData(); return; } // unknown musical: reload everything
+      const next = musicals.map(m => ({ ...m }));
+      const nextById = new Map(next.map(m => [m.id, m]));
+      deltas.forEach(d => {
+        const m = nextById.get(d.id);
+        if (d.updated_at) m.updated_at = d.updated_at;
+        if (d.last_change) m.last_change = d.last_change;
+        if (Array.isArray(d.links) && d.links.length) {
+          const links = (m.links || []).map(l => ({ ...l }));
+          d.links.forEach(dl => {
+            const link = links.find(l => l.url === dl.url);
+            if (link) Object.assign(link, dl); else links.push({ ...dl });
+          });
+          m.links = links;
+        }
+      });
+      applyMusicals(next);
+    }
+
+    function connectLive() {
+      if (!window.io) return null; // socket.io client not loaded: keep polling
+      try {
+        const sock = io();
+        sock.on('connect', () => {
+          liveConnected = true;
+          if (intervalId) { clearInterval(intervalId); intervalId = null; }
+          if (autoRefresh) fetchData(); // resync whatever was missed while disconnected
+        });
+        sock.on('disconnect', () => {
+          liveConnected = false;
+          if (autoRefresh && !intervalId) intervalId = setInterval(fetchData, POLL_INTERVAL_MS);
+        });
+        sock.on('musical_delta', (payload) => { if (autoRefresh) applyDelta(payload); });
+        return sock;
+      } catch (e) { console.warn('live updates unavailable, polling instead', e); return null; }
+    }
+    liveSocket = connectLive();
+
     // ensure initial baseline state is respected on load
     (function ensureInitialBaseline() {
       const sessionSnap = loadSessionSnapshot();
@@ -1418,8 +1488,8 @@
     autoRefresh = true;
   }
   if (arState) arState.textContent = autoRefresh ? 'ON' : 'OFF';
-  if (autoRefresh) {
-    if (!intervalId) intervalId = setInterval(fetchData, 8000);
+  if (autoRefresh && !liveConnected) {
+    if (!intervalId) intervalId = setInterval(fetchData, POLL_INTERVAL_MS);
   }
   // initial fetch immediately
   setTimeout(fetchData, 200);
@@ -1560,7 +1630,7 @@
   // optional: listen to socketio telegram_test events if the page connects via Socket.IO
   if (window.io) {
     try {
-      const sock = io(); // requires socket.io client script to be loaded
+      const sock = liveSocket || io(); // requires socket.io client script to be loaded
       sock.on('telegram_test', (data) => {
         if (data && data.ok) makePopup('Telegram server says: sent ✓', true);
         else makePopup('Telegram server reported error', false, 6000);
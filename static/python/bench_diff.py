@@ -0,0 +1,88 @@
+"""
+Micro-benchmark: difflib.unified_diff (ruta anterior) vs diff_engine.
+
+Usa las páginas reales capturadas en static/data/snapshots.json, aplica dos
+cambios (uno a mitad de página y otro al final) y mide ambas rutas sobre el
+HTML original y sobre una versión minificada en una sola línea. Añade además
+una tabla de funciones sintética donde cambia ~30% de las filas (el caso
+cuadrático de difflib). La columna "found" indica si el snippet contiene el
+texto insertado a mitad de página.
+
+    python static/python/bench_diff.py [--repeat N] [--scale K]
+
+--scale repite el cuerpo K veces para simular páginas más grandes.
+"""
+
+import argparse
+import difflib
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import diff_engine
+
+SNAPSHOTS_FILE = ROOT_DIR / "static" / "data" / "snapshots.json"
+
+def legacy_diff(before, after, max_chars=1200):
+    diff_lines = list(difflib.unified_diff(before.splitlines(), after.splitlines(), fromfile='before', tofile='after', lineterm=''))
+    if not diff_lines:
+        return None
+    diff_text = '\n'.join(diff_lines)
+    return diff_text if len(diff_text) <= max_chars else diff_text[:max_chars] + '\n... (truncated)'
+
+def mutate(body):
+    mid = len(body) // 2
+    cut = body.find('>', mid) + 1 or mid
+    changed = body[:cut] + '<p>Nuevas fechas disponibles</p>' + body[cut:]
+    tail = changed.rfind('</')
+    return changed[:tail] + '<span>AGOTADO</span>' + changed[tail:] if tail > 0 else changed + 'AGOTADO'
+
+def ticket_table(rows=20000, seed=1):
+    rng = random.Random(seed)
+    before = [f"<tr><td>{rng.randint(1, 31)}/12</td><td>{rng.choice(['ok', 'agotado', 'pocas'])}</td></tr>" for _ in range(rows)]
+    after = [line if rng.random() < 0.7 else line.replace('ok', 'agotado') for line in before]
+    after.insert(rows // 2, '<p>Nuevas fechas disponibles</p>')
+    return '\n'.join(before), '\n'.join(after)
+
+def timed(fn, before, after, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        snippet = fn(before, after)
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, 'Nuevas fechas' in (snippet or '')
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=int, default=1)
+    args = parser.parse_args()
+
+    with SNAPSHOTS_FILE.open('r', encoding='utf-8') as f:
+        data = json.load(f)
+    pages = [(url, v.get('body')) for url, v in data.items() if isinstance(v, dict) and v.get('body')]
+
+    cases = []
+    for url, body in pages:
+        body = body * args.scale
+        for kind, before in (('html', body), ('minified', body.replace('\n', ''))):
+            cases.append((url, kind, before, mutate(before)))
+    cases.append(('synthetic ticket table', 'html', *ticket_table()))
+
+    print(f"{'page':60} {'kind':9} {'size':>8} {'difflib ms':>11} {'found':>5} {'engine ms':>10} {'found':>5}")
+    totals = [0.0, 0.0]
+    for url, kind, before, after in cases:
+        old_ms, old_found = timed(legacy_diff, before, after, args.repeat)
+        new_ms, new_found = timed(diff_engine.diff, before, after, args.repeat)
+        totals[0] += old_ms
+        totals[1] += new_ms
+        print(f"{url[:60]:60} {kind:9} {len(before):>8} {old_ms:>11.2f} {str(old_found):>5} {new_ms:>10.2f} {str(new_found):>5}")
+    print(f"{'TOTAL':60} {'':9} {'':>8} {totals[0]:>11.2f} {'':>5} {totals[1]:>10.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Cuenta las consultas SQL de /api/musicals y del dashboard según crece el catálogo.
+
+Crea una base SQLite temporal con N musicales (cada uno con varios enlaces y
+cambios), llama a las vistas y comprueba que cada una hace como mucho
+EXPECTED_QUERIES consultas sea cual sea N. Sale con código 1 si no.
+
+No importa urls.json/sugerencias/snapshots (STARTUP_IMPORTS=0) ni envía
+notificaciones: los webhooks, Telegram y SMTP se vacían antes de importar la app.
+
+    python static/python/bench_queries.py [--sizes 5,50,500]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'bench.db')
+os.environ['STARTUP_IMPORTS'] = '0'
+os.environ['START_MONITOR'] = '0'
+# vacías (no borradas) para que load_dotenv no las vuelva a rellenar desde .env
+for var in ('DISCORD_WEBHOOK_ALERTS', 'DISCORD_WEBHOOK_SUGGESTIONS', 'TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID',
+            'SMTP_SERVER', 'SMTP_USERNAME', 'SMTP_PASSWORD'):
+    os.environ[var] = ''
+os.environ.setdefault('ADMIN_PASSWORD', 'bench')
+
+from sqlalchemy import event, insert
+
+from app import app
+from models import db, Musical, MusicalLink, MusicalChange
+
+# musicals + selectinload(links) (+ the grouped last-change subquery joined in)
+EXPECTED_QUERIES = 2
+
+def seed(n, links=3, changes=4):
+    now = datetime.now(timezone.utc)
+    db.session.query(MusicalChange).delete()
+    db.session.query(MusicalLink).delete()
+    db.session.query(Musical).delete()
+    ids = db.session.execute(
+        insert(Musical).returning(Musical.id, sort_by_parameter_order=True),
+        [{'name': f'Musical {i}', 'is_available': True} for i in range(n)]
+    ).scalars().all()
+    db.session.execute(insert(MusicalLink), [
+        {'musical_id': mid, 'url': f'https://example.com/{mid}/{j}', 'is_available': j % 2 == 0}
+        for mid in ids for j in range(links)
+    ])
+    db.session.execute(insert(MusicalChange), [
+        {'musical_id': mid, 'change_type': 'page_diff', 'created_at': now - timedelta(minutes=k)}
+        for mid in ids for k in range(changes)
+    ])
+    db.session.commit()
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', default='5,50,500')
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(',')]
+
+    client = app.test_client()
+    results = {}
+    with app.app_context():
+        for n in sizes:
+            seed(n)
+            row = {}
+            for path in ('/api/musicals', '/'):
+                db.session.expire_all()
+                start = time.perf_counter()
+                with QueryCounter(db.engine) as counter:
+                    response = client.get(path)
+                assert response.status_code == 200, (path, response.status_code)
+                row[path] = (counter.count, (time.perf_counter() - start) * 1000)
+            results[n] = row
+            print(f"N={n:>5}  " + "  ".join(f"{p}: {c} queries {ms:.1f} ms" for p, (c, ms) in row.items()))
+
+    failures = [(n, path, count) for n, row in results.items() for path, (count, _) in row.items()
+                if count > EXPECTED_QUERIES]
+    if failures:
+        for n, path, count in failures:
+            print(f"❌ N={n} {path}: {count} consultas (máximo {EXPECTED_QUERIES})")
+        sys.exit(1)
+    print(f"✅ Como mucho {EXPECTED_QUERIES} consultas por vista, sea cual sea N")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""
+Genera static/dist: main.js, calendar.js y style.css minificados, con el hash
+del contenido en el nombre, sus copias .gz/.br y static/dist/manifest.json.
+
+Ejecutar en cada despliegue (y tras editar esos ficheros en local, o borrar
+static/dist para volver a servir los originales).
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import assets
+
+def build_assets():
+    print(f"🔄 Generando assets en {assets.DIST_DIR}...")
+    if assets.rjsmin is None or assets.rcssmin is None:
+        print("⚠️  rjsmin/rcssmin no instalados: los ficheros se copian sin minificar")
+    if assets.brotli is None:
+        print("⚠️  brotli no instalado: solo se generan copias .gz")
+    manifest = assets.build()
+    for name, built in manifest.items():
+        print(f"  📦 {name} -> {built}")
+    print(f"✅ {len(manifest)} assets generados")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    build_assets()
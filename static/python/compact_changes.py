@@ -0,0 +1,43 @@
+"""
+Mueve los old_value/new_value antiguos de musical_changes al almacén de blobs.
+
+Las filas nuevas ya guardan solo old_hash/new_hash; este script compacta las
+filas históricas (deduplica y comprime los cuerpos) y vacía las columnas inline.
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app import app, db
+from models import MusicalChange
+import blob_store
+
+BATCH_SIZE = 200
+
+def compact_changes():
+    with app.app_context():
+        print("🔄 Compactando musical_changes...")
+        total = 0
+        while True:
+            rows = (MusicalChange.query
+                    .filter((MusicalChange.old_value.isnot(None)) | (MusicalChange.new_value.isnot(None)))
+                    .limit(BATCH_SIZE).all())
+            if not rows:
+                break
+            for row in rows:
+                if row.old_value is not None and not row.old_hash:
+                    row.old_hash = blob_store.put(row.old_value)
+                if row.new_value is not None and not row.new_hash:
+                    row.new_hash = blob_store.put(row.new_value)
+                row.old_value = None
+                row.new_value = None
+            db.session.commit()
+            total += len(rows)
+            print(f"   {total} filas compactadas")
+        print(f"✅ Compactación completada ({total} filas)")
+
+if __name__ == "__main__":
+    compact_changes()
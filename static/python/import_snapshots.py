@@ -0,0 +1,24 @@
+"""
+Importa static/data/snapshots.json a la tabla url_snapshots.
+
+La app ya lo hace automáticamente al arrancar si la tabla está vacía;
+este script sirve para forzar una reimportación (sobrescribe las URLs existentes).
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app import app, SNAPSHOTS_FILE
+import snapshot_store
+
+def import_snapshots():
+    with app.app_context():
+        print(f"🔄 Importando {SNAPSHOTS_FILE}...")
+        imported = snapshot_store.import_json(SNAPSHOTS_FILE, overwrite=True)
+        print(f"✅ {imported} snapshots importados")
+
+if __name__ == "__main__":
+    import_snapshots()
@@ -0,0 +1,27 @@
+"""
+Importa static/python/suggestions.json a la tabla suggestions.
+
+La app ya lo hace automáticamente al arrancar si la tabla está vacía;
+usa --force para importar aunque ya haya sugerencias (puede duplicarlas).
+"""
+
+import sys
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+from app import app, SUGGESTIONS_FILE
+import suggestion_store
+
+def import_suggestions(force=False):
+    with app.app_context():
+        if not force and not suggestion_store.is_empty():
+            print(f"⚠️  La tabla ya tiene {suggestion_store.count()} sugerencias; usa --force para importar igualmente")
+            return
+        print(f"🔄 Importando {SUGGESTIONS_FILE}...")
+        imported = suggestion_store.import_json(SUGGESTIONS_FILE)
+        print(f"✅ {imported} sugerencias importadas")
+
+if __name__ == "__main__":
+    import_suggestions(force='--force' in sys.argv)
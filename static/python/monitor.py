@@ -1,4 +1,3 @@
-import requests
 from datetime import datetime
 import sys
 from pathlib import Path
@@ -10,6 +9,7 @@ sys.path.insert(0, str(ROOT_DIR))
 from app import app, db
 from models import Musical, MusicalLink
 import config
+import http_client
 
 URLS = [
     # ██╗    ██╗██╗ ██████╗██╗  ██╗███████╗██████╗ 
@@ -65,7 +65,7 @@ def check_sites():
 
     for url in URLS:
         try:
-            res = requests.get(url, timeout=10)
+            res = http_client.get(url, timeout=10)
             if "date_info" in res.text:
                 new_results.append(f"[{now}] {url} OK ✅")
             else:
@@ -0,0 +1,80 @@
+"""
+Comprueba que el despachador de fetcher.py no consulta el guard (y por tanto
+la cuota compartida en la base de datos) con el lock global tomado: mientras
+un try_acquire está bloqueado, el resto de descargas del proceso siguen.
+
+Uso:
+    python static/python/test_fetch_dispatch.py
+"""
+import sys
+import threading
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+import fetcher
+
+TIMEOUT = 5  # segundos
+
+
+class BlockingGuard:
+    """try_acquire se queda bloqueado (como una cuota con la base de datos lenta) hasta que se libera."""
+    max_wait = 30
+
+    def __init__(self):
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def try_acquire(self, host):
+        self.entered.set()
+        self.release.wait(TIMEOUT * 2)
+        return 0
+
+    def record(self, host, status_code=None, headers=None, error=False):
+        pass
+
+
+class Page:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, url):
+        self.url = url
+
+
+def fake_fetch(url, headers=None, max_bytes=None):
+    return Page(url)
+
+
+def test_finished_not_blocked_by_slow_guard():
+    guard = BlockingGuard()
+    slow = fetcher.fetch_all(['https://lento.example/a'], fetch=fake_fetch, guard=guard)
+    slow_results = []
+    consumer = threading.Thread(target=lambda: slow_results.extend(f.result().url for f in slow), daemon=True)
+    consumer.start()
+    try:
+        assert guard.entered.wait(TIMEOUT), "el guard nunca fue consultado"
+
+        # finished() de un fetch de otra llamada necesita el lock global
+        other = fetcher._Dispatcher([], None, 1, 1, None)
+        other.in_flight += 1
+        fetcher._host_in_flight['rapido.example'] += 1
+        done = threading.Event()
+        threading.Thread(target=lambda: (other.finished('rapido.example'), done.set()), daemon=True).start()
+        assert done.wait(TIMEOUT), "finished() quedó bloqueado mientras try_acquire esperaba"
+
+        # y otra llamada a fetch_all sin guard termina igualmente
+        fast = [f.result(timeout=TIMEOUT).url
+                for f in fetcher.fetch_all(['https://rapido.example/1', 'https://rapido.example/2'],
+                                           fetch=fake_fetch, guard=None)]
+        assert fast == ['https://rapido.example/1', 'https://rapido.example/2'], fast
+    finally:
+        guard.release.set()
+        consumer.join(TIMEOUT)
+    assert slow_results == ['https://lento.example/a'], slow_results
+
+
+if __name__ == '__main__':
+    test_finished_not_blocked_by_slow_guard()
+    print("✅ El despachador no bloquea otras descargas mientras consulta la cuota")
@@ -0,0 +1,106 @@
+"""
+Append-only store for site suggestions, backed by the ``suggestions`` table.
+
+Replaces ``static/python/suggestions.json``, which every POST to
+``/api/suggest-site`` read in full, appended to and rewrote (O(n) per request,
+and two concurrent requests could lose one of the entries). Adding a
+suggestion is now a single INSERT; admins read them newest first in pages
+through :func:`page`.
+
+Suggestions are returned in the legacy JSON shape
+(``siteName``, ``siteUrl``, ``reason``, ``contact``, ``timestamp``).
+
+All functions expect an active Flask application context.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy import and_, or_
+
+import json_store
+from models import db, Suggestion
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
+def to_dict(row):
+    created = row.created_at
+    if created is not None and created.tzinfo is None:
+        created = created.replace(tzinfo=timezone.utc)
+    return {
+        'id': row.id,
+        'siteName': row.site_name,
+        'siteUrl': row.site_url,
+        'reason': row.reason,
+        'contact': row.contact,
+        'discount_code': row.discount_code,
+        'timestamp': created.isoformat() if created else None,
+    }
+
+
+def add(site_name, site_url, reason=None, contact=None, discount_code=None):
+    row = Suggestion(site_name=site_name[:200], site_url=site_url[:500], reason=reason,
+                     contact=(contact or '')[:200] or None, discount_code=discount_code)
+    db.session.add(row)
+    db.session.commit()
+    return row
+
+
+def page(limit=PAGE_SIZE, before=None):
+    """Up to ``limit`` suggestions newest first, older than the one with id ``before``.
+
+    Returns ``(items, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    limit = max(1, min(MAX_PAGE_SIZE, limit))
+    query = Suggestion.query
+    if before is not None:
+        cursor = db.session.get(Suggestion, before)
+        if cursor is None:
+            query = query.filter(Suggestion.id < before)
+        else:
+            query = query.filter(or_(
+                Suggestion.created_at < cursor.created_at,
+                and_(Suggestion.created_at == cursor.created_at, Suggestion.id < cursor.id),
+            ))
+    rows = query.order_by(Suggestion.created_at.desc(), Suggestion.id.desc()).limit(limit + 1).all()
+    next_cursor = rows[limit - 1].id if len(rows) > limit else None
+    return [to_dict(row) for row in rows[:limit]], next_cursor
+
+
+def count():
+    return db.session.query(db.func.count(Suggestion.id)).scalar()
+
+
+def is_empty():
+    return db.session.query(Suggestion.id).first() is None
+
+
+def _parse_dt(value):
+    try:
+        dt = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def import_json(path):
+    """One-shot import of a legacy ``suggestions.json`` list. Returns the number of suggestions imported."""
+    data = json_store.load(path, (), cache=False)
+    if not isinstance(data, tuple):
+        return 0
+    rows = []
+    for item in data:
+        if not isinstance(item, dict) or not (item.get('siteName') and item.get('siteUrl')):
+            continue
+        rows.append(Suggestion(
+            site_name=item['siteName'][:200],
+            site_url=item['siteUrl'][:500],
+            reason=item.get('reason'),
+            contact=(item.get('contact') or '')[:200] or None,
+            discount_code=item.get('discount_code'),
+            created_at=_parse_dt(item.get('timestamp')) or datetime.now(timezone.utc),
+        ))
+    rows.sort(key=lambda row: row.created_at)
+    db.session.add_all(rows)
+    db.session.commit()
+    return len(rows)
@@ -0,0 +1,206 @@
+"""
+Resident index of the URLs the monitor checks.
+
+Every cycle used to rebuild the watchlist from scratch: ``Musical.query.all()``,
+one ``MusicalLink`` query per musical and a re-parse of ``urls.json``. The
+index is now built once (a single joined query plus the file) into slotted
+:class:`WatchEntry` records and reused until something relevant changes:
+
+* a committed insert/delete of a ``Musical`` or ``MusicalLink``, or an update
+  of a column the watchlist depends on (monitor bookkeeping such as
+  ``last_checked`` and ``consecutive_failures`` does not count, except for
+  quarantined links, whose probe time depends on it);
+* a new mtime/size of ``static/python/urls.json``;
+* ``WATCHLIST_MAX_AGE`` seconds passing, which picks up writes made by other
+  processes (other gunicorn workers never fire our session events).
+
+Links that keep failing are quarantined (``is_available=False`` after
+``MONITOR_QUARANTINE_AFTER`` failures in a row) and only show up in the
+watchlist once every ``MONITOR_QUARANTINE_PROBE`` seconds.
+
+Reads expect an active Flask application context.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+
+import json_store
+from models import db, Musical, MusicalLink
+
+MONITOR_QUARANTINE_AFTER = int(os.getenv('MONITOR_QUARANTINE_AFTER', '10'))
+MONITOR_QUARANTINE_PROBE = int(os.getenv('MONITOR_QUARANTINE_PROBE', str(6 * 3600)))
+WATCHLIST_MAX_AGE = int(os.getenv('WATCHLIST_MAX_AGE', '300'))  # segundos
+
+# Columns written by the monitor itself on every check
+_BOOKKEEPING = frozenset({'last_checked', 'consecutive_failures'})
+
+logger = logging.getLogger(__name__)
+
+
+def is_quarantined(link):
+    return not link.is_available and (link.consecutive_failures or 0) >= MONITOR_QUARANTINE_AFTER
+
+
+def probe_due(last_checked, now=None):
+    """Whether a quarantined link last checked at ``last_checked`` should be probed again."""
+    if last_checked is None:
+        return True
+    if last_checked.tzinfo is None:
+        last_checked = last_checked.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return (now - last_checked).total_seconds() >= MONITOR_QUARANTINE_PROBE
+
+
+class WatchEntry:
+    __slots__ = ('musical', 'url', 'source', 'max_body_bytes', 'last_checked')
+
+    def __init__(self, musical, url, source, max_body_bytes=None, last_checked=None):
+        self.musical = musical
+        self.url = url
+        self.source = source
+        self.max_body_bytes = max_body_bytes
+        self.last_checked = last_checked  # only kept for quarantined links
+
+    def __repr__(self):
+        return f'<WatchEntry {self.musical} {self.url}>'
+
+
+class WatchlistIndex:
+    def __init__(self, urls_file, max_age=WATCHLIST_MAX_AGE, clock=time.monotonic):
+        self.urls_file = urls_file
+        self.max_age = max_age
+        self.clock = clock
+        self.version = 0
+        self._lock = threading.Lock()
+        self._dirty = True
+        self._built_at = 0.0
+        self._file_sig = None
+        self._file_entries = []
+        self._db_entries = []
+        self._quarantined = []
+        self._active = ()
+        self._probes = ()
+        self._by_url = {}
+
+    def invalidate(self):
+        self._dirty = True
+
+    def _read_file(self):
+        entries = []
+        data = json_store.load(self.urls_file, ())
+        if not isinstance(data, tuple):
+            return entries
+        for item in data:
+            name = item.get('musical') or item.get('name') or item.get('siteName') or 'unknown'
+            urls = item.get('urls') or item.get('url') or []
+            if isinstance(urls, str):
+                urls = [urls]
+            entries.extend(WatchEntry(name, u, 'file') for u in urls if u)
+        return entries
+
+    def _read_db(self):
+        active, quarantined = [], []
+        try:
+            rows = (db.session.query(MusicalLink, Musical.name)
+                    .join(Musical, MusicalLink.musical_id == Musical.id)
+                    .order_by(Musical.id, MusicalLink.id).all())
+        except Exception as e:
+            logger.warning(f"Could not load monitored links: {e}")
+            return active, quarantined
+        for link, name in rows:
+            if is_quarantined(link):
+                quarantined.append(WatchEntry(name, link.url, 'db', link.max_body_bytes, link.last_checked))
+            else:
+                active.append(WatchEntry(name, link.url, 'db', link.max_body_bytes))
+        return active, quarantined
+
+    def _refresh(self):
+        """Rebuild whatever part of the index is stale. Caller holds the lock."""
+        now = self.clock()
+        expired = self.max_age and now - self._built_at >= self.max_age
+        sig = json_store.signature(self.urls_file)
+        changed = False
+        if self._dirty or expired:
+            # Clear the flag first: a commit landing while we read marks it again
+            self._dirty = False
+            self._db_entries, self._quarantined = self._read_db()
+            self._built_at = now
+            changed = True
+        if sig != self._file_sig:
+            self._file_sig = sig
+            self._file_entries = self._read_file()
+            changed = True
+        if not changed:
+            return
+        by_url = {}
+        for entry in self._db_entries:
+            by_url.setdefault(entry.url, entry)
+        # quarantined DB links still shadow file entries with the same URL
+        shadowed = {entry.url for entry in self._quarantined}
+        for entry in self._file_entries:
+            if entry.url not in shadowed:
+                by_url.setdefault(entry.url, entry)
+        self._active = tuple(by_url.values())
+        probes = {}
+        for entry in self._quarantined:
+            if entry.url not in by_url:
+                probes.setdefault(entry.url, entry)
+        self._probes = tuple(probes.values())
+        self._by_url = {**probes, **by_url}
+        self.version += 1
+
+    def entries(self):
+        """Watched entries, DB links first then urls.json, without duplicate URLs."""
+        with self._lock:
+            self._refresh()
+            active, probes = self._active, self._probes
+        if not probes:
+            return active
+        now = datetime.now(timezone.utc)
+        return active + tuple(entry for entry in probes if probe_due(entry.last_checked, now))
+
+    def lookup(self, urls):
+        """Entries for ``urls`` (in that order, quarantined links included), skipping unknown URLs."""
+        with self._lock:
+            self._refresh()
+            by_url = self._by_url
+        return [by_url[url] for url in urls if url in by_url]
+
+
+def _touches_watchlist(target):
+    if isinstance(target, Musical):
+        return inspect(target).attrs.name.history.has_changes()
+    changed = {attr.key for attr in inspect(target).attrs if attr.history.has_changes()}
+    return bool(changed - _BOOKKEEPING) or (bool(changed) and is_quarantined(target))
+
+
+def watch_models(index):
+    """Invalidate ``index`` after every commit that wrote a relevant Musical/MusicalLink change."""
+
+    def _mark(mapper, connection, target):
+        session = object_session(target)
+        if session is not None:
+            session.info['watchlist_dirty'] = True
+
+    def _mark_update(mapper, connection, target):
+        if _touches_watchlist(target):
+            _mark(mapper, connection, target)
+
+    for model in (Musical, MusicalLink):
+        event.listen(model, 'after_insert', _mark)
+        event.listen(model, 'after_delete', _mark)
+        event.listen(model, 'after_update', _mark_update)
+
+    @event.listens_for(Session, 'after_commit')
+    def _after_commit(session):
+        if session.info.pop('watchlist_dirty', False):
+            index.invalidate()
+
+    @event.listens_for(Session, 'after_rollback')
+    def _after_rollback(session):
+        session.info.pop('watchlist_dirty', None)